@@ -0,0 +1,144 @@
+# pylint: disable=missing-module-docstring
+# pylint: disable=missing-function-docstring
+import argparse
+import io
+import json
+import random
+import sys
+import time
+import zlib
+from typing import Callable, Dict, List
+
+from gt521f32 import framecodec, packets
+from gt521f32.interfaces import SimulatedInterface
+
+# Compression ratio and speed of gt521f32.framecodec against deflating each
+# frame with plain zlib, on simulated frames with sensor noise added. A
+# session is a finger being placed, held and lifted, over and over:
+#
+#   python benchmarks/framecodec.py --frames 200 --noise 2 --output codec.json
+
+
+def capture(device, command: str) -> bytes:
+    response = device.handle(
+        packets.CommandPacket(command=packets.command_codes[command]).to_bytes()
+    )
+    return response[packets.ResponsePacket().byte_size() + 4 : -2]
+
+
+def session(command: str, count: int, noise: int, seed: int) -> List[bytes]:
+    device = SimulatedInterface("sim://benchmark-framecodec").device
+    rng = random.Random(seed)
+    frames = []
+    for index in range(count):
+        finger = (index // 20) % 5 if index % 20 >= 5 else None  # off, then held
+        if command == "GET_IMAGE":
+            finger = (index // 20) % 5  # only captured with a finger on
+        if finger is None:
+            device.lift_finger()
+        else:
+            device.press_finger(finger)
+        if command == "GET_IMAGE":
+            capture(device, "CAPTURE")
+        frame = capture(device, command)
+        if noise:
+            # Small signed noise on every pixel, clamped like a real sensor's
+            offsets = rng.choices(range(-noise, noise + 1), k=len(frame))
+            frame = bytes(
+                min(255, max(0, pixel + offset))
+                for pixel, offset in zip(frame, offsets)
+            )
+        frames.append(frame)
+    return frames
+
+
+def measure(
+    frames: List[bytes],
+    encode: Callable[[List[bytes]], List[bytes]],
+    decode: Callable[[List[bytes]], List[bytes]],
+) -> Dict[str, float]:
+    raw = sum(len(frame) for frame in frames)
+    started = time.perf_counter()
+    encoded = encode(frames)
+    encode_time = time.perf_counter() - started
+    started = time.perf_counter()
+    decoded = decode(encoded)
+    decode_time = time.perf_counter() - started
+    assert decoded == frames
+    return {
+        "ratio": raw / sum(len(record) for record in encoded),
+        "encode_mb_per_second": raw / encode_time / 10 ** 6,
+        "decode_mb_per_second": raw / decode_time / 10 ** 6,
+    }
+
+
+def zlib_codec(level: int):
+    def encode(frames):
+        return [zlib.compress(frame, level) for frame in frames]
+
+    def decode(records):
+        return [zlib.decompress(record) for record in records]
+
+    return encode, decode
+
+
+def frame_codec(shape, keyframe_interval: int, level: int):
+    def encode(frames):
+        encoder = framecodec.FrameEncoder(shape, keyframe_interval, level)
+        return [encoder.header()] + [encoder.encode(frame) for frame in frames]
+
+    def decode(records):
+        decoder = framecodec.FrameDecoder()
+        return [frame for record in records for frame in decoder.feed(record)]
+
+    return encode, decode
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("-n", "--frames", type=int, default=100)
+    parser.add_argument(
+        "--noise", type=int, default=2, help="Peak sensor noise, in gray levels"
+    )
+    parser.add_argument("--keyframe-interval", type=int, default=30)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("-o", "--output", help="Write results to this JSON file")
+    args = parser.parse_args()
+
+    results = {}
+    for command in ("GET_RAWIMAGE", "GET_IMAGE"):
+        frames = session(command, args.frames, args.noise, args.seed)
+        shape = framecodec.shape_for(len(frames[0]))
+        codecs = {"zlib-%d" % (level,): zlib_codec(level) for level in (1, 6, 9)}
+        for level in (1, 6):
+            codecs["framecodec-%d" % (level,)] = frame_codec(
+                shape, args.keyframe_interval, level
+            )
+        for name, (encode, decode) in codecs.items():
+            key = "%s.%s" % (command, name)
+            results[key] = measure(frames, encode, decode)
+            print(
+                "%-28s ratio %6.2f  encode %7.1f MB/s  decode %7.1f MB/s"
+                % (
+                    key,
+                    results[key]["ratio"],
+                    results[key]["encode_mb_per_second"],
+                    results[key]["decode_mb_per_second"],
+                )
+            )
+
+    # The streaming API end to end, through a file
+    frames = session("GET_RAWIMAGE", args.frames, args.noise, args.seed)
+    stream = io.BytesIO()
+    framecodec.write_frames(stream, frames)
+    stream.seek(0)
+    assert list(framecodec.read_frames(stream, chunk_size=4096)) == frames
+
+    if args.output:
+        with open(args.output, "w") as output:
+            json.dump(results, output, indent=2, sort_keys=True)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
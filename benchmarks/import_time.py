@@ -0,0 +1,75 @@
+# pylint: disable=missing-module-docstring
+# pylint: disable=missing-function-docstring
+import argparse
+import json
+import re
+import statistics
+import subprocess
+import sys
+
+# Measures the cost of `import gt521f32` in a fresh interpreter and fails if it
+# exceeds a budget, or if a module that should be deferred was imported.
+#
+#   python benchmarks/import_time.py --budget-ms 60
+
+DEFERRED_MODULES = ("PIL", "numpy", "sgio", "gt521f32.interfaces.scsi_windows")
+
+_PROBE = (
+    "import sys, json, gt521f32; "
+    "print(json.dumps(sorted(m for m in %r if m in sys.modules)))" % (DEFERRED_MODULES,)
+)
+_IMPORTTIME_LINE = re.compile(r"import time:\s+\d+\s+\|\s+(\d+)\s+\|\s*(\S+)")
+
+
+def measure_once(module: str = "gt521f32") -> float:
+    # Cumulative microseconds of the top-level import, as reported by -X importtime
+    result = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", "import %s" % (module,)],
+        stderr=subprocess.PIPE,
+        check=True,
+        universal_newlines=True,
+    )
+    for line in result.stderr.splitlines():
+        match = _IMPORTTIME_LINE.match(line)
+        if match and match.group(2) == module:
+            return int(match.group(1)) / 1000.0
+    raise RuntimeError("Could not find %s in the import time report" % (module,))
+
+
+def eagerly_imported() -> list:
+    result = subprocess.run(
+        [sys.executable, "-c", _PROBE],
+        stdout=subprocess.PIPE,
+        check=True,
+        universal_newlines=True,
+    )
+    return json.loads(result.stdout)
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("-n", "--repeat", type=int, default=10)
+    parser.add_argument(
+        "--budget-ms", type=float, default=None, help="Fail above this median"
+    )
+    args = parser.parse_args()
+
+    samples = [measure_once() for _ in range(args.repeat)]
+    median = statistics.median(samples)
+    print("import gt521f32: median %.1f ms, min %.1f ms" % (median, min(samples)))
+
+    failed = False
+    leaked = eagerly_imported()
+    if leaked:
+        print("Imported eagerly: %s" % (", ".join(leaked),))
+        failed = True
+
+    if args.budget_ms is not None and median > args.budget_ms:
+        print("Import time exceeds the %.1f ms budget" % (args.budget_ms,))
+        failed = True
+
+    return 1 if failed else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
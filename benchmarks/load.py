@@ -0,0 +1,443 @@
+# pylint: disable=missing-module-docstring
+# pylint: disable=missing-function-docstring
+import argparse
+import array
+import contextlib
+import datetime
+import json
+import logging
+import os
+import platform
+import random
+import sys
+import threading
+import time
+import tracemalloc
+from typing import Callable, Dict, Iterator, List, Optional, Tuple
+
+import gt521f32
+from gt521f32.interfaces import InterfaceException
+from gt521f32.interfaces.simulated import SimulatedDevice
+from gt521f32.pool import DevicePool
+
+# Soak test: simulated readers, each fed by its own finger arrival process,
+# running a weighted mix of operations for --duration seconds. Reports
+# throughput, latency percentiles and outcome rates per operation, and how
+# memory grew over the run. Arrivals, fingers and the simulator's false
+# rejects all derive from --seed, so two runs see the same traffic:
+#
+#   python benchmarks/load.py --devices 8 --duration 3600 --output soak.json
+#   python benchmarks/load.py --devices 8 --duration 3600 --compare soak.json
+#
+# Latency runs from when the finger arrived, so time spent queued behind a
+# slow operation counts; service time runs from when the operation started.
+
+WORKLOADS: Dict[str, Dict[str, float]] = {
+    "identify-heavy": {"identify": 0.9, "image": 0.05, "enroll": 0.05},
+    "enrollment-burst": {"enroll": 0.7, "identify": 0.3},
+    "images": {"image": 0.6, "raw_image": 0.3, "identify": 0.1},
+    "mixed": {"identify": 0.6, "enroll": 0.15, "image": 0.15, "raw_image": 0.1},
+}
+
+OK = "ok"
+REJECTED = "rejected"  # a genuine finger was not identified
+FALSE_ACCEPT = "false_accept"  # identified as someone else
+FAILED = "failed"  # the operation reported failure
+ERROR = "error"  # the operation raised
+OUTCOMES = (OK, REJECTED, FALSE_ACCEPT, FAILED, ERROR)
+
+_DEVICE_ERRORS = (gt521f32.GT521F32Exception, InterfaceException)
+
+
+def poisson_arrivals(rng: random.Random, rate: float, **_) -> Iterator[float]:
+    # Offsets in seconds from the start of the run
+    now = 0.0
+    while True:
+        now += rng.expovariate(rate)
+        yield now
+
+
+def uniform_arrivals(rng: random.Random, rate: float, **_) -> Iterator[float]:
+    now = rng.uniform(0, 1 / rate)  # so devices do not run in lockstep
+    while True:
+        yield now
+        now += 1 / rate
+
+
+def bursty_arrivals(
+    rng: random.Random, rate: float, burst_size: float = 5.0, **_
+) -> Iterator[float]:
+    # Bursts of a geometric number of fingers, a second or so apart, e.g. a
+    # queue at the door, separated by idle gaps averaging burst_size / rate
+    now = 0.0
+    while True:
+        now += rng.expovariate(rate / burst_size)
+        for _ in range(1 + int(rng.expovariate(1 / max(burst_size - 1, 1e-9)))):
+            yield now
+            now += rng.uniform(0.5, 1.5)
+
+
+ARRIVALS = {
+    "poisson": poisson_arrivals,
+    "uniform": uniform_arrivals,
+    "bursty": bursty_arrivals,
+}
+
+
+class Recorder:
+    # Latencies in compact arrays, one pair per operation, shared by all
+    # device threads
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.latency: Dict[str, array.array] = {}
+        self.service: Dict[str, array.array] = {}
+        self.outcomes: Dict[str, Dict[str, int]] = {}
+        self.errors: Dict[str, int] = {}
+
+    def record(
+        self, operation: str, outcome: str, latency: float, service: float
+    ) -> None:
+        with self._lock:
+            if operation not in self.latency:
+                self.latency[operation] = array.array("d")
+                self.service[operation] = array.array("d")
+                self.outcomes[operation] = dict.fromkeys(OUTCOMES, 0)
+            self.latency[operation].append(latency)
+            self.service[operation].append(service)
+            self.outcomes[operation][outcome] += 1
+
+    def record_error(self, error: Exception) -> None:
+        with self._lock:
+            name = type(error).__name__
+            self.errors[name] = self.errors.get(name, 0) + 1
+
+    def count(self) -> int:
+        with self._lock:
+            return sum(len(samples) for samples in self.latency.values())
+
+
+class Device:
+    # One simulated reader and the traffic it sees
+    def __init__(self, index: int, args, reader_for: Callable):
+        self.index = index
+        name = "load-%d-%d" % (args.seed, index)
+        self.port = "sim://%s?users=%d" % (name, args.users)
+        if args.baudrate:
+            self.port += "&realtime=1"
+        self.simulated = SimulatedDevice.get(name)
+        self.rng = random.Random(name)
+        self.users = args.users
+        self.impostor_rate = args.impostor_rate
+        self.enroll_slots = range(args.users, args.users + args.enroll_slots)
+        self.next_enroll = 0
+        self.next_finger = 10 ** 6 * (index + 1)  # never enrolled before
+        self.timeout = args.timeout
+        self.reader_for = reader_for
+        self.operations = list(args.mix)
+        self.weights = [args.mix[name] for name in self.operations]
+        self.arrivals = ARRIVALS[args.arrivals](
+            self.rng, args.rate, burst_size=args.burst_size
+        )
+
+    def identify(self, reader: gt521f32.GT521F32) -> str:
+        genuine = self.rng.random() >= self.impostor_rate
+        finger = (
+            self.rng.randrange(self.users)
+            if genuine
+            else self.rng.randrange(10 ** 5, 10 ** 6)
+        )
+        self.simulated.press_finger(finger)
+        result = reader.identify(timeout=self.timeout)
+        if result is None:
+            return REJECTED if genuine else OK
+        return OK if genuine and result == finger else FALSE_ACCEPT
+
+    def enroll(self, reader: gt521f32.GT521F32) -> str:
+        # Cycles through the slots above the preloaded users, so the
+        # database stays the same size however long the run
+        slot = self.enroll_slots[self.next_enroll % len(self.enroll_slots)]
+        self.next_enroll += 1
+        reader.delete_ids([slot], timeout=self.timeout)
+        self.simulated.press_finger(self.next_finger)
+        self.next_finger += 1
+        return OK if reader.enroll_user(slot, timeout=self.timeout) else FAILED
+
+    def image(self, reader: gt521f32.GT521F32) -> str:
+        self.simulated.press_finger(self.rng.randrange(self.users))
+        with reader.deadline(self.timeout):
+            if not reader.capture():
+                return FAILED
+            return OK if reader.get_image() is not None else FAILED
+
+    def raw_image(self, reader: gt521f32.GT521F32) -> str:
+        self.simulated.press_finger(self.rng.randrange(self.users))
+        return OK if reader.get_raw_image_safe(timeout=self.timeout) else FAILED
+
+    def run(self, started: float, stop: threading.Event, recorder: Recorder) -> None:
+        for offset in self.arrivals:
+            arrival = started + offset
+            if stop.wait(max(0.0, arrival - time.perf_counter())):
+                return
+            operation = self.rng.choices(self.operations, self.weights)[0]
+            begun = time.perf_counter()
+            try:
+                with self.reader_for(self.port) as reader:
+                    outcome = getattr(self, operation)(reader)
+            except _DEVICE_ERRORS as e:  # pylint: disable=invalid-name
+                recorder.record_error(e)
+                outcome = ERROR
+            finally:
+                self.simulated.lift_finger()
+            finished = time.perf_counter()
+            recorder.record(operation, outcome, finished - arrival, finished - begun)
+
+
+def percentiles(samples: array.array) -> Dict[str, float]:
+    ordered = sorted(samples)
+    if not ordered:
+        return {}
+
+    def rank(fraction: float) -> float:
+        return ordered[min(len(ordered) - 1, int(fraction * len(ordered)))]
+
+    return {
+        "p50": rank(0.50),
+        "p95": rank(0.95),
+        "p99": rank(0.99),
+        "max": ordered[-1],
+        "mean": sum(ordered) / len(ordered),
+    }
+
+
+def rss_bytes() -> Optional[int]:
+    try:
+        with open("/proc/self/statm") as statm:
+            return int(statm.read().split()[1]) * os.sysconf("SC_PAGE_SIZE")
+    except (OSError, ValueError):
+        return None
+
+
+def growth_per_hour(samples: List[Tuple[float, Optional[int]]]) -> Optional[float]:
+    # Least squares slope in bytes per hour, skipping the first tenth of the
+    # run while caches and pools fill up
+    points = [(t, value) for t, value in samples if value is not None]
+    points = points[len(points) // 10 :]
+    if len(points) < 2:
+        return None
+    mean_t = sum(t for t, _ in points) / len(points)
+    mean_v = sum(value for _, value in points) / len(points)
+    variance = sum((t - mean_t) ** 2 for t, _ in points)
+    if not variance:
+        return None
+    slope = sum((t - mean_t) * (value - mean_v) for t, value in points) / variance
+    return slope * 3600
+
+
+def report(args, recorder: Recorder, elapsed: float, memory: List) -> Dict:
+    operations = {}
+    for name in sorted(recorder.latency):
+        outcomes = recorder.outcomes[name]
+        count = sum(outcomes.values())
+        operations[name] = {
+            "count": count,
+            "throughput": count / elapsed,
+            "outcomes": outcomes,
+            "error_rate": (outcomes[ERROR] + outcomes[FAILED]) / count,
+            "latency": percentiles(recorder.latency[name]),
+            "service": percentiles(recorder.service[name]),
+        }
+    return {
+        "meta": {
+            "version": getattr(gt521f32, "__version__", None),
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "timestamp": datetime.datetime.now().isoformat(),
+        },
+        "config": {
+            key: value for key, value in vars(args).items() if key not in ("output",)
+        },
+        "elapsed": elapsed,
+        "operations": operations,
+        "exceptions": recorder.errors,
+        "memory": {
+            "samples": [
+                {"time": t, "rss": rss, "traced": traced} for t, rss, traced in memory
+            ],
+            "rss_growth_per_hour": growth_per_hour([(t, rss) for t, rss, _ in memory]),
+            "traced_growth_per_hour": growth_per_hour(
+                [(t, traced) for t, _, traced in memory]
+            ),
+        },
+    }
+
+
+def compare(results: Dict, baseline: Dict, threshold: float, slack: float) -> List[str]:
+    # p99 latency slower than threshold times the baseline, or an error rate
+    # more than slack above it
+    regressions = []
+    for name, result in sorted(results["operations"].items()):
+        before = baseline["operations"].get(name)
+        if before is None:
+            continue
+        ratio = result["latency"]["p99"] / before["latency"]["p99"]
+        errors = result["error_rate"] - before["error_rate"]
+        flags = []
+        if ratio > threshold:
+            flags.append("P99 REGRESSION")
+        if errors > slack:
+            flags.append("ERROR RATE REGRESSION")
+        print(
+            "%-12s p99 %8.3fx  error rate %+7.3f%%  %s"
+            % (name, ratio, errors * 100, " ".join(flags))
+        )
+        if flags:
+            regressions.append(name)
+    return regressions
+
+
+def parse_mix(text: str) -> Dict[str, float]:
+    if text in WORKLOADS:
+        return WORKLOADS[text]
+    mix = {}
+    for item in text.split(","):
+        name, _, weight = item.partition("=")
+        if not hasattr(Device, name):
+            raise argparse.ArgumentTypeError("Unknown operation %s" % (name,))
+        mix[name] = float(weight or 1)
+    return mix
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("-n", "--devices", type=int, default=4)
+    parser.add_argument("-d", "--duration", type=float, default=60.0, help="Seconds")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument(
+        "-w",
+        "--mix",
+        type=parse_mix,
+        default="mixed",
+        help="One of %s, or weights like identify=8,image=1" % (", ".join(WORKLOADS),),
+    )
+    parser.add_argument("--arrivals", choices=sorted(ARRIVALS), default="poisson")
+    parser.add_argument(
+        "--rate", type=float, default=1.0, help="Fingers per second per device"
+    )
+    parser.add_argument("--burst-size", type=float, default=5.0, help="For bursty")
+    parser.add_argument("--users", type=int, default=100, help="Enrolled per device")
+    parser.add_argument("--enroll-slots", type=int, default=20)
+    parser.add_argument("--impostor-rate", type=float, default=0.05)
+    parser.add_argument(
+        "-b", "--baudrate", type=int, default=115200, help="0 for no wire time"
+    )
+    parser.add_argument("--timeout", type=float, default=10.0, help="Per operation")
+    parser.add_argument(
+        "--pool", action="store_true", help="Share readers through a DevicePool"
+    )
+    parser.add_argument(
+        "--tracemalloc", action="store_true", help="Also track Python allocations"
+    )
+    parser.add_argument(
+        "--sample-interval", type=float, default=10.0, help="Seconds between samples"
+    )
+    parser.add_argument("-v", "--verbose", action="store_true", help="Library logs")
+    parser.add_argument("-o", "--output", help="Write the report to this JSON file")
+    parser.add_argument("-c", "--compare", help="Baseline report to gate against")
+    parser.add_argument("--threshold", type=float, default=1.25, help="p99 ratio")
+    parser.add_argument("--error-slack", type=float, default=0.01)
+    args = parser.parse_args()
+    if not args.verbose:
+        # Rejected fingers are logged as errors, thousands of them in a soak
+        logging.getLogger("gt521f32").setLevel(logging.CRITICAL)
+
+    if args.tracemalloc:
+        tracemalloc.start()
+
+    pool: Optional[DevicePool] = None
+    readers: Dict[str, gt521f32.GT521F32] = {}
+    if args.pool:
+        pool = DevicePool(parallelism=args.devices, baudrate=args.baudrate or None)
+        reader_for = pool.using
+    else:
+        # Each reader is only used by its own device's thread
+        reader_for = lambda port: contextlib.nullcontext(readers[port])
+
+    devices = [Device(index, args, reader_for) for index in range(args.devices)]
+    for device in devices:
+        if pool is not None:
+            pool.add(device.port)
+        else:
+            readers[device.port] = gt521f32.GT521F32(
+                device.port, baudrate=args.baudrate or None
+            )
+            readers[device.port].open()
+
+    recorder = Recorder()
+    stop = threading.Event()
+    started = time.perf_counter()
+    threads = [
+        threading.Thread(target=device.run, args=(started, stop, recorder), daemon=True)
+        for device in devices
+    ]
+    for thread in threads:
+        thread.start()
+
+    memory = []
+    try:
+        while True:
+            now = time.perf_counter() - started
+            traced = tracemalloc.get_traced_memory()[0] if args.tracemalloc else None
+            memory.append((now, rss_bytes(), traced))
+            print(
+                "%8.0fs %8d operations %8.1f/s"
+                % (now, recorder.count(), recorder.count() / max(now, 1e-9)),
+                file=sys.stderr,
+            )
+            remaining = args.duration - now
+            if remaining <= 0 or stop.wait(min(args.sample_interval, remaining)):
+                break
+    except KeyboardInterrupt:
+        pass
+    stop.set()
+    for thread in threads:
+        thread.join()
+    elapsed = time.perf_counter() - started
+
+    if pool is not None:
+        pool.close()
+    for reader in readers.values():
+        reader.close()
+
+    results = report(args, recorder, elapsed, memory)
+    for name, result in results["operations"].items():
+        latency = result["latency"]
+        print(
+            "%-10s %7d ops %7.2f/s  p50 %7.1f ms  p95 %7.1f ms  p99 %7.1f ms"
+            "  errors %6.2f%%"
+            % (
+                name,
+                result["count"],
+                result["throughput"],
+                latency["p50"] * 1e3,
+                latency["p95"] * 1e3,
+                latency["p99"] * 1e3,
+                result["error_rate"] * 100,
+            )
+        )
+    growth = results["memory"]["rss_growth_per_hour"]
+    if growth is not None:
+        print("RSS growth %.1f MB/h" % (growth / 2 ** 20,))
+
+    if args.output:
+        with open(args.output, "w") as output:
+            json.dump(results, output, indent=2, sort_keys=True)
+
+    if args.compare:
+        with open(args.compare) as baseline:
+            if compare(results, json.load(baseline), args.threshold, args.error_slack):
+                return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
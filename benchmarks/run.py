@@ -0,0 +1,248 @@
+# pylint: disable=missing-module-docstring
+# pylint: disable=missing-function-docstring
+import argparse
+import atexit
+import datetime
+import functools
+import json
+import os
+import platform
+import statistics
+import sys
+import threading
+import time
+from typing import Callable, Dict, List, Optional
+
+import gt521f32
+from gt521f32 import packets
+from gt521f32.framering import FrameRing
+from gt521f32.interfaces import SerialInterface, SimulatedInterface
+
+# Benchmarks for the packet codec, the serial transport and end-to-end
+# operations against the simulated device. Run with the package installed
+# (e.g. poetry install):
+#
+#   python benchmarks/run.py --output before.json
+#   python benchmarks/run.py --output after.json --compare before.json
+#
+# End-to-end benchmarks run once per --baudrates entry; the simulator then
+# spends the time the bytes would take on the wire (0 disables that, which
+# leaves only the library's own overhead).
+
+Benchmark = Callable[[], None]
+
+
+def measure(func: Benchmark, rounds: int, number: int) -> Dict[str, float]:
+    func()  # warm up caches
+    samples = []
+    for _ in range(rounds):
+        started = time.perf_counter()
+        for _ in range(number):
+            func()
+        samples.append((time.perf_counter() - started) / number)
+    return {
+        "min": min(samples),
+        "median": statistics.median(samples),
+        "mean": statistics.mean(samples),
+        "stdev": statistics.stdev(samples) if len(samples) > 1 else 0.0,
+        "rounds": rounds,
+        "number": number,
+    }
+
+
+def codec_benchmarks() -> Dict[str, Benchmark]:
+    command = packets.CommandPacket(parameter=1, command=packets.command_codes["OPEN"])
+    response_bytes = packets.ResponsePacket(parameter=7, response=0x30).to_bytes()
+
+    # Real data packets, as produced by the simulated device
+    device = SimulatedInterface("sim://benchmark-codec").device
+    device.press_finger(1)
+
+    def data_packet(command: str) -> bytes:
+        command_bytes = packets.CommandPacket(
+            command=packets.command_codes[command]
+        ).to_bytes()
+        return device.handle(command_bytes)[response_size:]
+
+    response_size = packets.ResponsePacket().byte_size()
+    data_packet("CAPTURE")
+    image_bytes = data_packet("GET_IMAGE")
+    raw_image_bytes = data_packet("GET_RAWIMAGE")
+
+    return {
+        "codec.CommandPacket.to_bytes": command.to_bytes,
+        "codec.ResponsePacket.from_bytes": functools.partial(
+            packets.ResponsePacket.from_bytes, response_bytes
+        ),
+        "codec.GetImageDataPacket.from_bytes": functools.partial(
+            packets.GetImageDataPacket.from_bytes, image_bytes
+        ),
+        "codec.GetRawImageDataPacket.from_bytes": functools.partial(
+            packets.GetRawImageDataPacket.from_bytes, raw_image_bytes
+        ),
+    }
+
+
+class _PtyPair:
+    # A serial port whose other end is driven by a writer thread
+    def __init__(self):
+        self.master, slave = os.openpty()
+        self.interface = SerialInterface(os.ttyname(slave))
+        os.close(slave)
+
+    def read(self, payload: bytes) -> None:
+        writer = threading.Thread(target=os.write, args=(self.master, payload))
+        writer.start()
+        data = self.interface.read(len(payload))
+        writer.join()
+        assert len(data) == len(payload)
+
+    def close(self) -> None:
+        self.interface.close()
+        os.close(self.master)
+
+
+def transport_benchmarks(pty: _PtyPair) -> Dict[str, Benchmark]:
+    response = b"\x55" * packets.ResponsePacket().byte_size()
+    raw_image = b"\x5a" * packets.GetRawImageDataPacket().byte_size()
+    return {
+        "transport.pty.read_response": lambda: pty.read(response),
+        "transport.pty.read_raw_image": lambda: pty.read(raw_image),
+    }
+
+
+def end_to_end_benchmarks(baudrate: int) -> Dict[str, Benchmark]:
+    name = "benchmark-e2e-%d" % (baudrate,)
+    if baudrate:
+        port = "sim://%s?users=50&realtime=1" % (name,)
+        reader = gt521f32.GT521F32(port, baudrate=baudrate)
+    else:
+        reader = gt521f32.GT521F32("sim://%s?users=50" % (name,))
+    device = reader._interface.device  # pylint: disable=protected-access
+    device.press_finger(25)
+
+    def enroll_user():
+        device.press_finger(1000)
+        reader.enroll_user(150)
+        reader.delete_id(150)
+        device.press_finger(25)
+
+    def get_image():
+        reader.capture()
+        reader.get_image()
+
+    ring = FrameRing(4)
+    atexit.register(ring.close)
+
+    def get_image_into_ring():
+        reader.capture()
+        ring.write_from(reader.get_image_into)
+
+    suffix = "@%d" % (baudrate,) if baudrate else "@unthrottled"
+    return {
+        "e2e.identify" + suffix: reader.identify,
+        "e2e.enroll_user" + suffix: enroll_user,
+        "e2e.get_image" + suffix: get_image,
+        "e2e.get_image_into_ring" + suffix: get_image_into_ring,
+        "e2e.check_enrolled_range" + suffix: reader.check_enrolled_range,
+    }
+
+
+def imaging_benchmarks() -> Dict[str, Benchmark]:
+    # Per call over a stack of 100 raw frames; skipped without numpy
+    try:
+        from gt521f32 import imaging  # pylint: disable=import-outside-toplevel
+    except ImportError:
+        return {}
+
+    device = SimulatedInterface("sim://benchmark-imaging").device
+    device.press_finger(1)
+    frame = device.handle(
+        packets.CommandPacket(command=packets.command_codes["GET_RAWIMAGE"]).to_bytes()
+    )[packets.ResponsePacket().byte_size() + 4 : -2]
+    frames = imaging.stack([frame] * 100)
+    background = imaging.estimate_background(frames)
+
+    return {
+        "imaging.subtract_background": lambda: imaging.subtract_background(
+            frames, background
+        ),
+        "imaging.normalize": lambda: imaging.normalize(frames),
+        "imaging.crop_roi": lambda: imaging.crop_roi(frames, (64, 64)),
+        "imaging.resample_1.5": lambda: imaging.resample(frames, 1.5),
+    }
+
+
+def compare(results: Dict, baseline: Dict, threshold: float) -> List[str]:
+    regressions = []
+    for name, result in sorted(results.items()):
+        if name not in baseline:
+            continue
+        ratio = result["median"] / baseline[name]["median"]
+        flag = " REGRESSION" if ratio > threshold else ""
+        print("%-50s %8.3fx%s" % (name, ratio, flag))
+        if flag:
+            regressions.append(name)
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("-o", "--output", help="Write results to this JSON file")
+    parser.add_argument("-c", "--compare", help="Baseline JSON file to compare with")
+    parser.add_argument(
+        "--threshold", type=float, default=1.1, help="Slowdown ratio to flag"
+    )
+    parser.add_argument(
+        "--baudrates",
+        default="0,115200",
+        help="Comma separated baud rates for end-to-end benchmarks",
+    )
+    parser.add_argument("-k", "--filter", default="", help="Only run matching names")
+    parser.add_argument("--rounds", type=int, default=5)
+    args = parser.parse_args()
+
+    pty: Optional[_PtyPair] = None
+    suites = [(codec_benchmarks(), 1000), (imaging_benchmarks(), 10)]
+    if hasattr(os, "openpty"):
+        pty = _PtyPair()
+        suites.append((transport_benchmarks(pty), 10))
+    for baudrate in (int(_) for _ in args.baudrates.split(",") if _):
+        # Wire time dominates at real baud rates, keep those runs short
+        suites.append((end_to_end_benchmarks(baudrate), 1 if baudrate else 20))
+
+    results = {}
+    for benchmarks, number in suites:
+        for name, func in benchmarks.items():
+            if args.filter not in name:
+                continue
+            results[name] = measure(func, args.rounds, number)
+            print("%-50s %12.1f us" % (name, results[name]["median"] * 1e6))
+
+    if pty is not None:
+        pty.close()
+
+    report = {
+        "meta": {
+            "version": getattr(gt521f32, "__version__", None),
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "timestamp": datetime.datetime.now().isoformat(),
+        },
+        "results": results,
+    }
+    if args.output:
+        with open(args.output, "w") as output:
+            json.dump(report, output, indent=2, sort_keys=True)
+
+    if args.compare:
+        with open(args.compare) as baseline:
+            regressions = compare(
+                results, json.load(baseline)["results"], args.threshold
+            )
+        return 1 if regressions else 0
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
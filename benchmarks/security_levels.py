@@ -0,0 +1,141 @@
+# pylint: disable=missing-module-docstring
+# pylint: disable=missing-function-docstring
+import argparse
+import json
+import sys
+import time
+from typing import Dict
+
+import gt521f32
+from gt521f32 import security
+
+# Identify throughput and false reject rate at each security level. A
+# rejected genuine finger is retried, as a door controller would, so
+# stricter levels cost attempts.
+#
+# With -d the levels are measured on a real reader: place an enrolled finger
+# when the LED comes on and lift it after each sample. Only device time is
+# counted, and the reader's own security level is restored afterwards.
+#
+# Without -d it runs against the simulator, whose false reject rates are
+# constants in gt521f32.interfaces.simulated, so the output only illustrates
+# the trade-off and says nothing about the hardware:
+#
+#   python benchmarks/security_levels.py -d /dev/ttyUSB0 --samples 20
+#   python benchmarks/security_levels.py --samples 500 --output levels.json
+
+SIMULATED_BAUD_RATE = 115200
+
+
+def _open(level: int, args) -> gt521f32.GT521F32:
+    if args.device:
+        return gt521f32.GT521F32(args.device, baudrate=args.baudrate)
+    port = "sim://security-benchmark-%d?users=50&finger=25" % (level,)
+    baudrate = SIMULATED_BAUD_RATE if args.baudrate is None else args.baudrate
+    if baudrate:
+        port += "&realtime=1"
+    return gt521f32.GT521F32(port, baudrate=baudrate or None)
+
+
+def _wait_for_lift(reader: gt521f32.GT521F32) -> None:
+    while reader.is_finger_pressed():
+        time.sleep(0.1)
+
+
+def run_level(level: int, args) -> Dict[str, float]:
+    with _open(level, args) as reader:
+        original_level = reader.get_security_level()
+        reader.apply_profile(security.SecurityProfile(level))
+        if args.device:
+            print(
+                "Level %d: present an enrolled finger %d times" % (level, args.samples)
+            )
+
+        attempts = rejected = failed = 0
+        elapsed = 0.0
+        try:
+            for _ in range(args.samples):
+                if args.device:
+                    reader.set_led(True)
+                    reader.wait_for_finger_press()
+                started = time.perf_counter()
+                for _ in range(args.max_attempts):
+                    attempts += 1
+                    reader.capture()
+                    if reader.identify_captured() is not None:
+                        break
+                    rejected += 1
+                else:
+                    failed += 1
+                elapsed += time.perf_counter() - started
+                if args.device:
+                    reader.set_led(False)
+                    _wait_for_lift(reader)
+        finally:
+            reader.set_security_level(original_level)
+
+    return {
+        "identifications_per_second": (args.samples - failed) / elapsed,
+        "attempts_per_identification": attempts / args.samples,
+        "false_reject_rate": rejected / attempts,
+        "failed": failed,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument(
+        "-d", "--device", help="Measure this reader instead of the simulator"
+    )
+    parser.add_argument("-n", "--samples", type=int, default=200)
+    parser.add_argument(
+        "-b",
+        "--baudrate",
+        type=int,
+        default=None,
+        help="Simulated: defaults to %d, 0 for no wire time" % (SIMULATED_BAUD_RATE,),
+    )
+    parser.add_argument(
+        "--max-attempts", type=int, default=3, help="Retries per genuine finger"
+    )
+    parser.add_argument("-o", "--output", help="Write results to this JSON file")
+    args = parser.parse_args()
+
+    source = args.device or "simulator"
+    if not args.device:
+        print(
+            "Simulated reader: the reject rates are the simulator's constants, "
+            "illustrative only. Use -d to measure a real reader."
+        )
+
+    results = {}
+    for level in range(security.MIN_SECURITY_LEVEL, security.MAX_SECURITY_LEVEL + 1):
+        results[level] = run_level(level, args)
+        print(
+            "level %d: %7.1f ids/s %5.3f attempts/id %6.2f%% rejects %d failed"
+            % (
+                level,
+                results[level]["identifications_per_second"],
+                results[level]["attempts_per_identification"],
+                results[level]["false_reject_rate"] * 100,
+                results[level]["failed"],
+            )
+        )
+
+    if args.output:
+        with open(args.output, "w") as output:
+            json.dump(
+                {
+                    "source": source,
+                    "illustrative": not args.device,
+                    "levels": results,
+                },
+                output,
+                indent=2,
+                sort_keys=True,
+            )
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -1,5 +1,8 @@
 # pylint: disable=missing-module-docstring
 # pylint: disable=missing-class-docstring
 # pylint: disable=missing-function-docstring
-from .gt521f32 import GT521F32, GT521F32Exception
+from .gt521f32 import GT521F32, GT521F32Exception, GT521F32TimeoutException
 from .gt521f32 import logger as GT521F32Logger
+from .bulk import BulkResult
+from .retry import RetryPolicy, RetryMetrics
+from .security import SecurityProfile
@@ -0,0 +1,53 @@
+# pylint: disable=bad-continuation # Black and pylint disagree on this
+# pylint: disable=missing-module-docstring
+# pylint: disable=missing-class-docstring
+# pylint: disable=missing-function-docstring
+import array
+import collections
+from typing import Dict, NamedTuple
+
+from . import packets
+
+# Outcome of one command sent for many IDs, kept as two parallel arrays of
+# 16-bit values rather than an object per ID
+
+
+class BulkResult(NamedTuple):
+    command: str
+    ids: array.array  # in the order they were sent
+    errors: array.array  # 0 where the device ACKed, its NACK error otherwise
+    elapsed: float  # seconds
+
+    def __len__(self) -> int:  # type: ignore
+        return len(self.ids)
+
+    @property
+    def succeeded(self) -> array.array:
+        # e.g. the enrolled IDs of a CHECK_ENROLLED scan
+        return array.array(
+            "H", (user_id for user_id, error in zip(self.ids, self.errors) if not error)
+        )
+
+    def failed(self, error: str) -> array.array:
+        # The IDs NACKed with the given error, e.g. NACK_IS_NOT_USED
+        code = packets.response_error[error]
+        return array.array(
+            "H",
+            (user_id for user_id, found in zip(self.ids, self.errors) if found == code),
+        )
+
+    @property
+    def commands_per_second(self) -> float:
+        return len(self.ids) / self.elapsed if self.elapsed else 0.0
+
+    def summary(self) -> Dict[str, int]:
+        # How many IDs ended with each outcome, ACK_OK or an error name
+        counts = collections.Counter(self.errors)
+        return {
+            (
+                "ACK_OK"
+                if error == 0
+                else packets.response_error_names.get(error, hex(error))
+            ): count
+            for error, count in sorted(counts.items())
+        }
@@ -0,0 +1,203 @@
+# pylint: disable=bad-continuation # Black and pylint disagree on this
+# pylint: disable=missing-module-docstring
+# pylint: disable=missing-class-docstring
+# pylint: disable=missing-function-docstring
+import contextlib
+import logging
+import threading
+from typing import (
+    Any,
+    Callable,
+    Dict,
+    Iterable,
+    Iterator,
+    List,
+    Optional,
+    TypeVar,
+    Union,
+)
+
+from . import packets
+from .gt521f32 import GT521F32, GT521F32Exception
+from .interfaces import InterfaceException
+
+# Several modules, each given its own device id, wired to one UART. Only
+# the addressed module answers a packet, but they all share the line, so a
+# session owns the bus from its command to the last byte of its answer.
+# The arbiter hands the bus out one operation at a time, in the order it
+# was asked for, so a busy module cannot starve the others:
+#
+#     with BusArbiter("/dev/ttyUSB0") as bus:  # scans for modules
+#         with bus.using(2) as reader:
+#             reader.identify()
+
+logger = logging.getLogger(__name__)  # pylint: disable=invalid-name
+
+T = TypeVar("T")  # pylint: disable=invalid-name
+
+_DEVICE_ERRORS = (GT521F32Exception, InterfaceException)
+
+SCAN_IDS = range(1, 256)
+SCAN_TIMEOUT = 0.05  # seconds; an answer to OPEN takes a few milliseconds
+
+
+class BusException(GT521F32Exception):
+    pass
+
+
+class _FairLock:
+    # A reentrant lock granted in request order
+    def __init__(self):
+        self._condition = threading.Condition()
+        self._next_ticket = 0
+        self._serving = 0
+        self._owner: Optional[int] = None
+        self._depth = 0
+
+    def acquire(self) -> None:
+        me = threading.get_ident()
+        with self._condition:
+            if self._owner == me:
+                self._depth += 1
+                return
+            ticket = self._next_ticket
+            self._next_ticket += 1
+            while self._serving != ticket:
+                self._condition.wait()
+            self._owner, self._depth = me, 1
+
+    def release(self) -> None:
+        with self._condition:
+            assert self._owner == threading.get_ident()
+            self._depth -= 1
+            if not self._depth:
+                self._owner = None
+                self._serving += 1
+                self._condition.notify_all()
+
+    def held(self) -> bool:
+        return self._owner == threading.get_ident()
+
+
+class _BusPort:
+    # What one module's session sees of the bus; writing without holding
+    # the bus would interleave with another module's exchange
+    def __init__(self, inner: Any, lock: _FairLock):
+        self.inner = inner
+        self._lock = lock
+
+    def __getattr__(self, name: str) -> Any:
+        return getattr(self.inner, name)
+
+    def write(self, data):
+        if not self._lock.held():
+            raise BusException("The bus has to be held, see BusArbiter.using().")
+        return self.inner.write(data)
+
+    def close(self):
+        pass  # The arbiter closes the bus
+
+
+class BusArbiter:
+    _readers: Dict[int, GT521F32]
+
+    def __init__(
+        self,
+        port: str,
+        baudrate: Optional[int] = None,
+        device_ids: Optional[Iterable[int]] = None,
+    ):
+        # Without device_ids the bus is scanned, which takes SCAN_TIMEOUT for
+        # every free address
+        self._port = port
+        self._interface = GT521F32.open_interface(port, baudrate)
+        self._lock = _FairLock()
+        self._readers = {}
+        try:
+            self._device_ids = self.scan() if device_ids is None else sorted(device_ids)
+        except _DEVICE_ERRORS:
+            self._interface.close()
+            raise
+
+    def __enter__(self) -> "BusArbiter":
+        return self
+
+    def __exit__(self, *exc_info) -> None:
+        self.close()
+
+    @property
+    def device_ids(self) -> List[int]:
+        return list(self._device_ids)
+
+    @contextlib.contextmanager
+    def held(self) -> Iterator[None]:
+        self._lock.acquire()
+        try:
+            yield
+        finally:
+            self._lock.release()
+
+    def scan(
+        self, device_ids: Iterable[int] = SCAN_IDS, timeout: float = SCAN_TIMEOUT
+    ) -> List[int]:
+        # The addresses that answer OPEN
+        found = []
+        command = packets.command_codes["OPEN"]
+        with self.held():
+            for device_id in device_ids:
+                self._interface.reset_input_buffer()
+                self._interface.write(packets.encode_command(command, 0, device_id))
+                response = packets.decode_response(
+                    self._interface.read(packets.PACKET_SIZE, timeout=timeout),
+                    device_id,
+                )
+                if response is not None:
+                    found.append(device_id)
+            self._interface.reset_input_buffer()
+        logger.info("Modules on %s: %s", self._port, found)
+        self._device_ids = found
+        return found
+
+    def reader(self, device_id: int) -> GT521F32:
+        # The session with one module, opened on first use. Only use it
+        # while holding the bus.
+        with self.held():
+            if device_id not in self._readers:
+                reader = GT521F32(
+                    self._port,
+                    device_id=device_id,
+                    interface=_BusPort(self._interface, self._lock),
+                )
+                reader.open()
+                self._readers[device_id] = reader
+            return self._readers[device_id]
+
+    @contextlib.contextmanager
+    def using(self, device_id: int) -> Iterator[GT521F32]:
+        # The module's session, with the bus held for the block
+        with self.held():
+            yield self.reader(device_id)
+
+    def run(
+        self,
+        operation: Callable[[GT521F32], T],
+        device_ids: Optional[Iterable[int]] = None,
+    ) -> Dict[int, Union[T, Exception]]:
+        # Runs operation on each module in turn, releasing the bus in between
+        # so other callers get their turns; results are as DevicePool.run's
+        results: Dict[int, Union[T, Exception]] = {}
+        for device_id in self._device_ids if device_ids is None else device_ids:
+            try:
+                with self.using(device_id) as reader:
+                    results[device_id] = operation(reader)
+            except _DEVICE_ERRORS as e:  # pylint: disable=invalid-name
+                logger.error("Device %d failed: %s", device_id, e)
+                results[device_id] = e
+        return results
+
+    def close(self) -> None:
+        with self.held():
+            for reader in self._readers.values():
+                reader.close()
+            self._readers.clear()
+            self._interface.close()
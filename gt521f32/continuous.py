@@ -0,0 +1,178 @@
+# pylint: disable=bad-continuation # Black and pylint disagree on this
+# pylint: disable=missing-module-docstring
+# pylint: disable=missing-class-docstring
+# pylint: disable=missing-function-docstring
+import logging
+import queue
+import threading
+import time
+from typing import Callable, ClassVar, NamedTuple, Optional
+
+from .framering import FrameRing
+from .gt521f32 import GT521F32, GT521F32Exception
+from .interfaces import InterfaceException
+
+logger = logging.getLogger(__name__)  # pylint: disable=invalid-name
+
+_DEVICE_ERRORS = (GT521F32Exception, InterfaceException)
+
+
+class IdentifyEvent(NamedTuple):
+    user_id: Optional[int]  # None for a finger that is not enrolled
+    timestamp: float  # wall clock time of the finger detection
+    latency: float  # seconds from finger detection to the result
+    image: Optional[bytes] = None  # the captured image, with fetch_image
+    frame_sequence: int = 0  # the captured image in frame_ring, 0 for none
+
+
+class ContinuousIdentifier:
+    # Keeps the LED on and identifies every finger placed on the sensor,
+    # publishing results to a bounded queue (or a callback) from a
+    # background thread. When the queue is full the oldest event is dropped,
+    # so a slow consumer never stalls the sensor.
+    _POLL_INTERVAL: ClassVar[float] = 0.05
+    _ERROR_BACKOFF: ClassVar[float] = 0.5
+
+    _reader: GT521F32
+    events: "queue.Queue[IdentifyEvent]"
+    dropped: int
+    errors: int
+
+    def __init__(  # pylint: disable=too-many-arguments
+        self,
+        reader: GT521F32,
+        queue_size: int = 64,
+        callback: Optional[Callable[[IdentifyEvent], None]] = None,
+        debounce: float = 1.0,
+        poll_interval: float = _POLL_INTERVAL,
+        report_unknown: bool = True,
+        fetch_image: bool = False,
+        frame_ring: Optional[FrameRing] = None,
+    ):
+        # With frame_ring, images are downloaded straight into the ring
+        # instead of being attached to the events
+        self._reader = reader
+        self._callback = callback
+        self._debounce = debounce
+        self._poll_interval = poll_interval
+        self._report_unknown = report_unknown
+        self._fetch_image = fetch_image
+        self._frame_ring = frame_ring
+
+        self.events = queue.Queue(maxsize=queue_size)
+        self.dropped = 0
+        self.errors = 0
+
+        self._stop = threading.Event()
+        self._threads = []
+        self._last_event: Optional[IdentifyEvent] = None
+
+    def __enter__(self) -> "ContinuousIdentifier":
+        self.start()
+        return self
+
+    def __exit__(self, *exc_info) -> None:
+        self.stop()
+
+    @property
+    def running(self) -> bool:
+        return any(thread.is_alive() for thread in self._threads)
+
+    def start(self) -> None:
+        assert not self.running
+        self._stop.clear()
+        self._threads = [threading.Thread(target=self._run, daemon=True)]
+        if self._callback is not None:
+            self._threads.append(threading.Thread(target=self._dispatch, daemon=True))
+        for thread in self._threads:
+            thread.start()
+
+    def stop(self, timeout: Optional[float] = None) -> None:
+        self._stop.set()
+        for thread in self._threads:
+            thread.join(timeout)
+
+    def get(self, timeout: Optional[float] = None) -> IdentifyEvent:
+        # Raises queue.Empty on timeout
+        return self.events.get(timeout=timeout)
+
+    def _publish(self, event: IdentifyEvent) -> None:
+        while True:
+            try:
+                self.events.put_nowait(event)
+                return
+            except queue.Full:
+                try:
+                    self.events.get_nowait()
+                    self.dropped += 1
+                except queue.Empty:
+                    pass
+
+    def _dispatch(self) -> None:
+        while not self._stop.is_set():
+            try:
+                event = self.events.get(timeout=self._poll_interval)
+            except queue.Empty:
+                continue
+            try:
+                self._callback(event)  # type: ignore
+            except Exception:  # pylint: disable=broad-except
+                logger.exception("Identify callback failed.")
+
+    def _is_repeat(self, user_id: Optional[int], detected_at: float) -> bool:
+        last = self._last_event
+        return (
+            last is not None
+            and last.user_id == user_id
+            and detected_at - last.timestamp < self._debounce
+        )
+
+    def _identify_once(
+        self, detected_at: float, started: float
+    ) -> Optional[IdentifyEvent]:
+        user_id = self._reader.identify_captured()
+        latency = time.monotonic() - started
+
+        if user_id is None and not self._report_unknown:
+            return None
+        if self._is_repeat(user_id, detected_at):
+            return None
+
+        # Downloaded after the result is known, so it does not add latency
+        image, sequence = None, 0
+        if self._frame_ring is not None:
+            sequence = self._frame_ring.write_from(self._reader.get_image_into) or 0
+        elif self._fetch_image:
+            image = self._reader.get_image()
+        return IdentifyEvent(user_id, detected_at, latency, image, sequence)
+
+    def _run(self) -> None:
+        finger_down = False
+        try:
+            self._reader.set_led(True)
+            while not self._stop.is_set():
+                try:
+                    pressed = self._reader.is_finger_pressed()
+                    if not pressed or finger_down:
+                        # A finger that stays on the sensor is reported once
+                        finger_down = pressed
+                        self._stop.wait(self._poll_interval)
+                        continue
+
+                    detected_at, started = time.time(), time.monotonic()
+                    if not self._reader.capture():
+                        continue  # Lifted too early or a bad image, try again
+                    finger_down = True
+                    event = self._identify_once(detected_at, started)
+                    if event is not None:
+                        self._last_event = event
+                        self._publish(event)
+                except _DEVICE_ERRORS as e:  # pylint: disable=invalid-name
+                    self.errors += 1
+                    logger.error("Continuous identification error: %s", e)
+                    self._stop.wait(self._ERROR_BACKOFF)
+        finally:
+            try:
+                self._reader.set_led(False)
+            except _DEVICE_ERRORS as e:  # pylint: disable=invalid-name
+                logger.error("Could not turn the LED off: %s", e)
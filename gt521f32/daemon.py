@@ -0,0 +1,468 @@
+# pylint: disable=bad-continuation # Black and pylint disagree on this
+# pylint: disable=missing-module-docstring
+# pylint: disable=missing-class-docstring
+# pylint: disable=missing-function-docstring
+import argparse
+import getpass
+import json
+import logging
+import os
+import signal
+import socket
+import socketserver
+import sys
+import tempfile
+import threading
+from typing import Any, Callable, Dict, Iterable, List, Optional
+
+from . import packets
+from .framering import FrameRing
+from .gt521f32 import (
+    GT521F32,
+    GT521F32Exception,
+    GT521F32TimeoutException,
+    save_bitmap_to_file,
+)
+from .interfaces import InterfaceException
+from .pool import DevicePool
+
+# Keeps readers open between short-lived tools. The daemon owns the device
+# sessions and answers JSON lines on a Unix socket:
+#
+#   -> {"id": 1, "method": "identify", "device": "/dev/ttyUSB0", "params": {}}
+#   <- {"id": 1, "result": 3}
+#
+# device may be left out when the daemon serves one reader. Images are not
+# sent over the socket: they are written to a FrameRing per reader and the
+# response names the ring and the frame's sequence number.
+#
+#   python -m gt521f32.daemon serve -d /dev/ttyUSB0 &
+#   python -m gt521f32.daemon identify --timeout 10
+
+logger = logging.getLogger(__name__)  # pylint: disable=invalid-name
+
+ERROR_REQUEST = "request"
+ERROR_DEVICE = "device"
+ERROR_TIMEOUT = "timeout"
+
+MODULE_INFO_FIELDS = (
+    "sensor",
+    "engine_version",
+    "raw_img_width",
+    "raw_img_height",
+    "img_width",
+    "img_height",
+    "max_record_count",
+    "enroll_count",
+    "template_size",
+)
+
+Params = Dict[str, Any]
+
+
+class DaemonException(GT521F32Exception):
+    pass
+
+
+def default_socket_path() -> str:
+    directory = os.environ.get("XDG_RUNTIME_DIR") or tempfile.gettempdir()
+    owner = os.getuid() if hasattr(os, "getuid") else getpass.getuser()
+    return os.path.join(directory, "gt521f32-%s.sock" % (owner,))
+
+
+class _RequestHandler(socketserver.StreamRequestHandler):
+    server: "_DaemonServer"
+
+    def handle(self):
+        for line in self.rfile:
+            try:
+                request = json.loads(line)
+                if not isinstance(request, dict):
+                    raise ValueError("Request is not an object")
+            except ValueError as e:  # pylint: disable=invalid-name
+                response = {"id": None, "error": _error(ERROR_REQUEST, e)}
+            else:
+                response = self.server.service.handle_request(request)
+            try:
+                self.wfile.write(json.dumps(response).encode("utf-8") + b"\n")
+            except OSError:
+                break
+
+
+class _DaemonServer(socketserver.ThreadingMixIn, socketserver.UnixStreamServer):
+    daemon_threads = True
+
+    def __init__(self, service: "Daemon", path: str):
+        self.service = service
+        super().__init__(path, _RequestHandler)
+
+
+def _error(kind: str, error: Exception) -> Dict[str, str]:
+    if isinstance(error, KeyError) and error.args:
+        # str() of a KeyError is the repr of its key
+        return {"type": kind, "message": "Missing %s" % (error.args[0],)}
+    return {"type": kind, "message": str(error)}
+
+
+class Daemon:
+    # Operations on one reader are serialized, different readers run
+    # concurrently
+    _server: Optional[_DaemonServer] = None
+    _rings: Dict[str, Dict[str, FrameRing]]  # port -> image kind -> ring
+    _led: Dict[str, bool]  # whether a client turned the LED on
+    _handlers: Dict[str, Callable[[GT521F32, str, Params], Any]]
+
+    def __init__(
+        self,
+        ports: Iterable[str],
+        socket_path: Optional[str] = None,
+        baudrate: Optional[int] = None,
+        frame_slots: int = 4,
+    ):
+        self.socket_path = socket_path or default_socket_path()
+        self._claim_socket()  # Before touching readers another daemon may own
+        self._pool = DevicePool(ports, baudrate=baudrate)
+        self._rings = {
+            port: {
+                "image": FrameRing(frame_slots, packets.IMAGE_SIZE),
+                "raw": FrameRing(frame_slots, packets.RAW_IMAGE_SIZE),
+            }
+            for port in self._pool.ports
+        }
+        self._led = {port: False for port in self._pool.ports}
+        self._handlers = {
+            "identify": self._identify,
+            "enroll": self._enroll,
+            "delete": self._delete,
+            "enrolled": self._enrolled,
+            "module_info": self._module_info,
+            "set_led": self._set_led,
+            "get_image": self._get_image,
+            "get_raw_image": self._get_raw_image,
+        }
+
+    def __enter__(self) -> "Daemon":
+        return self
+
+    def __exit__(self, *exc_info) -> None:
+        self.close()
+
+    def _claim_socket(self) -> None:
+        # A socket file left by a daemon that died is removed, a live one
+        # is not
+        if not os.path.exists(self.socket_path):
+            return
+        probe = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        try:
+            probe.connect(self.socket_path)
+        except OSError:
+            os.unlink(self.socket_path)
+        else:
+            raise DaemonException(
+                "A daemon is already listening on %s" % (self.socket_path,)
+            )
+        finally:
+            probe.close()
+
+    def listen(self) -> None:
+        self._claim_socket()
+        self._server = _DaemonServer(self, self.socket_path)
+        os.chmod(self.socket_path, 0o600)  # Only this user may drive the readers
+        logger.info("Serving %s on %s", ", ".join(self._pool.ports), self.socket_path)
+
+    def serve_forever(self) -> None:
+        if self._server is None:
+            self.listen()
+        assert self._server is not None
+        self._server.serve_forever()
+
+    def serve_in_background(self) -> threading.Thread:
+        if self._server is None:
+            self.listen()
+        thread = threading.Thread(target=self.serve_forever, daemon=True)
+        thread.start()
+        return thread
+
+    def close(self) -> None:
+        if self._server is not None:
+            self._server.shutdown()
+            self._server.server_close()
+            self._server = None
+            try:
+                os.unlink(self.socket_path)
+            except FileNotFoundError:
+                pass
+        for rings in self._rings.values():
+            for ring in rings.values():
+                ring.close()
+        self._rings = {}
+        self._pool.close()
+
+    def _port(self, device: Optional[str]) -> str:
+        if device is None:
+            if len(self._pool) != 1:
+                raise ValueError("device is required with several readers")
+            return self._pool.ports[0]
+        if device not in self._rings:
+            raise ValueError("Unknown device %s" % (device,))
+        return device
+
+    def handle_request(self, request: Dict[str, Any]) -> Dict[str, Any]:
+        response: Dict[str, Any] = {"id": request.get("id")}
+        try:
+            method = request["method"]
+            params = request.get("params") or {}
+            if method == "devices":
+                response["result"] = self._devices()
+                return response
+            handler = self._handlers.get(method)
+            if handler is None:
+                raise ValueError("Unknown method %s" % (method,))
+            port = self._port(request.get("device"))
+            with self._pool.using(port) as reader:
+                response["result"] = handler(reader, port, params)
+        except GT521F32TimeoutException as e:  # pylint: disable=invalid-name
+            response["error"] = _error(ERROR_TIMEOUT, e)
+        except (GT521F32Exception, InterfaceException) as e:  # pylint: disable=C0103
+            logger.error("%s failed: %s", request.get("method"), e)
+            response["error"] = _error(ERROR_DEVICE, e)
+        except (KeyError, TypeError, ValueError) as e:  # pylint: disable=C0103
+            response["error"] = _error(ERROR_REQUEST, e)
+        return response
+
+    def _devices(self) -> List[Dict[str, Any]]:
+        return [
+            {
+                "port": port,
+                "serial_number": self._pool[port].device_serial_number,
+                "firmware_version": self._pool[port].firmware_version,
+            }
+            for port in self._pool.ports
+        ]
+
+    @staticmethod
+    def _identify(reader: GT521F32, _: str, params: Params) -> Optional[int]:
+        return reader.identify(timeout=params.get("timeout"))
+
+    @staticmethod
+    def _enroll(reader: GT521F32, _: str, params: Params) -> bool:
+        return reader.enroll_user(int(params["user_id"]), timeout=params.get("timeout"))
+
+    @staticmethod
+    def _delete(reader: GT521F32, _: str, params: Params) -> bool:
+        return reader.delete_id(int(params["user_id"]), timeout=params.get("timeout"))
+
+    @staticmethod
+    def _enrolled(reader: GT521F32, _: str, params: Params) -> List[int]:
+        return list(
+            reader.check_enrolled_range(timeout=params.get("timeout")).succeeded
+        )
+
+    @staticmethod
+    def _module_info(reader: GT521F32, _: str, params: Params) -> Dict[str, Any]:
+        return dict(
+            zip(MODULE_INFO_FIELDS, reader.module_info(timeout=params.get("timeout")))
+        )
+
+    def _set_led(self, reader: GT521F32, port: str, params: Params) -> None:
+        onoff = bool(params["on"])
+        reader.set_led(onoff, timeout=params.get("timeout"))
+        self._led[port] = onoff
+
+    def _frame(self, port: str, kind: str, sequence: Optional[int]) -> Any:
+        if sequence is None:
+            return None
+        return {"ring": self._rings[port][kind].name, "sequence": sequence}
+
+    def _get_image(self, reader: GT521F32, port: str, params: Params) -> Any:
+        # Waits for a finger, like identify
+        timeout = params.get("timeout")
+        with reader.deadline(timeout):
+            reader.prompt_finger_and_capture()
+            sequence = self._rings[port]["image"].write_from(reader.get_image_into)
+        return self._frame(port, "image", sequence)
+
+    def _get_raw_image(self, reader: GT521F32, port: str, params: Params) -> Any:
+        # A client streaming frames keeps the LED on with set_led, rather
+        # than having it toggled around every frame
+        fill = (
+            reader._get_raw_image_into  # pylint: disable=protected-access
+            if self._led[port]
+            else reader.get_raw_image_into
+        )
+        with reader.deadline(params.get("timeout")):
+            sequence = self._rings[port]["raw"].write_from(fill)
+        return self._frame(port, "raw", sequence)
+
+
+class DaemonClient:
+    # Mirrors the reader's methods; calls may be made from several threads
+    def __init__(self, socket_path: Optional[str] = None, device: Optional[str] = None):
+        self.socket_path = socket_path or default_socket_path()
+        self.device = device
+        self._socket = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        try:
+            self._socket.connect(self.socket_path)
+        except OSError as e:  # pylint: disable=invalid-name
+            self._socket.close()
+            raise DaemonException(
+                "Could not connect to the daemon on %s: %s" % (self.socket_path, e)
+            )
+        self._file = self._socket.makefile("rwb")
+        self._lock = threading.Lock()
+        self._next_id = 0
+        self._rings: Dict[str, FrameRing] = {}
+
+    def __enter__(self) -> "DaemonClient":
+        return self
+
+    def __exit__(self, *exc_info) -> None:
+        self.close()
+
+    def close(self) -> None:
+        for ring in self._rings.values():
+            ring.close()
+        self._rings = {}
+        self._file.close()
+        self._socket.close()
+
+    def call(self, method: str, **params) -> Any:
+        request: Dict[str, Any] = {
+            "method": method,
+            "params": {
+                key: value for key, value in params.items() if value is not None
+            },
+        }
+        if self.device is not None:
+            request["device"] = self.device
+        with self._lock:
+            self._next_id += 1
+            request["id"] = self._next_id
+            try:
+                self._file.write(json.dumps(request).encode("utf-8") + b"\n")
+                self._file.flush()
+                line = self._file.readline()
+            except OSError as e:  # pylint: disable=invalid-name
+                raise DaemonException("Lost the daemon connection: %s" % (e,))
+        if not line:
+            raise DaemonException("The daemon closed the connection.")
+
+        response = json.loads(line)
+        error = response.get("error")
+        if error is None:
+            return response.get("result")
+        if error["type"] == ERROR_TIMEOUT:
+            raise GT521F32TimeoutException(error["message"])
+        raise DaemonException("%s error: %s" % (error["type"], error["message"]))
+
+    def devices(self) -> List[Dict[str, Any]]:
+        return self.call("devices")
+
+    def identify(self, timeout: Optional[float] = None) -> Optional[int]:
+        return self.call("identify", timeout=timeout)
+
+    def enroll_user(self, user_id: int, timeout: Optional[float] = None) -> bool:
+        return self.call("enroll", user_id=user_id, timeout=timeout)
+
+    def delete_id(self, user_id: int, timeout: Optional[float] = None) -> bool:
+        return self.call("delete", user_id=user_id, timeout=timeout)
+
+    def enrolled(self, timeout: Optional[float] = None) -> List[int]:
+        return self.call("enrolled", timeout=timeout)
+
+    def module_info(self, timeout: Optional[float] = None) -> Dict[str, Any]:
+        return self.call("module_info", timeout=timeout)
+
+    def set_led(self, onoff: bool, timeout: Optional[float] = None) -> None:
+        self.call("set_led", on=onoff, timeout=timeout)
+
+    def _frame(self, reference: Optional[Dict[str, Any]]) -> Optional[bytes]:
+        # None when the reader failed, or when newer frames already
+        # overwrote this one in the ring
+        if reference is None:
+            return None
+        ring = self._rings.get(reference["ring"])
+        if ring is None:
+            ring = self._rings[reference["ring"]] = FrameRing.attach(reference["ring"])
+        return ring.read(reference["sequence"])
+
+    def get_image(self, timeout: Optional[float] = None) -> Optional[bytes]:
+        return self._frame(self.call("get_image", timeout=timeout))
+
+    def get_raw_image(self, timeout: Optional[float] = None) -> Optional[bytes]:
+        return self._frame(self.call("get_raw_image", timeout=timeout))
+
+
+def _serve(args) -> int:
+    if not args.device:
+        print("serve needs at least one -d/--device")
+        return 2
+    stop = threading.Event()
+    signal.signal(signal.SIGTERM, lambda *_: stop.set())
+    try:
+        with Daemon(args.device, args.socket, args.baudrate) as daemon:
+            daemon.serve_in_background()
+            try:
+                stop.wait()
+            except KeyboardInterrupt:
+                pass
+    except GT521F32Exception as e:  # pylint: disable=invalid-name
+        print("Could not start the daemon: %s" % (e,))
+        return 1
+    return 0
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Serve GT521F32 readers on a Unix socket, or talk to the daemon."
+    )
+    parser.add_argument("-s", "--socket", help="Default %s" % (default_socket_path(),))
+    parser.add_argument(
+        "-d",
+        "--device",
+        action="append",
+        help="Reader to serve, or to use on a daemon serving several",
+    )
+    parser.add_argument("-b", "--baudrate", type=int, help="For serve")
+    parser.add_argument("-t", "--timeout", type=float)
+    commands = parser.add_subparsers(dest="command", required=True)
+    commands.add_parser("serve")
+    commands.add_parser("devices")
+    commands.add_parser("identify")
+    commands.add_parser("enroll").add_argument("user_id", type=int)
+    commands.add_parser("delete").add_argument("user_id", type=int)
+    commands.add_parser("enrolled")
+    commands.add_parser("module-info")
+    commands.add_parser("get-image").add_argument("output", help="BMP file")
+    args = parser.parse_args()
+    logging.basicConfig(level=logging.INFO)
+
+    if args.command == "serve":
+        return _serve(args)
+
+    try:
+        with DaemonClient(args.socket, (args.device or [None])[0]) as client:
+            if args.command == "get-image":
+                image = client.get_image(args.timeout)
+                if image is None:
+                    print("Could not get an image.")
+                    return 1
+                save_bitmap_to_file(args.output, image)
+                return 0
+            result = {
+                "devices": client.devices,
+                "identify": lambda: client.identify(args.timeout),
+                "enroll": lambda: client.enroll_user(args.user_id, args.timeout),
+                "delete": lambda: client.delete_id(args.user_id, args.timeout),
+                "enrolled": lambda: client.enrolled(args.timeout),
+                "module-info": lambda: client.module_info(args.timeout),
+            }[args.command]()
+    except GT521F32Exception as e:  # pylint: disable=invalid-name
+        print(e)
+        return 1
+    print(json.dumps(result))
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,230 @@
+# pylint: disable=bad-continuation # Black and pylint disagree on this
+# pylint: disable=missing-module-docstring
+# pylint: disable=missing-class-docstring
+# pylint: disable=missing-function-docstring
+import logging
+import sqlite3
+import threading
+import time
+from typing import Dict, Iterable, List, NamedTuple, Optional, Set, Tuple
+
+from . import packets
+from .gt521f32 import GT521F32, GT521F32Exception
+
+# Maps (reader serial number, slot) to the key of a user in some external
+# system. Entries are stored in SQLite and mirrored in dicts, so resolving
+# an identify result never touches the disk.
+
+logger = logging.getLogger(__name__)  # pylint: disable=invalid-name
+
+MAX_SLOTS = 200  # GT521F32 database size
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS slots (
+    serial_number TEXT NOT NULL,
+    slot INTEGER NOT NULL,
+    user_key TEXT NOT NULL,
+    enrolled_at REAL NOT NULL,
+    PRIMARY KEY (serial_number, slot)
+);
+CREATE INDEX IF NOT EXISTS slots_by_user ON slots (user_key);
+"""
+
+Location = Tuple[str, int]  # reader serial number, slot
+
+
+class DirectoryException(GT521F32Exception):
+    pass
+
+
+class ReconcileReport(NamedTuple):
+    stale: List[int]  # mapped here, but empty on the reader
+    unmapped: List[int]  # enrolled on the reader, unknown here
+    unchecked: Dict[int, str] = {}  # slots the reader could not report, by error
+
+
+class UserDirectory:
+    _slots: Dict[str, Dict[int, str]]  # serial number -> slot -> user key
+    _locations: Dict[str, Set[Location]]
+
+    def __init__(self, path: str = ":memory:"):
+        self._lock = threading.RLock()
+        self._connection = sqlite3.connect(path, check_same_thread=False)
+        if path != ":memory:":
+            self._connection.execute("PRAGMA journal_mode=WAL")
+            self._connection.execute("PRAGMA synchronous=NORMAL")
+        self._connection.executescript(_SCHEMA)
+
+        self._slots, self._locations = {}, {}
+        for serial_number, slot, user_key in self._connection.execute(
+            "SELECT serial_number, slot, user_key FROM slots"
+        ):
+            self._index((serial_number, slot), user_key)
+
+    def __enter__(self) -> "UserDirectory":
+        return self
+
+    def __exit__(self, *exc_info) -> None:
+        self.close()
+
+    def __len__(self) -> int:
+        return sum(len(slots) for slots in self._slots.values())
+
+    def close(self) -> None:
+        with self._lock:
+            self._connection.close()
+
+    def _index(self, location: Location, user_key: str) -> None:
+        serial_number, slot = location
+        self._slots.setdefault(serial_number, {})[slot] = user_key
+        self._locations.setdefault(user_key, set()).add(location)
+
+    def _unindex(self, location: Location) -> Optional[str]:
+        serial_number, slot = location
+        user_key = self._slots.get(serial_number, {}).pop(slot, None)
+        if user_key is not None:
+            locations = self._locations[user_key]
+            locations.discard(location)
+            if not locations:
+                del self._locations[user_key]
+        return user_key
+
+    def user_for(self, serial_number: str, slot: int) -> Optional[str]:
+        slots = self._slots.get(serial_number)
+        return slots.get(slot) if slots is not None else None
+
+    def locations_for(self, user_key: str) -> List[Location]:
+        return sorted(self._locations.get(user_key, ()))
+
+    def slots_on(self, serial_number: str) -> Dict[int, str]:
+        return dict(self._slots.get(serial_number, {}))
+
+    def assign(self, serial_number: str, slot: int, user_key: str) -> None:
+        assert 0 <= slot < MAX_SLOTS
+        with self._lock, self._connection:
+            self._connection.execute(
+                "INSERT OR REPLACE INTO slots VALUES (?, ?, ?, ?)",
+                (serial_number, slot, user_key, time.time()),
+            )
+            self._unindex((serial_number, slot))
+            self._index((serial_number, slot), user_key)
+
+    def unassign(self, serial_number: str, slot: int) -> Optional[str]:
+        with self._lock, self._connection:
+            self._connection.execute(
+                "DELETE FROM slots WHERE serial_number = ? AND slot = ?",
+                (serial_number, slot),
+            )
+            return self._unindex((serial_number, slot))
+
+    def remove_user(self, user_key: str) -> List[Location]:
+        # Only forgets the mapping, the caller deletes the slots on the readers
+        with self._lock, self._connection:
+            self._connection.execute(
+                "DELETE FROM slots WHERE user_key = ?", (user_key,)
+            )
+            locations = self.locations_for(user_key)
+            for location in locations:
+                self._unindex(location)
+            return locations
+
+    def free_slot(self, serial_number: str) -> Optional[int]:
+        used = self.slots_on(serial_number)
+        return next((slot for slot in range(MAX_SLOTS) if slot not in used), None)
+
+    @staticmethod
+    def _serial_number(reader: GT521F32) -> str:
+        serial_number = reader.device_serial_number
+        if serial_number is None:
+            raise DirectoryException("Reader must be opened first.")
+        return serial_number
+
+    def identify(self, reader: GT521F32) -> Optional[str]:
+        # The user key of the finger on the reader, None when it is unknown
+        slot = reader.identify()
+        if slot is None:
+            return None
+        user_key = self.user_for(self._serial_number(reader), slot)
+        if user_key is None:
+            logger.warning("Slot %d is enrolled but not in the directory", slot)
+        return user_key
+
+    def enroll(
+        self, reader: GT521F32, user_key: str, slot: Optional[int] = None
+    ) -> Optional[int]:
+        # Enrolls into the given or the first slot free in the directory and
+        # on the reader, and returns it, or None when enrollment failed
+        serial_number = self._serial_number(reader)
+        with self._lock:
+            if slot is None:
+                # One pipelined scan; a slot that failed to check for any
+                # reason other than being free is not taken
+                used = self.slots_on(serial_number)
+                free = reader.check_enrolled_range(0, MAX_SLOTS).failed(
+                    "NACK_IS_NOT_USED"
+                )
+                slot = next((slot for slot in free if slot not in used), None)
+                if slot is None:
+                    raise DirectoryException("Reader %s is full." % (serial_number,))
+            if not reader.enroll_user(slot):
+                return None
+            self.assign(serial_number, slot, user_key)
+            return slot
+
+    def delete(self, reader: GT521F32, user_key: str) -> int:
+        # Deletes the user's slots on this reader, returns how many
+        serial_number = self._serial_number(reader)
+        with self._lock:
+            result = reader.delete_ids(
+                slot
+                for serial, slot in self.locations_for(user_key)
+                if serial == serial_number
+            )
+            deleted = set(result.succeeded) | set(result.failed("NACK_IS_NOT_USED"))
+            for slot in deleted:
+                self.unassign(serial_number, slot)
+        return len(deleted)
+
+    def reconcile(
+        self,
+        reader: GT521F32,
+        slots: Optional[Iterable[int]] = None,
+        remove_stale: bool = True,
+    ) -> ReconcileReport:
+        # Compares the directory with what is enrolled on the reader; stale
+        # mappings are dropped unless remove_stale is False. Only a slot the
+        # reader reports as NACK_IS_NOT_USED is stale; one that failed to
+        # check for any other reason is reported and its mapping kept.
+        serial_number = self._serial_number(reader)
+        mapped = self.slots_on(serial_number)
+        slots = range(MAX_SLOTS) if slots is None else sorted(slots)
+        enrolled_slots, free_slots, unchecked = set(), set(), {}
+        if slots:
+            scan = reader.check_enrolled_range(slots[0], slots[-1] + 1)
+            enrolled_slots = set(scan.succeeded)
+            free_slots = set(scan.failed("NACK_IS_NOT_USED"))
+            for slot, error in zip(scan.ids, scan.errors):
+                if error and slot not in free_slots and slot in slots:
+                    unchecked[slot] = packets.response_error_names.get(
+                        error, hex(error)
+                    )
+        if unchecked:
+            logger.warning(
+                "Could not check %d slots of %s: %s",
+                len(unchecked),
+                serial_number,
+                sorted(unchecked),
+            )
+        stale, unmapped = [], []
+        for slot in slots:
+            enrolled = slot in enrolled_slots
+            if slot in mapped and slot in free_slots:
+                stale.append(slot)
+            elif enrolled and slot not in mapped:
+                unmapped.append(slot)
+
+        if remove_stale:
+            for slot in stale:
+                logger.info("Dropping stale mapping of %s slot %d", serial_number, slot)
+                self.unassign(serial_number, slot)
+        return ReconcileReport(stale, unmapped, unchecked)
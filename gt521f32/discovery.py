@@ -0,0 +1,475 @@
+# pylint: disable=bad-continuation # Black and pylint disagree on this
+# pylint: disable=missing-module-docstring
+# pylint: disable=missing-class-docstring
+# pylint: disable=missing-function-docstring
+import fnmatch
+import logging
+import os
+import select
+import socket
+import threading
+from typing import (
+    Callable,
+    Dict,
+    FrozenSet,
+    Iterable,
+    List,
+    NamedTuple,
+    Optional,
+    Sequence,
+    Tuple,
+)
+
+from .gt521f32 import GT521F32, GT521F32Exception
+from .interfaces import InterfaceException
+
+# Finds readers on Linux by scanning sysfs for USB serial ports and SCSI
+# generic devices, and identifies each by the serial number OPEN reports, so
+# a reader keeps its identity when it re-enumerates under another path.
+# Probing writes to the port, so only ports behind a known USB to UART
+# bridge, and SCSI devices of the given vendor and model, are probed.
+# HotplugMonitor follows kernel uevents (or polls sysfs where netlink is not
+# available) and DeviceManager reattaches sessions as readers come and go.
+
+logger = logging.getLogger(__name__)  # pylint: disable=invalid-name
+
+_DEVICE_ERRORS = (GT521F32Exception, InterfaceException)
+
+TTY = "tty"
+SCSI = "scsi"
+
+_NETLINK_KOBJECT_UEVENT = 15
+_SUBSYSTEMS = {b"SUBSYSTEM=tty", b"SUBSYSTEM=scsi_generic"}
+_SCSI_TYPE_CDROM = "5"  # The reader presents its ISO area as a CD-ROM
+
+# (idVendor, idProduct) of the USB to UART bridges the module is usually
+# wired through: FTDI FT232R and FT231X, Silicon Labs CP210x, WCH CH340 and
+# Prolific PL2303
+KNOWN_USB_SERIAL_IDS = frozenset(
+    {
+        ("0403", "6001"),
+        ("0403", "6015"),
+        ("10c4", "ea60"),
+        ("1a86", "7523"),
+        ("067b", "2303"),
+    }
+)
+
+
+class _USBDevice(NamedTuple):
+    ids: Tuple[str, str]  # idVendor, idProduct
+    address: str  # busnum:devnum, new on every attach
+
+
+class DiscoveredDevice(NamedTuple):
+    serial_number: str
+    port: str
+    kind: str  # TTY or SCSI
+    sysfs_path: str  # resolved, changes when the device re-enumerates
+
+
+def probe_serial_number(port: str, timeout: float = 2.0) -> Optional[str]:
+    try:
+        reader = GT521F32(port)
+    except _DEVICE_ERRORS as e:  # pylint: disable=invalid-name
+        logger.debug("Could not open %s: %s", port, e)
+        return None
+    try:
+        reader.open(timeout=timeout)
+        return reader.device_serial_number
+    except _DEVICE_ERRORS as e:  # pylint: disable=invalid-name
+        logger.debug("%s did not answer OPEN: %s", port, e)
+        return None
+    finally:
+        reader.close(keep_baud_rate=True)
+
+
+def _read_attribute(path: str) -> str:
+    try:
+        with open(path) as attribute:
+            return attribute.read().strip()
+    except OSError:
+        return ""
+
+
+class Discovery:
+    _DEFAULT_TTY_PATTERNS = ("ttyUSB*", "ttyACM*")
+
+    _probe_cache: Dict[Tuple[str, str, str], Optional[str]]
+    devices: Dict[str, DiscoveredDevice]  # by serial number, as of the last scan
+
+    def __init__(  # pylint: disable=too-many-arguments
+        self,
+        sysfs_root: str = "/sys",
+        dev_root: str = "/dev",
+        probe: Callable[[str], Optional[str]] = probe_serial_number,
+        tty_patterns: Sequence[str] = _DEFAULT_TTY_PATTERNS,
+        scsi_models: Sequence[str] = (),
+        usb_ids: Optional[Iterable[Tuple[str, str]]] = KNOWN_USB_SERIAL_IDS,
+    ):
+        # Serial ports are probed when their USB (idVendor, idProduct) is in
+        # usb_ids, or all of them with usb_ids=None. The vendor and model the
+        # module reports over SCSI are not documented, so SCSI devices are
+        # only probed when scsi_models lists their "vendor model" prefixes,
+        # as in /sys/class/scsi_generic/sg*/device/{vendor,model}.
+        self._sysfs_root = sysfs_root
+        self._dev_root = dev_root
+        self._probe = probe
+        self._tty_patterns = tuple(tty_patterns)
+        self._scsi_models = tuple(scsi_models)
+        self._usb_ids = frozenset(usb_ids) if usb_ids is not None else None
+        self._probe_cache = {}
+        self._lock = threading.Lock()
+        self.devices = {}
+
+    def _class_entries(self, device_class: str) -> List[Tuple[str, str]]:
+        # (name, resolved sysfs device path) of the devices in a class
+        class_path = os.path.join(self._sysfs_root, "class", device_class)
+        try:
+            names = sorted(os.listdir(class_path))
+        except OSError:
+            return []
+        entries = []
+        for name in names:
+            device_link = os.path.join(class_path, name, "device")
+            if os.path.exists(device_link):
+                entries.append((name, os.path.realpath(device_link)))
+        return entries
+
+    def _usb_device(self, sysfs_path: str) -> Optional[_USBDevice]:
+        # The USB device a tty or sg device hangs off, the nearest ancestor
+        # with USB ids
+        root, path = os.path.realpath(self._sysfs_root), sysfs_path
+        while path.startswith(root) and path != root:
+            vendor = _read_attribute(os.path.join(path, "idVendor"))
+            if vendor:
+                return _USBDevice(
+                    (vendor, _read_attribute(os.path.join(path, "idProduct"))),
+                    "%s:%s"
+                    % (
+                        _read_attribute(os.path.join(path, "busnum")),
+                        _read_attribute(os.path.join(path, "devnum")),
+                    ),
+                )
+            path = os.path.dirname(path)
+        return None
+
+    def _is_reader_tty(self, sysfs_path: str) -> bool:
+        if self._usb_ids is None:
+            return True
+        usb_device = self._usb_device(sysfs_path)
+        return usb_device is not None and usb_device.ids in self._usb_ids
+
+    def _is_reader_scsi(self, name: str) -> bool:
+        device = os.path.join(self._sysfs_root, "class", "scsi_generic", name, "device")
+        if _read_attribute(os.path.join(device, "type")) != _SCSI_TYPE_CDROM:
+            return False
+        model = "%s %s" % (
+            _read_attribute(os.path.join(device, "vendor")),
+            _read_attribute(os.path.join(device, "model")),
+        )
+        return bool(self._scsi_models) and model.startswith(self._scsi_models)
+
+    def candidates(self) -> List[Tuple[str, str, str]]:
+        # (port, kind, sysfs path) of everything that may be a reader
+        found = []
+        for name, sysfs_path in self._class_entries("tty"):
+            if (
+                "/usb" in sysfs_path
+                and any(
+                    fnmatch.fnmatch(name, pattern) for pattern in self._tty_patterns
+                )
+                and self._is_reader_tty(sysfs_path)
+            ):
+                found.append((os.path.join(self._dev_root, name), TTY, sysfs_path))
+        for name, sysfs_path in self._class_entries("scsi_generic"):
+            if self._is_reader_scsi(name):
+                found.append((os.path.join(self._dev_root, name), SCSI, sysfs_path))
+        return found
+
+    def fingerprint(self) -> FrozenSet[Tuple[str, str, str]]:
+        # Cheap to compute, changes whenever a tty or sg device comes or goes,
+        # including a replug at the same path
+        fingerprint = set()
+        for name, sysfs_path in self._class_entries("tty") + self._class_entries(
+            "scsi_generic"
+        ):
+            usb_device = self._usb_device(sysfs_path)
+            fingerprint.add(
+                (name, sysfs_path, usb_device.address if usb_device else "")
+            )
+        return frozenset(fingerprint)
+
+    def scan(self) -> Dict[str, DiscoveredDevice]:
+        # Only ports not seen at the same sysfs path before are probed. A
+        # USB device gets a new address on every attach, so a reader swapped
+        # for another at the same path is probed again.
+        with self._lock:
+            devices, cache = {}, {}
+            for port, kind, sysfs_path in self.candidates():
+                usb_device = self._usb_device(sysfs_path)
+                key = (port, sysfs_path, usb_device.address if usb_device else "")
+                serial_number = (
+                    self._probe_cache[key]
+                    if key in self._probe_cache
+                    else self._probe(port)
+                )
+                cache[key] = serial_number
+                if serial_number is None:
+                    continue
+                if serial_number in devices:
+                    logger.warning(
+                        "%s is reachable through both %s and %s",
+                        serial_number,
+                        devices[serial_number].port,
+                        port,
+                    )
+                    continue
+                devices[serial_number] = DiscoveredDevice(
+                    serial_number, port, kind, sysfs_path
+                )
+            self._probe_cache = cache
+            self.devices = devices
+            return dict(devices)
+
+    def find(self, serial_number: str) -> Optional[DiscoveredDevice]:
+        return self.devices.get(serial_number)
+
+
+def _open_uevent_socket() -> Optional[socket.socket]:
+    try:
+        sock = socket.socket(
+            socket.AF_NETLINK,  # pylint: disable=no-member
+            socket.SOCK_DGRAM,
+            _NETLINK_KOBJECT_UEVENT,
+        )
+        sock.bind((0, 1))  # Kernel uevents multicast group
+    except (AttributeError, OSError) as e:  # pylint: disable=invalid-name
+        logger.info("Kernel uevents unavailable, polling sysfs instead: %s", e)
+        return None
+    return sock
+
+
+class HotplugMonitor:
+    # Calls callback(serial_number, device) when a reader appears or moves,
+    # and callback(serial_number, None) when it disappears
+    _POLL_INTERVAL = 1.0
+    _SETTLE_TIME = 0.2  # for udev to create the device node
+
+    def __init__(  # pylint: disable=too-many-arguments
+        self,
+        discovery: Discovery,
+        callback: Callable[[str, Optional[DiscoveredDevice]], None],
+        poll_interval: float = _POLL_INTERVAL,
+        settle_time: float = _SETTLE_TIME,
+        use_uevents: bool = True,
+    ):
+        self._discovery = discovery
+        self._callback = callback
+        self._poll_interval = poll_interval
+        self._settle_time = settle_time
+        self._use_uevents = use_uevents
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+
+    def __enter__(self) -> "HotplugMonitor":
+        self.start()
+        return self
+
+    def __exit__(self, *exc_info) -> None:
+        self.stop()
+
+    def start(self) -> None:
+        assert self._thread is None
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._run, daemon=True)
+        self._thread.start()
+
+    def stop(self) -> None:
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join()
+            self._thread = None
+
+    def _rescan(
+        self, previous: Dict[str, DiscoveredDevice]
+    ) -> Dict[str, DiscoveredDevice]:
+        current = self._discovery.scan()
+        for serial_number in previous.keys() - current.keys():
+            logger.info("Reader %s removed", serial_number)
+            self._notify(serial_number, None)
+        for serial_number, device in current.items():
+            if previous.get(serial_number) != device:
+                logger.info("Reader %s at %s", serial_number, device.port)
+                self._notify(serial_number, device)
+        return current
+
+    def _notify(self, serial_number: str, device: Optional[DiscoveredDevice]) -> None:
+        try:
+            self._callback(serial_number, device)
+        except Exception:  # pylint: disable=broad-except
+            logger.exception("Hotplug callback failed.")
+
+    @staticmethod
+    def _is_relevant(message: bytes) -> bool:
+        return any(field in _SUBSYSTEMS for field in message.split(b"\0"))
+
+    def _wait_for_event(self, sock: Optional[socket.socket]) -> bool:
+        # True when a relevant uevent arrived, False on a poll tick
+        if sock is None:
+            self._stop.wait(self._poll_interval)
+            return False
+        readable, _, _ = select.select([sock], [], [], self._poll_interval)
+        relevant = False
+        while readable:
+            relevant |= self._is_relevant(sock.recv(8192))
+            readable, _, _ = select.select([sock], [], [], 0)
+        return relevant
+
+    def _run(self) -> None:
+        sock = _open_uevent_socket() if self._use_uevents else None
+        try:
+            # Taken before scanning, so a change during the scan is not missed
+            fingerprint = self._discovery.fingerprint()
+            devices = self._rescan({})
+            while not self._stop.is_set():
+                if self._wait_for_event(sock):
+                    self._stop.wait(self._settle_time)
+                elif self._discovery.fingerprint() == fingerprint:
+                    # Polling also covers events missed by the socket
+                    continue
+                fingerprint = self._discovery.fingerprint()
+                devices = self._rescan(devices)
+        finally:
+            if sock is not None:
+                sock.close()
+
+
+class DeviceSession:
+    # A reader bound to a serial number, reopened wherever it reappears
+    _serial_number: str
+    _reader: Optional[GT521F32]
+
+    def __init__(self, serial_number: str, baudrate: Optional[int] = None):
+        self._serial_number = serial_number
+        self._baudrate = baudrate
+        self._reader = None
+        self._port: Optional[str] = None
+        self._changed = threading.Condition()
+
+    @property
+    def serial_number(self) -> str:
+        return self._serial_number
+
+    @property
+    def port(self) -> Optional[str]:
+        return self._port
+
+    @property
+    def attached(self) -> bool:
+        return self._reader is not None
+
+    @property
+    def reader(self) -> GT521F32:
+        reader = self._reader
+        if reader is None:
+            raise GT521F32Exception("Reader %s is detached." % (self._serial_number,))
+        return reader
+
+    def wait(self, timeout: Optional[float] = None) -> GT521F32:
+        with self._changed:
+            if not self._changed.wait_for(lambda: self._reader is not None, timeout):
+                raise GT521F32Exception(
+                    "Reader %s did not attach." % (self._serial_number,)
+                )
+            return self._reader  # type: ignore
+
+    def attach(self, device: DiscoveredDevice) -> None:
+        with self._changed:
+            self._close_reader()
+            reader = GT521F32(device.port, baudrate=self._baudrate)
+            try:
+                reader.open()
+            except _DEVICE_ERRORS:
+                reader.close()
+                raise
+            self._reader, self._port = reader, device.port
+            self._changed.notify_all()
+
+    def detach(self) -> None:
+        with self._changed:
+            self._close_reader()
+            self._changed.notify_all()
+
+    def _close_reader(self) -> None:
+        reader, self._reader, self._port = self._reader, None, None
+        if reader is not None:
+            try:
+                # The old device node may be gone already
+                reader.close(keep_baud_rate=True)
+            except _DEVICE_ERRORS as e:  # pylint: disable=invalid-name
+                logger.debug("Ignoring error closing stale reader: %s", e)
+
+
+class DeviceManager:
+    # Keeps a DeviceSession per serial number attached to its reader
+    _sessions: Dict[str, DeviceSession]
+
+    def __init__(
+        self,
+        discovery: Optional[Discovery] = None,
+        baudrate: Optional[int] = None,
+        **monitor_options
+    ):
+        self._discovery = discovery or Discovery()
+        self._baudrate = baudrate
+        self._sessions = {}
+        self._lock = threading.Lock()
+        self._monitor = HotplugMonitor(
+            self._discovery, self._on_change, **monitor_options
+        )
+
+    def __enter__(self) -> "DeviceManager":
+        self.start()
+        return self
+
+    def __exit__(self, *exc_info) -> None:
+        self.stop()
+
+    def start(self) -> None:
+        self._monitor.start()
+
+    def stop(self) -> None:
+        self._monitor.stop()
+        with self._lock:
+            for session in self._sessions.values():
+                session.detach()
+
+    def session(self, serial_number: str) -> DeviceSession:
+        with self._lock:
+            if serial_number not in self._sessions:
+                session = DeviceSession(serial_number, self._baudrate)
+                self._sessions[serial_number] = session
+                device = self._discovery.find(serial_number)
+                if device is not None:
+                    self._attach(session, device)
+            return self._sessions[serial_number]
+
+    @staticmethod
+    def _attach(session: DeviceSession, device: DiscoveredDevice) -> None:
+        try:
+            session.attach(device)
+        except _DEVICE_ERRORS as e:  # pylint: disable=invalid-name
+            logger.error("Could not attach %s: %s", session.serial_number, e)
+
+    def _on_change(
+        self, serial_number: str, device: Optional[DiscoveredDevice]
+    ) -> None:
+        with self._lock:
+            session = self._sessions.get(serial_number)
+            if session is None:
+                return
+            if device is None:
+                session.detach()
+            else:
+                self._attach(session, device)
@@ -0,0 +1,241 @@
+# pylint: disable=bad-continuation # Black and pylint disagree on this
+# pylint: disable=missing-module-docstring
+# pylint: disable=missing-class-docstring
+# pylint: disable=missing-function-docstring
+import functools
+import struct
+import zlib
+from typing import BinaryIO, Iterable, Iterator, List, NamedTuple, Optional, Tuple
+
+from . import packets
+from .gt521f32 import GT521F32Exception
+
+# Lossless compression for streams of sensor frames, e.g. GET_RAWIMAGE
+# previews sent over the network or GET_IMAGE captures being archived.
+# Key frames are deflated as they are. The frames in between are sent as
+# their difference from the previous frame, which is zero wherever nothing
+# changed and otherwise the size of the sensor noise, and deflated with run
+# length matching only: on such residuals that compresses as well as full
+# deflate and several times faster. The difference is computed eight bits
+# at a time across the whole frame held as one Python int, which needs
+# nothing beyond the standard library.
+#
+# A stream is a header (magic, version, width, height) followed by one
+# record per frame (kind, size, deflated residuals):
+#
+#     encoder = FrameEncoder(IMAGE_SHAPE)
+#     stream = encoder.header() + b"".join(encoder.encode(f) for f in frames)
+#     assert FrameDecoder().feed(stream) == frames
+
+RAW_IMAGE_SHAPE = (120, 160)  # height, width of GET_RAWIMAGE
+IMAGE_SHAPE = (258, 202)  # and of GET_IMAGE
+
+MAGIC = b"GT5Z"
+VERSION = 1
+KEY_FRAME = 0  # the frame itself
+DELTA_FRAME = 1  # its difference from the previous frame
+
+DEFAULT_KEYFRAME_INTERVAL = 30  # a lost record costs at most this many frames
+DEFAULT_LEVEL = 1  # zlib level; higher levels gain little on noisy frames
+
+_STREAM_HEADER = struct.Struct("<4sBHH")
+_FRAME_HEADER = struct.Struct("<BL")
+
+Shape = Tuple[int, int]
+
+
+class FrameCodecException(GT521F32Exception):
+    pass
+
+
+def shape_for(size: int) -> Shape:
+    if size == packets.IMAGE_SIZE:
+        return IMAGE_SHAPE
+    if size == packets.RAW_IMAGE_SIZE:
+        return RAW_IMAGE_SHAPE
+    raise FrameCodecException("Cannot infer the frame shape of %d bytes" % (size,))
+
+
+class _Masks(NamedTuple):
+    high: int  # 0x80 in every byte
+    low: int  # 0x7F in every byte
+    full: int  # 0xFF in every byte
+
+
+@functools.lru_cache(maxsize=4)
+def _masks(size: int) -> _Masks:
+    return _Masks(
+        int.from_bytes(b"\x80" * size, "little"),
+        int.from_bytes(b"\x7f" * size, "little"),
+        (1 << (8 * size)) - 1,
+    )
+
+
+# Byte-wise arithmetic modulo 256 on frames held as little-endian ints: the
+# top bit of each byte is handled apart so no carry or borrow crosses into
+# the next byte
+
+
+def _subtract(x: int, y: int, masks: _Masks) -> int:
+    difference = ((x | masks.high) - (y & masks.low)) ^ ((x ^ ~y) & masks.high)
+    return difference & masks.full
+
+
+def _add(x: int, y: int, masks: _Masks) -> int:
+    return ((x & masks.low) + (y & masks.low)) ^ ((x ^ y) & masks.high)
+
+
+class FrameEncoder:
+    def __init__(
+        self,
+        shape: Shape,
+        keyframe_interval: int = DEFAULT_KEYFRAME_INTERVAL,
+        level: int = DEFAULT_LEVEL,
+    ):
+        assert keyframe_interval > 0
+        self._shape = shape
+        self._size = shape[0] * shape[1]
+        self._masks = _masks(self._size)
+        self._keyframe_interval = keyframe_interval
+        self._level = level
+        self._previous: Optional[int] = None
+        self._since_key = 0
+        self.frames = 0
+        self.raw_bytes = 0
+        self.encoded_bytes = 0
+
+    @property
+    def shape(self) -> Shape:
+        return self._shape
+
+    @property
+    def ratio(self) -> float:
+        return self.raw_bytes / self.encoded_bytes if self.encoded_bytes else 0.0
+
+    def header(self) -> bytes:
+        height, width = self._shape
+        return _STREAM_HEADER.pack(MAGIC, VERSION, width, height)
+
+    def key_frame(self) -> None:
+        # The next frame is encoded on its own, e.g. for a client that just
+        # joined a stream
+        self._previous = None
+
+    def encode(self, frame: bytes) -> bytes:
+        if len(frame) != self._size:
+            raise FrameCodecException(
+                "Expected a frame of %d bytes, got %d" % (self._size, len(frame))
+            )
+        pixels = int.from_bytes(frame, "little")
+        if self._previous is None or self._since_key >= self._keyframe_interval:
+            kind, self._since_key = KEY_FRAME, 0
+            payload = zlib.compress(frame, self._level)
+        else:
+            kind = DELTA_FRAME
+            residuals = _subtract(pixels, self._previous, self._masks)
+            compressor = zlib.compressobj(
+                self._level, zlib.DEFLATED, zlib.MAX_WBITS, 9, zlib.Z_RLE
+            )
+            payload = (
+                compressor.compress(residuals.to_bytes(self._size, "little"))
+                + compressor.flush()
+            )
+        self._previous = pixels
+        self._since_key += 1
+
+        record = _FRAME_HEADER.pack(kind, len(payload)) + payload
+        self.frames += 1
+        self.raw_bytes += self._size
+        self.encoded_bytes += len(record)
+        return record
+
+
+class FrameDecoder:
+    # Takes a stream in pieces of any size, e.g. as they come off a socket
+    def __init__(self):
+        self._buffer = bytearray()
+        self._shape: Optional[Shape] = None
+        self._size = 0
+        self._masks: Optional[_Masks] = None
+        self._previous: Optional[int] = None
+
+    @property
+    def shape(self) -> Optional[Shape]:
+        # Known once the stream header arrived
+        return self._shape
+
+    def _read_header(self) -> bool:
+        if len(self._buffer) < _STREAM_HEADER.size:
+            return False
+        magic, version, width, height = _STREAM_HEADER.unpack_from(self._buffer)
+        if magic != MAGIC or version != VERSION:
+            raise FrameCodecException("Not a frame stream, or an unknown version.")
+        del self._buffer[: _STREAM_HEADER.size]
+        self._shape = (height, width)
+        self._size = width * height
+        self._masks = _masks(self._size)
+        return True
+
+    def _decode(self, kind: int, payload: bytes) -> bytes:
+        try:
+            data = zlib.decompress(payload)
+        except zlib.error as e:  # pylint: disable=invalid-name
+            raise FrameCodecException("Corrupt frame: %s" % (e,))
+        if len(data) != self._size:
+            raise FrameCodecException("Frame has %d bytes" % (len(data),))
+
+        if kind == KEY_FRAME:
+            self._previous = int.from_bytes(data, "little")
+            return data
+        if kind != DELTA_FRAME or self._previous is None:
+            raise FrameCodecException("Delta frame without a key frame.")
+        pixels = _add(int.from_bytes(data, "little"), self._previous, self._masks)
+        self._previous = pixels
+        return pixels.to_bytes(self._size, "little")
+
+    def feed(self, data: bytes) -> List[bytes]:
+        # The frames completed by data
+        self._buffer += data
+        if self._shape is None and not self._read_header():
+            return []
+
+        frames = []
+        while len(self._buffer) >= _FRAME_HEADER.size:
+            kind, size = _FRAME_HEADER.unpack_from(self._buffer)
+            end = _FRAME_HEADER.size + size
+            if len(self._buffer) < end:
+                break
+            payload = bytes(self._buffer[_FRAME_HEADER.size : end])
+            del self._buffer[:end]
+            frames.append(self._decode(kind, payload))
+        return frames
+
+
+def write_frames(
+    stream: BinaryIO,
+    frames: Iterable[bytes],
+    shape: Optional[Shape] = None,
+    keyframe_interval: int = DEFAULT_KEYFRAME_INTERVAL,
+    level: int = DEFAULT_LEVEL,
+) -> FrameEncoder:
+    # Without a shape it is taken from the first frame's size
+    encoder = None
+    for frame in frames:
+        if encoder is None:
+            encoder = FrameEncoder(
+                shape or shape_for(len(frame)), keyframe_interval, level
+            )
+            stream.write(encoder.header())
+        stream.write(encoder.encode(frame))
+    if encoder is None:
+        raise FrameCodecException("No frames to write.")
+    return encoder
+
+
+def read_frames(stream: BinaryIO, chunk_size: int = 2 ** 16) -> Iterator[bytes]:
+    decoder = FrameDecoder()
+    while True:
+        chunk = stream.read(chunk_size)
+        if not chunk:
+            return
+        yield from decoder.feed(chunk)
@@ -0,0 +1,198 @@
+# pylint: disable=bad-continuation # Black and pylint disagree on this
+# pylint: disable=missing-module-docstring
+# pylint: disable=missing-class-docstring
+# pylint: disable=missing-function-docstring
+import multiprocessing
+import struct
+import sys
+import time
+from multiprocessing import shared_memory
+from typing import Callable, ClassVar, Optional, Tuple
+
+from . import packets
+
+# A fixed number of frame slots in shared memory, written round-robin by one
+# producer and read by any number of consumers, in this or other processes.
+# Frames are numbered from 1; frame n lives in slot (n - 1) % slots and is
+# overwritten by frame n + slots. Each slot carries a stamp of 2n once frame n
+# is complete and 2n - 1 while it is being written, so readers can tell a
+# frame that is still valid from one that was overwritten under them.
+
+_RING_HEADER = struct.Struct("<QLL")  # latest sequence, slots, frame size
+_SLOT_HEADER = struct.Struct("<QL")  # stamp, length
+
+
+def attach_shared_memory(name: str) -> shared_memory.SharedMemory:
+    # Before 3.13 attaching also registers the block with the resource
+    # tracker. Children of the creator share its tracker, which is harmless,
+    # but an unrelated process would destroy the block when it exits.
+    if sys.version_info >= (3, 13):
+        return shared_memory.SharedMemory(  # pylint: disable=unexpected-keyword-arg
+            name=name, track=False
+        )
+
+    from multiprocessing import (  # pylint: disable=import-outside-toplevel
+        resource_tracker,
+    )
+
+    block = shared_memory.SharedMemory(name=name)
+    if multiprocessing.parent_process() is not None:
+        return block
+    resource_tracker.unregister(
+        block._name, "shared_memory"  # pylint: disable=protected-access
+    )
+    return block
+
+
+class FrameRing:
+    _READ_SPINS: ClassVar[int] = 100
+
+    _memory: shared_memory.SharedMemory
+    _slots: int
+    _frame_size: int
+    _owner: bool
+
+    def __init__(
+        self,
+        slots: int = 8,
+        frame_size: int = packets.IMAGE_SIZE,
+        name: Optional[str] = None,
+    ):
+        assert slots > 0 and frame_size > 0
+        self._slots = slots
+        self._frame_size = frame_size
+        self._memory = shared_memory.SharedMemory(
+            name=name, create=True, size=self._offset(slots)
+        )
+        self._memory.buf[: self._offset(slots)] = bytes(self._offset(slots))
+        _RING_HEADER.pack_into(self._memory.buf, 0, 0, slots, frame_size)
+        self._owner = True
+
+    @classmethod
+    def attach(cls, name: str) -> "FrameRing":
+        ring = cls.__new__(cls)
+        ring._memory = attach_shared_memory(name)
+        _, ring._slots, ring._frame_size = _RING_HEADER.unpack_from(ring._memory.buf)
+        ring._owner = False
+        return ring
+
+    def __enter__(self) -> "FrameRing":
+        return self
+
+    def __exit__(self, *exc_info) -> None:
+        self.close()
+
+    def close(self) -> None:
+        # Views handed out by view() must be released before closing
+        self._memory.close()
+        if self._owner:
+            self._memory.unlink()
+
+    @property
+    def name(self) -> str:
+        return self._memory.name
+
+    @property
+    def slots(self) -> int:
+        return self._slots
+
+    @property
+    def frame_size(self) -> int:
+        return self._frame_size
+
+    def _offset(self, slot: int) -> int:
+        return _RING_HEADER.size + slot * (_SLOT_HEADER.size + self._frame_size)
+
+    def _slot(self, sequence: int) -> int:
+        return (sequence - 1) % self._slots
+
+    @property
+    def latest_sequence(self) -> int:
+        # 0 before the first frame is committed
+        return _RING_HEADER.unpack_from(self._memory.buf)[0]
+
+    def reserve(self) -> Tuple[int, memoryview]:
+        # The returned view is written in place, e.g. straight from a
+        # transport read, then published with commit() or dropped with abort()
+        sequence = self.latest_sequence + 1
+        offset = self._offset(self._slot(sequence))
+        _SLOT_HEADER.pack_into(self._memory.buf, offset, 2 * sequence - 1, 0)
+        start = offset + _SLOT_HEADER.size
+        return sequence, self._memory.buf[start : start + self._frame_size]
+
+    def commit(self, sequence: int, length: Optional[int] = None) -> None:
+        length = self._frame_size if length is None else length
+        offset = self._offset(self._slot(sequence))
+        _SLOT_HEADER.pack_into(self._memory.buf, offset, 2 * sequence, length)
+        _RING_HEADER.pack_into(
+            self._memory.buf, 0, sequence, self._slots, self._frame_size
+        )
+
+    def abort(self, sequence: int) -> None:
+        # The slot was partially overwritten, its previous frame is gone
+        offset = self._offset(self._slot(sequence))
+        _SLOT_HEADER.pack_into(self._memory.buf, offset, 0, 0)
+
+    def write(self, frame: bytes) -> int:
+        assert len(frame) <= self._frame_size
+        sequence, view = self.reserve()
+        view[: len(frame)] = frame
+        view.release()
+        self.commit(sequence, len(frame))
+        return sequence
+
+    def write_from(self, fill: Callable[[memoryview], Optional[int]]) -> Optional[int]:
+        # fill writes into the slot and returns how many bytes it wrote, None
+        # or 0 to drop the frame; e.g. ring.write_from(reader.get_raw_image_into)
+        sequence, view = self.reserve()
+        try:
+            written = fill(view)
+        except BaseException:
+            self.abort(sequence)
+            raise
+        finally:
+            view.release()
+
+        if not written:
+            self.abort(sequence)
+            return None
+        assert written <= self._frame_size
+        self.commit(sequence, written)
+        return sequence
+
+    def is_valid(self, sequence: int) -> bool:
+        # Whether frame `sequence` is still in the ring, e.g. after using a view
+        if sequence <= 0:
+            return False
+        offset = self._offset(self._slot(sequence))
+        stamp, _ = _SLOT_HEADER.unpack_from(self._memory.buf, offset)
+        return stamp == 2 * sequence
+
+    def view(self, sequence: Optional[int] = None) -> Optional[memoryview]:
+        # Zero-copy; the producer may overwrite the frame at any time, so
+        # check is_valid() once done with it
+        sequence = self.latest_sequence if sequence is None else sequence
+        if not self.is_valid(sequence):
+            return None
+        offset = self._offset(self._slot(sequence))
+        _, length = _SLOT_HEADER.unpack_from(self._memory.buf, offset)
+        start = offset + _SLOT_HEADER.size
+        return self._memory.buf[start : start + length]
+
+    def read(self, sequence: Optional[int] = None) -> Optional[bytes]:
+        # A consistent copy of the frame, or None once it was overwritten
+        for _ in range(self._READ_SPINS):
+            current = self.latest_sequence if sequence is None else sequence
+            view = self.view(current)
+            if view is None:
+                if sequence is not None or current == 0:
+                    return None
+                time.sleep(0)  # The latest frame is being replaced
+                continue
+            frame = bytes(view)
+            view.release()
+            if self.is_valid(current):
+                return frame
+            if sequence is not None:
+                return None
+        return None
@@ -3,31 +3,48 @@
 # pylint: disable=missing-class-docstring
 # pylint: disable=missing-function-docstring
 # pylint: disable=too-many-public-methods
+import array
+import functools
 import logging
 import contextlib
+import struct
 import threading
 import time
-from typing import ContextManager, Optional, Callable, Tuple, ClassVar, Union, Type
-import PIL  # type: ignore
-import PIL.Image  # type: ignore
-
+from typing import (
+    TYPE_CHECKING,
+    Any,
+    ContextManager,
+    Dict,
+    Iterable,
+    Iterator,
+    List,
+    Optional,
+    Sequence,
+    Callable,
+    Tuple,
+    ClassVar,
+    Union,
+    Type,
+)
+
+from . import bulk
 from . import packets
-from .interfaces import SCSIInterface, SerialInterface, InterfaceException
-
-logger = logging.getLogger(__name__)  # pylint: disable=invalid-name
+from . import retry
+from . import interfaces
+from . import link
+from . import security
+from . import tracing
+from .interfaces import SerialInterface, InterfaceException
 
+if TYPE_CHECKING:
+    from .interfaces import SCSIInterface, SimulatedInterface, TCPInterface
 
-def retry(func: Callable[..., bool], count: int = 3) -> Callable[..., bool]:
-    def wrapper(*args, **kwargs) -> bool:
-        for _ in range(count):
-            if func(*args, **kwargs):
-                return True
-        return False
-
-    return wrapper
+logger = logging.getLogger(__name__)  # pylint: disable=invalid-name
 
 
 def save_bitmap_to_file(path: str, bitmap: bytes) -> None:
+    import PIL.Image  # type: ignore # pylint: disable=import-outside-toplevel
+
     img = PIL.Image.frombytes("L", (202, 258), bitmap, "raw")
     img.save(path, "BMP")
 
@@ -36,86 +53,508 @@ class GT521F32Exception(Exception):
     pass
 
 
+_LINK_ERRORS = (GT521F32Exception, InterfaceException)  # a lost or garbled exchange
+
+
+class GT521F32TimeoutException(GT521F32Exception):
+    pass
+
+
+def _timeout_aware(method: Callable[..., Any]) -> Callable[..., Any]:
+    # Adds a keyword-only timeout (in seconds) bounding the whole call,
+    # including every transport read it makes
+    @functools.wraps(method)
+    def wrapper(self, *args, timeout: Optional[float] = None, **kwargs):
+        if timeout is None:
+            return method(self, *args, **kwargs)
+        with self.deadline(timeout):
+            return method(self, *args, **kwargs)
+
+    return wrapper
+
+
 class GT521F32:
     _PROMPT_INTERVAL: ClassVar[float] = 0.1
+    _PROBE_TTL: ClassVar[float] = 5.0  # seconds
+    _DATABASE_SIZE: ClassVar[int] = 200  # user IDs 0 to 199
+    _BULK_WINDOW: ClassVar[int] = 8  # commands in flight during bulk operations
+    _DATA_HEADER: ClassVar[struct.Struct] = struct.Struct("<BBH")
+    _DATA_CHECKSUM: ClassVar[struct.Struct] = struct.Struct("<H")
+    _DEFAULT_BAUD_RATE: ClassVar[int] = 9600
     _port: str
-    _interface: Union[SerialInterface, SCSIInterface]
+    _interface: Union[
+        SerialInterface,
+        "SCSIInterface",
+        "TCPInterface",
+        "SimulatedInterface",
+        tracing.TracingInterface,
+    ]
     _firmware_version: Optional[str] = None
     _iso_area_max_size: Optional[int] = None
     _device_serial_number: Optional[str] = None
+    _device_id: int
+    _shared_interface: bool
     _cancel: threading.Event
+    _deadline: Optional[float] = None
+    _probe_template: Optional[bytes] = None
+    _probe_expires_at: float = 0.0
+    _security_level: Optional[int] = None  # Cached, None until first read
+    _fake_detector: Optional[bool] = None  # Write only, None until first set
+    _tracer: Optional[tracing.WireTracer] = None
+    _trace_directory: Optional[str] = None  # Dumps the trace on errors if set
+    _link_monitor: Optional[link.LinkMonitor] = None
+    _adapting: bool = False  # Set while the link monitor changes the baud rate
+    _retry_policies: Dict[str, retry.RetryPolicy]
+    retry_metrics: retry.RetryMetrics
 
     @staticmethod
     def _choose_interface_type(
         port,
-    ) -> Union[Type[SerialInterface], Type[SCSIInterface]]:
+    ) -> Union[
+        Type[SerialInterface],
+        Type["SCSIInterface"],
+        Type["TCPInterface"],
+        Type["SimulatedInterface"],
+    ]:
+        # Anything but the serial interface is imported on first use
+        if port.startswith("tcp://"):
+            return interfaces.TCPInterface
+        if port.startswith("sim://"):
+            return interfaces.SimulatedInterface
         if any(
-            port.startswith(_) for _ in ("COM", "/dev/tty")
+            port.startswith(_) for _ in ("COM", "/dev/tty", "rfc2217://", "socket://")
         ):  # Any other path patterns?
             return SerialInterface
         if port.startswith("/dev/sg") or (
             port[0].isalpha() and port[1] == ":" and len(port) == 2
         ):
-            return SCSIInterface
+            return interfaces.SCSIInterface
 
         raise GT521F32Exception("Could not derive interface type from port path")
 
-    def __init__(self, port: str, baudrate: Optional[None] = None):
-        self._port = port
+    @staticmethod
+    def open_interface(
+        port: str, baudrate: Optional[int] = None
+    ) -> Union[SerialInterface, "SCSIInterface", "TCPInterface", "SimulatedInterface"]:
         try:
             interface_cls = GT521F32._choose_interface_type(port)
             logger.debug("Chose interface type %s", interface_cls.__name__)
             if baudrate is not None:
-                if interface_cls is not SerialInterface:
+                if interface_cls not in (
+                    SerialInterface,
+                    interfaces.SimulatedInterface,
+                ):
                     raise GT521F32Exception(
                         "Baud rate can only be given for serial interfaces."
                     )
-                self._interface = interface_cls(port=port, baudrate=baudrate)
-            else:
-                self._interface = interface_cls(port=port)
+                return interface_cls(port=port, baudrate=baudrate)
+            return interface_cls(port=port)
         except InterfaceException as e:  # pylint: disable=invalid-name
             logger.error("Could not open the fingerprint device: %s", e)
             raise GT521F32Exception("Failed to open the fingerprint device.")
 
+    def __init__(
+        self,
+        port: str,
+        baudrate: Optional[int] = None,
+        device_id: int = packets.DEFAULT_DEVICE_ID,
+        interface: Any = None,
+    ):
+        # With several modules on one bus, each session is given its module's
+        # device_id and the bus's shared interface (see bus.BusArbiter)
+        self._port = port
+        self._baudrate = baudrate
+        self._device_id = device_id
+        self._shared_interface = interface is not None
+        if interface is None:
+            interface = GT521F32.open_interface(port, baudrate)
+        self._attach_interface(interface)
+        self._closed = False
         self._cancel = threading.Event()
+        self._retry_policies = retry.default_policies()
+        self.retry_metrics = retry.RetryMetrics()
+
+    def __enter__(self) -> "GT521F32":
+        try:
+            self.open()
+        except Exception:
+            # __exit__ is not called for a failed __enter__
+            self._closed = True
+            if not self._shared_interface:
+                try:
+                    self._interface.close()
+                except InterfaceException as e:  # pylint: disable=invalid-name
+                    logger.debug("Ignoring error while closing interface: %s", e)
+            raise
+        return self
+
+    def __exit__(self, *exc_info) -> None:
+        self.close()
+
+    def _attach_interface(self, interface: Any) -> None:
+        # Every (re)opened transport goes through here, so tracing survives
+        # baud rate changes and reconnects
+        if self._tracer is not None:
+            interface = tracing.TracingInterface(interface, self._tracer)
+        self._interface = interface
+
+    def enable_tracing(
+        self,
+        capacity: int = tracing.DEFAULT_CAPACITY,
+        dump_directory: Optional[str] = None,
+    ) -> tracing.WireTracer:
+        # Records the raw bytes of every transfer; with a dump_directory the
+        # trace is also dumped there when a packet is lost or garbled
+        if self._tracer is None:
+            self._tracer = tracing.WireTracer(capacity)
+            self._attach_interface(self._interface)
+        self._trace_directory = dump_directory
+        return self._tracer
+
+    def disable_tracing(self) -> None:
+        self._interface = tracing.unwrap(self._interface)
+        self._tracer = None
+        self._trace_directory = None
+
+    @property
+    def tracer(self) -> Optional[tracing.WireTracer]:
+        return self._tracer
+
+    def _wire_error(self, reason: str, kind: str) -> None:
+        # kind is one of link.ERROR_KINDS
+        if self._link_monitor is not None:
+            self._link_monitor.record_error(kind)
+        if self._tracer is None:
+            return
+        if self._trace_directory is None:
+            self._tracer.mark(reason)
+            return
+        self._tracer.dump_on_error(
+            self._trace_directory,
+            self._device_serial_number or "unknown",
+            reason,
+        )
+
+    def _link_ok(self) -> None:
+        if self._link_monitor is not None:
+            self._link_monitor.record_success()
+
+    def _link_interface(self) -> Any:
+        # The transport the baud rate can be changed on
+        if self._shared_interface:
+            raise NotImplementedError(
+                "Every module on a bus has to be moved to the new baud rate at once"
+            )
+        interface = tracing.unwrap(self._interface)
+        if not isinstance(interface, (SerialInterface, interfaces.SimulatedInterface)):
+            raise NotImplementedError(
+                "Baud-rate not supported for interface type %s" % (type(interface),)
+            )
+        return interface
+
+    def monitor_link(
+        self, policy: link.LinkPolicy = link.LinkPolicy()
+    ) -> link.LinkMonitor:
+        # Scores every exchange and moves the session to a slower baud rate
+        # when the line is too noisy for the current one, and back up once
+        # it has been clean for a while (see link.LinkPolicy)
+        self._link_interface()
+        self._link_monitor = link.LinkMonitor(
+            self._baudrate or GT521F32._DEFAULT_BAUD_RATE, policy
+        )
+        return self._link_monitor
+
+    def stop_monitoring_link(self) -> None:
+        self._link_monitor = None
+
+    @property
+    def link_monitor(self) -> Optional[link.LinkMonitor]:
+        return self._link_monitor
+
+    def _reopen_at(self, baudrate: int) -> None:
+        interface = self._link_interface()
+        self._interface.close()
+        self._attach_interface(type(interface)(port=self._port, baudrate=baudrate))
+        self._baudrate = baudrate
+
+    def _resynchronize(self, baudrates: Sequence[int]) -> bool:
+        # After a failed switch the module may be at either rate
+        for baudrate in baudrates:
+            try:
+                self._reopen_at(baudrate)
+                self.send_command("OPEN", 0)
+                return True
+            except _LINK_ERRORS as e:  # pylint: disable=invalid-name
+                logger.debug("No answer at %d baud: %s", baudrate, e)
+        return False
+
+    def _adapt_link(self) -> None:
+        # Runs between commands, before the next one is sent
+        assert self._link_monitor is not None
+        target = self._link_monitor.decide()
+        if target is None:
+            return
+        current = self._baudrate or GT521F32._DEFAULT_BAUD_RATE
+        self._adapting = True
+        try:
+            try:
+                self.change_baud_rate_and_reopen(target)
+                self.send_command("OPEN", 0)  # The module has to answer at it
+                ok = True
+            except _LINK_ERRORS as e:  # pylint: disable=invalid-name
+                logger.warning("Could not move the link to %d baud: %s", target, e)
+                ok = False
+                if not self._resynchronize((current, target)):
+                    # Neither rate answers, so nothing is known about the
+                    # switch; go back to the old rate and leave the monitor
+                    # alone, the next command reports the dead link
+                    logger.error("No answer at %d or %d baud.", current, target)
+                    try:
+                        self._reopen_at(current)
+                    except InterfaceException as e:  # pylint: disable=invalid-name
+                        logger.debug("Could not reopen at %d baud: %s", current, e)
+                    return
+        finally:
+            self._adapting = False
+        self._link_monitor.switched(self._baudrate or current, ok)
+
+    @property
+    def closed(self) -> bool:
+        return self._closed
 
     @staticmethod
     def _delay(seconds: float) -> None:
         time.sleep(seconds)
 
+    @contextlib.contextmanager
+    def deadline(self, timeout: Optional[float]) -> Iterator[None]:
+        # Bounds every operation in the block; nested deadlines can only
+        # shorten the enclosing one
+        previous = self._deadline
+        if timeout is not None:
+            deadline = time.monotonic() + timeout
+            self._deadline = deadline if previous is None else min(previous, deadline)
+        try:
+            yield
+        finally:
+            self._deadline = previous
+
+    @contextlib.contextmanager
+    def _without_deadline(self) -> Iterator[None]:
+        # For cleanup that has to happen even after the deadline expired
+        previous, self._deadline = self._deadline, None
+        try:
+            yield
+        finally:
+            self._deadline = previous
+
+    def _remaining(self) -> Optional[float]:
+        if self._deadline is None:
+            return None
+        remaining = self._deadline - time.monotonic()
+        if remaining <= 0:
+            raise GT521F32TimeoutException("Operation timed out.")
+        return remaining
+
+    def _read(self, to_read: int) -> bytes:
+        data = self._interface.read(to_read, timeout=self._remaining())
+        if (
+            len(data) < to_read
+            and self._deadline is not None
+            and time.monotonic() >= self._deadline
+        ):
+            # Drop the rest of the late packet so the next command starts clean
+            self._interface.reset_input_buffer()
+            self._wire_error("Read timed out", link.TIMEOUT)
+            raise GT521F32TimeoutException("Operation timed out while reading.")
+        return data
+
+    def _readinto(self, buffer: memoryview) -> int:
+        readinto = getattr(self._interface, "readinto", None)
+        if readinto is None:
+            # e.g. the SCSI interfaces, which read into their own buffers
+            data = self._read(len(buffer))
+            buffer[: len(data)] = data
+            return len(data)
+
+        received = readinto(buffer, timeout=self._remaining())
+        if (
+            received < len(buffer)
+            and self._deadline is not None
+            and time.monotonic() >= self._deadline
+        ):
+            self._interface.reset_input_buffer()
+            self._wire_error("Read timed out", link.TIMEOUT)
+            raise GT521F32TimeoutException("Operation timed out while reading.")
+        return received
+
+    def _read_data_packet_into(self, buffer: memoryview) -> bool:
+        # Reads the payload of a data packet straight into buffer, with only
+        # the header and checksum going through intermediate bytes
+        header = self._read(self._DATA_HEADER.size)
+        received = 0
+        if len(header) == self._DATA_HEADER.size:
+            received = self._readinto(buffer)
+        checksum_bytes = b""
+        if received == len(buffer):
+            checksum_bytes = self._read(self._DATA_CHECKSUM.size)
+
+        if len(checksum_bytes) < self._DATA_CHECKSUM.size:
+            logger.error("Could not read data packet.")
+            self._interface.reset_input_buffer()
+            self._wire_error("Short data packet", link.SHORT_READ)
+            return False
+        (checksum,) = self._DATA_CHECKSUM.unpack(checksum_bytes)
+        if checksum != (sum(header) + sum(buffer)) % 2 ** 16:
+            logger.error("Bad checksum.")
+            self._interface.reset_input_buffer()
+            self._wire_error(
+                "Bad data packet checksum",
+                link.classify(header, self._DATA_HEADER.size, (0x5A, 0xA5)),
+            )
+            return False
+        if not self._from_this_device(header):
+            return False
+        self._link_ok()
+        return True
+
+    def _from_this_device(self, header: bytes) -> bool:
+        # header starts a response or data packet that passed its checksum; on
+        # a shared bus, one from another module means the sessions got out of
+        # step, where a garbled address would have failed the checksum
+        _, _, device_id = self._DATA_HEADER.unpack_from(header)
+        if device_id == self._device_id:
+            return True
+        logger.error("Packet from device %d, expected %d.", device_id, self._device_id)
+        self._interface.reset_input_buffer()
+        self._wire_error("Packet from another device", link.WRONG_DEVICE)
+        return False
+
+    def retry_policy(self, operation: str) -> retry.RetryPolicy:
+        return self._retry_policies.get(operation, retry.NO_RETRY)
+
+    def set_retry_policy(self, operation: str, policy: retry.RetryPolicy) -> None:
+        # operation is one of CAPTURE, ENROLL, IDENTIFY, VERIFY or TRANSPORT
+        self._retry_policies[operation] = policy
+
+    def _with_retry(
+        self,
+        operation: str,
+        attempt: Callable[[], Tuple[int, int]],
+        succeeded: Callable[[int, int], bool] = lambda code, _: code == packets.ACK_OK,
+    ) -> Tuple[int, int]:
+        policy = self.retry_policy(operation)
+        started = time.monotonic()
+        attempt_number = 1
+        while True:
+            self.retry_metrics.record_attempt(operation)
+            response_code, parameter = attempt()
+            if succeeded(response_code, parameter):
+                return response_code, parameter
+
+            if not policy.should_retry(
+                attempt_number, parameter, time.monotonic() - started
+            ):
+                self.retry_metrics.record_failure(operation)
+                return response_code, parameter
+
+            delay = policy.delay(attempt_number)
+            if (
+                self._deadline is not None
+                and time.monotonic() + delay >= self._deadline
+            ):
+                self.retry_metrics.record_failure(operation)
+                return response_code, parameter
+
+            logger.debug(
+                "Retrying %s after error %04x (attempt %d)",
+                operation,
+                parameter & 0xFFFF,
+                attempt_number,
+            )
+            self.retry_metrics.record_retry(operation, parameter)
+            self._delay(delay)
+            attempt_number += 1
+
+    def _exchange(self, command_bytes: bytes) -> Tuple[int, int]:
+        self._remaining()  # Do not start a command that is already late
+        self._interface.write(command_bytes)
+
+        # read response
+        to_read = packets.ResponsePacket().byte_size()
+        response_bytes = self._read(to_read)
+
+        response_packet = packets.ResponsePacket.from_bytes(response_bytes)
+        if response_packet is None:
+            # Drop whatever is left of a late or garbled response
+            self._interface.reset_input_buffer()
+            self._wire_error(
+                "Bad response packet",
+                link.classify(response_bytes, to_read, (0x55, 0xAA)),
+            )
+            return packets.command_codes["NACK_INFO"], retry.TIMEOUT
+        if not self._from_this_device(response_bytes):
+            return packets.command_codes["NACK_INFO"], retry.TIMEOUT
+
+        self._link_ok()
+        return response_packet.response_code, response_packet.parameter
+
+    @_timeout_aware
+    def send_data(self, chunk: bytes) -> Tuple[int, int]:
+        # For commands followed by host data packets, e.g. the update commands
+        response_code, response_parameter = self._exchange(
+            packets.ChunkDataPacket(chunk, self._device_id).to_bytes()
+        )
+        if response_parameter == retry.TIMEOUT:
+            logger.error("Data packet failed.")
+            raise GT521F32Exception("Data packet failed.")
+        return response_code, response_parameter
+
+    @_timeout_aware
     def send_command(self, command: str, parameter: int) -> Tuple[int, int]:
         if command not in packets.command_codes.keys():
             logger.error("Bad command.")
             raise GT521F32Exception("Invalid command.")
 
+        if self._link_monitor is not None and not self._adapting:
+            self._adapt_link()
+
         command_code = packets.command_codes[command]
         command_packet = packets.CommandPacket(
-            parameter=parameter, command=command_code
+            parameter=parameter, command=command_code, device_id=self._device_id
         )
+        command_bytes = command_packet.to_bytes()
 
-        self._interface.write(command_packet.to_bytes())
-
-        # read response
-        to_read = packets.ResponsePacket().byte_size()
-        response_bytes = self._interface.read(to_read)
+        if command in retry.IDEMPOTENT_COMMANDS and not (
+            command == "OPEN" and parameter
+        ):
+            # Any response, even a NACK, means the transport did its job
+            response_code, response_parameter = self._with_retry(
+                "TRANSPORT",
+                lambda: self._exchange(command_bytes),
+                lambda _, parameter: parameter != retry.TIMEOUT,
+            )
+        else:
+            response_code, response_parameter = self._exchange(command_bytes)
 
-        response_packet = packets.ResponsePacket.from_bytes(response_bytes)
-        if response_packet is None:
+        if response_parameter == retry.TIMEOUT:
             logger.error("Command failed.")
             raise GT521F32Exception("Command failed.")
 
-        if not response_packet.ok:
+        if response_code != packets.ACK_OK:
             logger.debug(
                 "Command responded with code %x and error %04x",
-                response_packet.response_code,
-                response_packet.parameter,
+                response_code,
+                response_parameter,
             )
 
-        return response_packet.response_code, response_packet.parameter
+        return response_code, response_parameter
 
+    @_timeout_aware
     def usb_internal_check(self) -> None:
         _, _ = self.send_command("USB_INTERNAL_CHECK", 0)
 
+    @_timeout_aware
     def change_baud_rate(self, baudrate: int) -> None:
         # Not really relevant for USB (scsi) mode, but the command
         # is still supported
@@ -123,21 +562,21 @@ class GT521F32:
         if response_code != packets.ACK_OK:
             logger.error(
                 "ChangeBaudRate error: %s",
-                packets.reverse(packets.response_error)[parameter],
+                packets.response_error_names[parameter],
             )
 
+    @_timeout_aware
     def change_baud_rate_and_reopen(self, baudrate: int) -> None:
         # We can send the command and it wont do any harm, but we dont want the
         # interface to be reopened, so unless we are already using a
         # serial interface, do not proceed
-        if not isinstance(self._interface, SerialInterface):
-            raise NotImplementedError(
-                "Baud-rate not supported for interface type %s"
-                % (type(self._interface),)
-            )
+        self._link_interface()
         self.change_baud_rate(baudrate)
-        self._interface.close()
-        self._interface = SerialInterface(port=self._port, baudrate=baudrate)
+        self._reopen_at(baudrate)
+
+    @property
+    def device_id(self) -> int:
+        return self._device_id
 
     @property
     def firmware_version(self):
@@ -151,12 +590,13 @@ class GT521F32:
     def device_serial_number(self):
         return self._device_serial_number
 
+    @_timeout_aware
     def open(self) -> Tuple[str, int, str]:
         _, _ = self.send_command("OPEN", 1)
 
         # read data response
         to_read = packets.OpenDataPacket().byte_size()
-        response_bytes = self._interface.read(to_read)
+        response_bytes = self._read(to_read)
 
         open_data_response = packets.OpenDataPacket.from_bytes(response_bytes)
         self._firmware_version, self._iso_area_max_size, self._device_serial_number = (
@@ -175,12 +615,13 @@ class GT521F32:
             self.device_serial_number,
         )
 
+    @_timeout_aware
     def module_info(self) -> Tuple[str, str, int, int, int, int, int, int, int]:
         _, parameter = self.send_command("MODULE_INFO", 0)
 
         # read data response
         to_read = parameter + packets.DataPacket().byte_size()
-        response_bytes = self._interface.read(to_read)
+        response_bytes = self._read(to_read)
 
         module_info_known_size = packets.ModuleInfoDataPacket().byte_size()
         if to_read > module_info_known_size:
@@ -210,54 +651,106 @@ class GT521F32:
             module_info_packet.template_size,
         )
 
-    def __del__(self) -> None:
-        self.close()
+    def close(self, keep_baud_rate: bool = False) -> None:
+        # Safe to call more than once. Keeping the baud rate saves a round trip
+        # and lets a later session reopen at the same rate.
+        if self._closed:
+            return
+        self._closed = True
 
-    def close(self) -> None:
-        # does nothing
-        self.send_command("CLOSE", 0)
-        self.change_baud_rate(9600)
-        self._interface.close()
+        try:
+            self.send_command("CLOSE", 0)  # does nothing
+            if not keep_baud_rate and self._baudrate not in (
+                None,
+                GT521F32._DEFAULT_BAUD_RATE,
+            ):
+                self.change_baud_rate(GT521F32._DEFAULT_BAUD_RATE)
+        except (GT521F32Exception, InterfaceException) as e:  # pylint: disable=C0103
+            logger.warning("Could not close the session cleanly: %s", e)
+        finally:
+            if not self._shared_interface:
+                self._interface.close()
+
+    @_timeout_aware
+    def reconnect(self) -> None:
+        # Reopens the transport (e.g. after a USB hiccup) and replays OPEN,
+        # keeping the capabilities learnt by the first open()
+        if self._shared_interface:
+            # The bus stays open for the other modules, so only resynchronize
+            self._interface.reset_input_buffer()
+        else:
+            try:
+                self._interface.close()
+            except InterfaceException as e:  # pylint: disable=invalid-name
+                logger.debug("Ignoring error while closing stale interface: %s", e)
+
+            self._attach_interface(GT521F32.open_interface(self._port, self._baudrate))
+        self._closed = False
+        baudrate = self._baudrate
+        try:
+            self.send_command("OPEN", 0)
+        except _LINK_ERRORS as e:  # pylint: disable=invalid-name
+            if self._shared_interface or baudrate in (
+                None,
+                GT521F32._DEFAULT_BAUD_RATE,
+            ):
+                raise
+            # A power cycle puts the module back at its default rate, so look
+            # for it there and move it back to the session's
+            logger.info(
+                "No answer at %d baud, trying %d: %s",
+                baudrate,
+                GT521F32._DEFAULT_BAUD_RATE,
+                e,
+            )
+            self._reopen_at(GT521F32._DEFAULT_BAUD_RATE)
+            self.send_command("OPEN", 0)
+            self.change_baud_rate_and_reopen(baudrate)
 
+    @_timeout_aware
     def enroll_start(self, user_id: int) -> bool:
         response_code, parameter = self.send_command("ENROLL_START", user_id)
         if response_code != packets.ACK_OK:
             logger.error(
                 "EnrollStart error: %s",
-                packets.reverse(packets.response_error)[parameter],
+                packets.response_error_names[parameter],
             )
             return False
         return True
 
-    @retry
+    @_timeout_aware
     def enroll_n(  # pylint: disable=invalid-name
         self, n: int, save_enroll_photos: bool = False
     ) -> bool:
-        self.prompt_finger_and_capture()
-
-        if save_enroll_photos:
-            # Save image before proceeding
-            out_path = "Enroll%d.bmp" % (n,)
-            logger.info("Saving Enroll%d to %s", n, out_path)
-            bitmap = self.get_image()
-            if bitmap:
-                save_bitmap_to_file(out_path, bitmap)
-            else:
-                logger.error("Could not save image for current enroll cycle.")
-
-        response_code, parameter = self.send_command("ENROLL%d" % (n,), 0)
+        def attempt() -> Tuple[int, int]:
+            self.prompt_finger_and_capture()
+
+            if save_enroll_photos:
+                # Save image before proceeding
+                out_path = "Enroll%d.bmp" % (n,)
+                logger.info("Saving Enroll%d to %s", n, out_path)
+                bitmap = self.get_image()
+                if bitmap:
+                    save_bitmap_to_file(out_path, bitmap)
+                else:
+                    logger.error("Could not save image for current enroll cycle.")
+
+            return self.send_command("ENROLL%d" % (n,), 0)
+
+        response_code, parameter = self._with_retry("ENROLL", attempt)
         if response_code != packets.ACK_OK:
-            error_code = packets.reverse(packets.response_error).get(parameter, None)
+            error_code = packets.response_error_names.get(parameter, None)
             if error_code is None:
                 logger.error("Enroll%d error: %s", n, f"Duplicate ID: {parameter}")
                 return True  # fast fail
 
             logger.error("Enroll%d error: %s", n, error_code)
-            return False  # Will lead to retry
+            return False
 
         logger.debug("Enroll%d succeeded.", n)
         return True
 
+    @_timeout_aware
     def enroll_user(self, user_id: int, save_enroll_photos: bool = False) -> bool:
         if not self.enroll_start(user_id):
             return False
@@ -275,135 +768,531 @@ class GT521F32:
 
         return False
 
+    @_timeout_aware
     def identify(self) -> Optional[int]:
-        self.prompt_finger_and_capture()
+        def attempt() -> Tuple[int, int]:
+            self.prompt_finger_and_capture()
+            return self.send_command("IDENTIFY", 0)
+
+        response_code, parameter = self._with_retry("IDENTIFY", attempt)
+        if response_code != packets.ACK_OK:
+            logger.error("Identify error: %s", packets.response_error_names[parameter])
+            return None
+
+        return parameter
 
+    @_timeout_aware
+    def identify_captured(self) -> Optional[int]:
+        # Identifies the last capture, for callers that drive the LED and the
+        # capture themselves
         response_code, parameter = self.send_command("IDENTIFY", 0)
         if response_code != packets.ACK_OK:
-            logger.error(
-                "Identify error: %s", packets.reverse(packets.response_error)[parameter]
-            )
+            logger.debug("Identify error: %s", packets.response_error_names[parameter])
             return None
 
         return parameter
 
+    @_timeout_aware
     def get_raw_image_safe(self) -> Optional[bytes]:
         with self.led():  # Undocumented, but sensor crashes if led is off
             return self._get_raw_image()
 
+    @_timeout_aware
+    def get_raw_image_into(self, buffer: Any) -> Optional[int]:
+        # Like get_raw_image_safe, reading the bitmap straight into a writable
+        # buffer of at least RAW_IMAGE_SIZE bytes, e.g. a FrameRing slot.
+        # Returns the bytes written, None on failure.
+        with self.led():
+            return self._get_raw_image_into(buffer)
+
+    @_timeout_aware
     def _get_raw_image(self) -> Optional[bytes]:
         # Do not call this with the led off
+        raw_bitmap = bytearray(packets.RAW_IMAGE_SIZE)
+        if not self._get_raw_image_into(raw_bitmap):
+            return None
+        return bytes(raw_bitmap)
+
+    def _get_raw_image_into(self, buffer: Any) -> Optional[int]:
+        view = memoryview(buffer).cast("B")[: packets.RAW_IMAGE_SIZE]
+        assert len(view) == packets.RAW_IMAGE_SIZE
         response_code, parameter = self.send_command("GET_RAWIMAGE", 0)
         if response_code != packets.ACK_OK:
             logger.error(
                 "GetRawImage error: %s",
-                packets.reverse(packets.response_error)[parameter],
+                packets.response_error_names[parameter],
             )
             return None
 
         # read data response
         logger.info("Downloading raw image...")
-        to_read = packets.GetRawImageDataPacket().byte_size()
-        response_bytes = self._interface.read(to_read)
-
-        get_raw_image_data_response = packets.GetRawImageDataPacket.from_bytes(
-            response_bytes
-        )
-
-        return get_raw_image_data_response.raw_bitmap
+        if not self._read_data_packet_into(view):
+            return None
+        return len(view)
 
+    @_timeout_aware
     def get_image(self) -> Optional[bytes]:
+        bitmap = bytearray(packets.IMAGE_SIZE)
+        if not self.get_image_into(bitmap):
+            return None
+        return bytes(bitmap)
+
+    @_timeout_aware
+    def get_image_into(self, buffer: Any) -> Optional[int]:
+        # Like get_image, reading the bitmap straight into a writable buffer
+        # of at least IMAGE_SIZE bytes, e.g. a FrameRing slot. Returns the
+        # bytes written, None on failure.
+        view = memoryview(buffer).cast("B")[: packets.IMAGE_SIZE]
+        assert len(view) == packets.IMAGE_SIZE
         response_code, parameter = self.send_command("GET_IMAGE", 0)
         if response_code != packets.ACK_OK:
-            logger.error(
-                "GetImage error: %s", packets.reverse(packets.response_error)[parameter]
-            )
+            logger.error("GetImage error: %s", packets.response_error_names[parameter])
             return None
 
         # read data response
         logger.info("Downloading image...")
-        to_read = packets.GetImageDataPacket().byte_size()
-        response_bytes = self._interface.read(to_read)
-
-        get_image_data_response = packets.GetImageDataPacket.from_bytes(response_bytes)
-
-        return get_image_data_response.bitmap
+        if not self._read_data_packet_into(view):
+            return None
+        return len(view)
 
     @contextlib.contextmanager  # type: ignore
     def led(self) -> ContextManager[None]:  # type: ignore
         self.set_led(True)
-        yield None
-        self.set_led(False)
+        try:
+            yield None
+        finally:
+            with self._without_deadline():
+                self.set_led(False)
 
+    @_timeout_aware
     def set_led(self, onoff: bool) -> None:
         assert isinstance(onoff, bool)
         # Cannot fail
         _, _ = self.send_command("CMOS_LED", int(onoff))
 
-    def capture(self, best_image: bool = False) -> bool:
-        assert isinstance(best_image, bool)
-        response_code, parameter = self.send_command("CAPTURE", int(best_image))
+    @_timeout_aware
+    def get_security_level(self, refresh: bool = False) -> int:
+        # Read once and cached, the level only changes through this object
+        if self._security_level is None or refresh:
+            response_code, parameter = self.send_command("GET_SECURITY_LEVEL", 0)
+            if response_code != packets.ACK_OK:
+                logger.error(
+                    "GetSecurityLevel error: %s",
+                    packets.response_error_names[parameter],
+                )
+                raise GT521F32Exception("Could not read the security level.")
+            self._security_level = parameter
+        return self._security_level
+
+    @_timeout_aware
+    def set_security_level(self, level: int) -> bool:
+        assert security.MIN_SECURITY_LEVEL <= level <= security.MAX_SECURITY_LEVEL
+        response_code, parameter = self.send_command("SET_SECURITY_LEVEL", level)
+        if response_code != packets.ACK_OK:
+            logger.error(
+                "SetSecurityLevel error: %s",
+                packets.response_error_names[parameter],
+            )
+            self._security_level = None  # Unknown now
+            return False
+
+        self._security_level = level
+        return True
+
+    @_timeout_aware
+    def set_fake_detector(self, enabled: bool) -> bool:
+        assert isinstance(enabled, bool)
+        response_code, parameter = self.send_command("FAKE_DETECTOR", int(enabled))
         if response_code != packets.ACK_OK:
             logger.error(
-                "Capture error: %s", packets.reverse(packets.response_error)[parameter]
+                "FakeDetector error: %s",
+                packets.response_error_names[parameter],
             )
+            self._fake_detector = None
+            return False
+
+        self._fake_detector = enabled
+        return True
+
+    @property
+    def fake_detector(self) -> Optional[bool]:
+        # The device cannot report it, so this is None until it is set
+        return self._fake_detector
+
+    @_timeout_aware
+    def security_profile(self) -> security.SecurityProfile:
+        return security.SecurityProfile(self.get_security_level(), self._fake_detector)
+
+    @_timeout_aware
+    def apply_profile(self, profile: Union[str, security.SecurityProfile]) -> List[str]:
+        # Sends only the settings that differ from the cached state, and
+        # returns the names of the commands that were sent
+        if isinstance(profile, str):
+            profile = security.PROFILES[profile]
+
+        sent = []
+        if (
+            profile.security_level is not None
+            and profile.security_level != self.get_security_level()
+        ):
+            sent.append("SET_SECURITY_LEVEL")
+            if not self.set_security_level(profile.security_level):
+                raise GT521F32Exception("Could not set the security level.")
+        if (
+            profile.fake_detector is not None
+            and profile.fake_detector != self._fake_detector
+        ):
+            sent.append("FAKE_DETECTOR")
+            if not self.set_fake_detector(profile.fake_detector):
+                raise GT521F32Exception("Could not set the fake detector.")
+        return sent
+
+    @_timeout_aware
+    def capture(self, best_image: bool = False) -> bool:
+        assert isinstance(best_image, bool)
+        response_code, parameter = self._with_retry(
+            "CAPTURE", lambda: self.send_command("CAPTURE", int(best_image))
+        )
+        if response_code != packets.ACK_OK:
+            logger.error("Capture error: %s", packets.response_error_names[parameter])
             return False
 
         return True
 
+    @_timeout_aware
     def get_enrolled_count(self) -> int:
         # Supposedly this cannot fail?
         _, parameter = self.send_command("ENROLL_COUNT", 0)
         return parameter
 
+    @_timeout_aware
     def is_id_enrolled(self, user_id: int) -> bool:
         response_code, parameter = self.send_command("CHECK_ENROLLED", user_id)
         if response_code != packets.ACK_OK:
             logger.error(
                 "CheckEnroll %d error: %s",
                 user_id,
-                packets.reverse(packets.response_error)[parameter],
+                packets.response_error_names[parameter],
             )
             return False
         return True
 
+    @_timeout_aware
     def delete_id(self, user_id: int) -> bool:
         response_code, parameter = self.send_command("DELETE_ID", user_id)
         if response_code != packets.ACK_OK:
             logger.error(
                 "DeleteID %d error: %s",
                 user_id,
-                packets.reverse(packets.response_error)[parameter],
+                packets.response_error_names[parameter],
             )
             return False
 
         return True
 
+    @_timeout_aware
     def delete_all(self) -> bool:
         response_code, parameter = self.send_command("DELETE_ALL", 0)
         if response_code != packets.ACK_OK:
             logger.error(
                 "DeleteAll error: %s",
-                packets.reverse(packets.response_error)[parameter],
+                packets.response_error_names[parameter],
             )
             return False
 
         return True
 
+    def _pipeline(
+        self, command: str, parameters: Sequence[int], window: int
+    ) -> Iterator[Tuple[int, int]]:
+        # Writes up to window commands back to back, then reads all of their
+        # responses at once. SCSI transports pair each response with its
+        # command, so they get one command at a time.
+        transport = tracing.unwrap(self._interface)
+        if self._shared_interface:
+            transport = transport.inner  # the bus's own interface
+        if not isinstance(
+            transport,
+            (SerialInterface, interfaces.SimulatedInterface, interfaces.TCPInterface),
+        ):
+            window = 1
+        command_code = packets.command_codes[command]
+        for offset in range(0, len(parameters), window):
+            batch = parameters[offset : offset + window]
+            self._remaining()
+            self._interface.write(
+                b"".join(
+                    packets.encode_command(command_code, parameter, self._device_id)
+                    for parameter in batch
+                )
+            )
+            expected = len(batch) * packets.PACKET_SIZE
+            received = self._read(expected)
+            if len(received) < expected:
+                # Give late responses one more read timeout to arrive, so none
+                # is left to be taken for the answer to a later command
+                received += self._read(expected - len(received))
+            lost = []
+            responses: List[Optional[Tuple[int, int]]] = []
+            for index, parameter in enumerate(batch):
+                raw = received[
+                    index * packets.PACKET_SIZE : (index + 1) * packets.PACKET_SIZE
+                ]
+                response = packets.decode_response(raw)
+                if response is None:
+                    self._wire_error(
+                        "Bad response packet",
+                        link.classify(raw, packets.PACKET_SIZE, (0x55, 0xAA)),
+                    )
+                    lost.append(index)
+                elif not self._from_this_device(raw):
+                    response = None
+                    lost.append(index)
+                else:
+                    self._link_ok()
+                responses.append(response)
+            if lost:
+                self._interface.reset_input_buffer()
+                for index in lost:
+                    responses[index] = self._settle(command, batch[index])
+            yield from responses  # type: ignore
+
+    def _settle(self, command: str, parameter: int) -> Tuple[int, int]:
+        # The outcome of a pipelined command whose response was lost. It was
+        # sent, so only a command that can safely run twice is sent again;
+        # when that fails too the ID is reported with NACK_COMM_ERR.
+        try:
+            if command in retry.IDEMPOTENT_COMMANDS:
+                return self.send_command(command, parameter)
+            if command == "DELETE_ID":
+                response_code, error = self.send_command("CHECK_ENROLLED", parameter)
+                if response_code == packets.ACK_OK:
+                    # Still enrolled, so the first DELETE_ID was not applied
+                    return self.send_command(command, parameter)
+                if error == packets.response_error["NACK_IS_NOT_USED"]:
+                    return packets.ACK_OK, 0  # Free now, whichever way it got there
+        except GT521F32TimeoutException:
+            raise
+        except GT521F32Exception as e:  # pylint: disable=invalid-name
+            logger.warning("Lost the outcome of %s %d: %s", command, parameter, e)
+        return (
+            packets.command_codes["NACK_INFO"],
+            packets.response_error["NACK_COMM_ERR"],
+        )
+
+    def _bulk(
+        self, command: str, user_ids: Iterable[int], window: Optional[int]
+    ) -> bulk.BulkResult:
+        ids = array.array("H", user_ids)
+        errors = array.array("H", bytes(len(ids) * 2))
+        started = time.monotonic()
+        for index, (response_code, parameter) in enumerate(
+            self._pipeline(command, ids, window or self._BULK_WINDOW)
+        ):
+            if response_code != packets.ACK_OK:
+                errors[index] = parameter & 0xFFFF
+        result = bulk.BulkResult(command, ids, errors, time.monotonic() - started)
+        logger.debug("%s on %d IDs: %s", command, len(ids), result.summary())
+        return result
+
+    @_timeout_aware
+    def check_enrolled_range(
+        self, start: int = 0, stop: Optional[int] = None, window: Optional[int] = None
+    ) -> bulk.BulkResult:
+        # The enrolled IDs in [start, stop) are the result's succeeded ones,
+        # free IDs fail with NACK_IS_NOT_USED
+        stop = self._DATABASE_SIZE if stop is None else stop
+        return self._bulk("CHECK_ENROLLED", range(start, stop), window)
+
+    @_timeout_aware
+    def delete_ids(
+        self, user_ids: Iterable[int], window: Optional[int] = None
+    ) -> bulk.BulkResult:
+        # IDs that were already free fail with NACK_IS_NOT_USED
+        return self._bulk("DELETE_ID", user_ids, window)
+
+    @_timeout_aware
+    def purge_except(
+        self, keep_ids: Iterable[int], window: Optional[int] = None
+    ) -> bulk.BulkResult:
+        # Deletes every enrolled ID not in keep_ids
+        keep = set(keep_ids)
+        enrolled = self.check_enrolled_range(window=window).succeeded
+        return self.delete_ids(
+            (user_id for user_id in enrolled if user_id not in keep), window
+        )
+
+    @_timeout_aware
     def verify(self, user_id: int) -> bool:
-        self.prompt_finger_and_capture()
+        def attempt() -> Tuple[int, int]:
+            self.prompt_finger_and_capture()
+            return self.send_command("VERIFY", user_id)
 
-        response_code, parameter = self.send_command("VERIFY", user_id)
+        response_code, parameter = self._with_retry("VERIFY", attempt)
         if response_code != packets.ACK_OK:
             logger.error(
                 "Verify %d error: %s",
                 user_id,
-                packets.reverse(packets.response_error)[parameter],
+                packets.response_error_names[parameter],
             )
             return False
 
         return True
 
+    @_timeout_aware
+    def make_template(self) -> Optional[bytes]:
+        # Turns the last capture into a template, without storing it
+        response_code, parameter = self.send_command("MAKE_TEMPLATE", 0)
+        if response_code != packets.ACK_OK:
+            logger.error(
+                "MakeTemplate error: %s",
+                packets.response_error_names[parameter],
+            )
+            return None
+
+        return self._read_template()
+
+    def _read_template(self) -> Optional[bytes]:
+        to_read = packets.TemplateDataPacket().byte_size()
+        response_bytes = self._read(to_read)
+        template_response = packets.TemplateDataPacket.from_bytes(response_bytes)
+        if template_response is None:
+            self._interface.reset_input_buffer()
+            self._wire_error(
+                "Bad template packet",
+                link.classify(response_bytes, to_read, (0x5A, 0xA5)),
+            )
+            return None
+        if not self._from_this_device(response_bytes):
+            return None
+
+        self._link_ok()
+        return template_response.template
+
+    def _send_template(self, template: bytes) -> packets.ResponsePacket:
+        # For commands followed by a template data packet
+        self._interface.write(
+            packets.TemplateDataPacket(template, self._device_id).to_bytes()
+        )
+
+        to_read = packets.ResponsePacket().byte_size()
+        response_bytes = self._read(to_read)
+        response_packet = packets.ResponsePacket.from_bytes(response_bytes)
+        if response_packet is None:
+            self._interface.reset_input_buffer()
+            self._wire_error(
+                "Bad response packet",
+                link.classify(response_bytes, to_read, (0x55, 0xAA)),
+            )
+            raise GT521F32Exception("Command failed.")
+        if not self._from_this_device(response_bytes):
+            raise GT521F32Exception("Command failed.")
+        self._link_ok()
+        return response_packet
+
+    @_timeout_aware
+    def get_template(self, user_id: int) -> Optional[bytes]:
+        # The template stored in a slot, None when the slot is empty
+        response_code, parameter = self.send_command("GET_TEMPLATE", user_id)
+        if response_code != packets.ACK_OK:
+            logger.debug(
+                "GetTemplate %d error: %s",
+                user_id,
+                packets.response_error_names[parameter],
+            )
+            return None
+
+        return self._read_template()
+
+    @_timeout_aware
+    def set_template(self, user_id: int, template: bytes) -> bool:
+        # Stores a template, e.g. one read from another reader, in a slot
+        assert len(template) == len(packets.TemplateDataPacket().template)
+        response_code, parameter = self.send_command("SET_TEMPLATE", user_id)
+        if response_code != packets.ACK_OK:
+            logger.error(
+                "SetTemplate %d error: %s",
+                user_id,
+                packets.response_error_names[parameter],
+            )
+            return False
+
+        response_packet = self._send_template(template)
+        if not response_packet.ok:
+            logger.error(
+                "SetTemplate %d error: %s",
+                user_id,
+                packets.response_error_names.get(
+                    response_packet.parameter, response_packet.parameter
+                ),
+            )
+            return False
+
+        return True
+
+    @_timeout_aware
+    def verify_template(self, user_id: int, template: bytes) -> bool:
+        response_code, parameter = self.send_command("VERIFY_TEMPLATE", user_id)
+        if response_code != packets.ACK_OK:
+            logger.error(
+                "VerifyTemplate %d error: %s",
+                user_id,
+                packets.response_error_names[parameter],
+            )
+            return False
+
+        response_packet = self._send_template(template)
+        if not response_packet.ok:
+            logger.debug(
+                "VerifyTemplate %d error: %s",
+                user_id,
+                packets.response_error_names.get(
+                    response_packet.parameter, response_packet.parameter
+                ),
+            )
+            return False
+
+        return True
+
+    @_timeout_aware
+    def capture_probe(self, ttl: float = _PROBE_TTL) -> Optional[bytes]:
+        # Captures a finger once and keeps its template for verify_any()
+        self.clear_probe()
+        self.prompt_finger_and_capture()
+        template = self.make_template()
+        if template is not None:
+            self._probe_template = template
+            self._probe_expires_at = time.monotonic() + ttl
+        return template
+
+    def clear_probe(self) -> None:
+        self._probe_template = None
+        self._probe_expires_at = 0.0
+
+    @property
+    def probe_template(self) -> Optional[bytes]:
+        if time.monotonic() >= self._probe_expires_at:
+            self._probe_template = None
+        return self._probe_template
+
+    @_timeout_aware
+    def verify_any(
+        self, user_ids: Iterable[int], ttl: float = _PROBE_TTL
+    ) -> Optional[int]:
+        # One touch, then one VERIFY_TEMPLATE per candidate until a match;
+        # a probe younger than ttl is reused instead of prompting again
+        template = self.probe_template
+        if template is None:
+            template = self.capture_probe(ttl)
+            if template is None:
+                return None
+
+        for user_id in user_ids:
+            if self.verify_template(user_id, template):
+                return user_id
+        return None
+
+    @_timeout_aware
     def save_image_to_bmp(self, path: str) -> None:
         self.prompt_finger_and_capture()
         bitmap = self.get_image()
@@ -411,12 +1300,13 @@ class GT521F32:
             save_bitmap_to_file(path, bitmap)
 
     # Utitilies
+    @_timeout_aware
     def is_finger_pressed(self) -> bool:
         response_code, parameter = self.send_command("IS_PRESS_FINGER", 0)
         if response_code != packets.ACK_OK:
             logger.error(
                 "IsFingerPressed error: %s",
-                packets.reverse(packets.response_error)[parameter],
+                packets.response_error_names[parameter],
             )
             return False
         return not bool(parameter)
@@ -424,14 +1314,22 @@ class GT521F32:
     def cancel(self) -> None:
         self._cancel.set()
 
-    def wait_for_finger_press(self, interval: float = _PROMPT_INTERVAL) -> None:
-        while not self._cancel.is_set() and not self.is_finger_pressed():
-            self._delay(interval)
+    def wait_for_finger_press(
+        self, interval: float = _PROMPT_INTERVAL, timeout: Optional[float] = None
+    ) -> bool:
+        # Returns False if cancelled, raises GT521F32TimeoutException on timeout
+        with self.deadline(timeout):
+            while not self._cancel.is_set() and not self.is_finger_pressed():
+                remaining = self._remaining()
+                self._delay(interval if remaining is None else min(interval, remaining))
 
         if self._cancel.is_set():
             logger.info("Cancelled action.")
             self._cancel.clear()
+            return False
+        return True
 
+    @_timeout_aware
     def prompt_finger_and_capture(self) -> None:
         with self.prompt_finger():
             self.capture()
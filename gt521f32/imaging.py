@@ -0,0 +1,175 @@
+# pylint: disable=bad-continuation # Black and pylint disagree on this
+# pylint: disable=missing-module-docstring
+# pylint: disable=missing-class-docstring
+# pylint: disable=missing-function-docstring
+import functools
+from typing import Iterable, Optional, Tuple, Union
+
+try:
+    import numpy as np  # type: ignore
+except ImportError as e:  # pylint: disable=invalid-name
+    raise ImportError(
+        "gt521f32.imaging needs numpy, install PyGT521F32[imaging]"
+    ) from e
+
+from . import packets
+
+# Operations on bitmaps as uint8 arrays of shape (height, width), or stacks
+# of them shaped (frames, height, width); everything is vectorized across
+# the stack. Bitmaps are wrapped without copying where possible.
+
+RAW_IMAGE_SHAPE = (120, 160)  # GET_RAWIMAGE
+IMAGE_SHAPE = (258, 202)  # GET_IMAGE
+
+Shape = Tuple[int, int]
+Frames = np.ndarray  # (height, width) or (frames, height, width)
+
+
+def _shape_for(size: int, shape: Optional[Shape]) -> Shape:
+    if shape is not None:
+        return shape
+    if size % packets.IMAGE_SIZE == 0:
+        return IMAGE_SHAPE
+    if size % packets.RAW_IMAGE_SIZE == 0:
+        return RAW_IMAGE_SHAPE
+    raise ValueError("Cannot infer the frame shape of %d bytes" % (size,))
+
+
+def as_array(bitmap, shape: Optional[Shape] = None) -> np.ndarray:
+    # A view of one bitmap, or of several frames back to back (e.g. a
+    # recording or a mmap), shaped by its size unless shape is given.
+    # Read-only when bitmap is bytes.
+    array = np.frombuffer(bitmap, dtype=np.uint8)
+    height, width = _shape_for(array.size, shape)
+    if array.size == height * width:
+        return array.reshape(height, width)
+    return array.reshape(-1, height, width)
+
+
+def stack(bitmaps: Iterable, shape: Optional[Shape] = None) -> np.ndarray:
+    # Copies separate bitmaps into one (frames, height, width) array
+    return np.stack([as_array(bitmap, shape) for bitmap in bitmaps])
+
+
+def estimate_background(frames: Frames) -> np.ndarray:
+    # Per-pixel median of frames taken with no finger on the sensor
+    frames = np.asarray(frames)
+    if frames.ndim == 2:
+        return frames.astype(np.float32)
+    return np.median(frames, axis=0).astype(np.float32)
+
+
+def subtract_background(frames: Frames, background: np.ndarray) -> np.ndarray:
+    # How much darker than the empty sensor each pixel is, so the finger
+    # shows up bright on black and fixed pattern noise drops out
+    difference = background - np.asarray(frames, dtype=np.float32)
+    return np.clip(difference, 0, 255).astype(np.uint8)
+
+
+def normalize(
+    frames: Frames, low_percentile: float = 1.0, high_percentile: float = 99.0
+) -> np.ndarray:
+    # Stretches each frame's contrast so its percentiles map to 0 and 255
+    frames = np.asarray(frames)
+    axes = (-2, -1)
+    low, high = np.percentile(
+        frames, (low_percentile, high_percentile), axis=axes, keepdims=True
+    )
+    span = np.maximum(high - low, 1.0)
+    scaled = (frames.astype(np.float32) - low) * (255.0 / span)
+    return np.clip(scaled, 0, 255).astype(np.uint8)
+
+
+def finger_boxes(frames: Frames, threshold: int = 0xC0) -> np.ndarray:
+    # (top, left, bottom, right) per frame, exclusive bottom and right, of
+    # the pixels darker than threshold; the whole frame when there are none
+    frames = np.asarray(frames)
+    single = frames.ndim == 2
+    frames = frames[np.newaxis] if single else frames
+    mask = frames < threshold
+    rows, columns = mask.any(axis=2), mask.any(axis=1)
+    height, width = frames.shape[1:]
+
+    def extent(hits: np.ndarray, size: int) -> Tuple[np.ndarray, np.ndarray]:
+        found = hits.any(axis=1)
+        first = np.where(found, hits.argmax(axis=1), 0)
+        last = np.where(found, size - hits[:, ::-1].argmax(axis=1), size)
+        return first, last
+
+    top, bottom = extent(rows, height)
+    left, right = extent(columns, width)
+    boxes = np.stack([top, left, bottom, right], axis=1)
+    return boxes[0] if single else boxes
+
+
+def crop_roi(
+    frames: Frames, size: Shape, boxes: Optional[np.ndarray] = None
+) -> np.ndarray:
+    # Fixed size crops centered on each frame's finger, shifted to stay
+    # inside the frame
+    frames = np.asarray(frames)
+    single = frames.ndim == 2
+    frames = frames[np.newaxis] if single else frames
+    boxes = finger_boxes(frames) if boxes is None else np.atleast_2d(boxes)
+    height, width = frames.shape[1:]
+    crop_height, crop_width = size
+    assert crop_height <= height and crop_width <= width
+
+    center_y = (boxes[:, 0] + boxes[:, 2]) // 2
+    center_x = (boxes[:, 1] + boxes[:, 3]) // 2
+    top = np.clip(center_y - crop_height // 2, 0, height - crop_height)
+    left = np.clip(center_x - crop_width // 2, 0, width - crop_width)
+
+    rows = top[:, np.newaxis] + np.arange(crop_height)
+    columns = left[:, np.newaxis] + np.arange(crop_width)
+    index = np.arange(len(frames))[:, np.newaxis, np.newaxis]
+    crops = frames[index, rows[:, :, np.newaxis], columns[:, np.newaxis, :]]
+    return crops[0] if single else crops
+
+
+@functools.lru_cache(maxsize=32)
+def _sample_points(
+    size: int, scale: float
+) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+    # Source coordinates of each output pixel's center: the pixel below, the
+    # one after it and the weight of the latter
+    output = max(1, int(round(size * scale)))
+    source = (np.arange(output) + 0.5) / scale - 0.5
+    source = np.clip(source, 0, size - 1)
+    below = np.floor(source).astype(np.intp)
+    above = np.minimum(below + 1, size - 1)
+    return below, above, (source - below).astype(np.float32)
+
+
+@functools.lru_cache(maxsize=32)
+def _interpolation_matrix(size: int, scale: float) -> np.ndarray:
+    # (output, size) linear interpolation weights, so a separable resize is
+    # two matrix products, which BLAS runs far faster than gathering
+    below, above, weights = _sample_points(size, scale)
+    matrix = np.zeros((len(below), size), dtype=np.float32)
+    rows = np.arange(len(below))
+    np.add.at(matrix, (rows, below), 1.0 - weights)
+    np.add.at(matrix, (rows, above), weights)
+    return matrix
+
+
+def resample(
+    frames: Frames, scale: Union[float, Tuple[float, float]], bilinear: bool = True
+) -> np.ndarray:
+    # Scales frames by any factor, e.g. the viewer's 1.5; index tables and
+    # weights are cached per shape and scale
+    frames = np.asarray(frames)
+    scale_y, scale_x = scale if isinstance(scale, tuple) else (scale, scale)
+    height, width = frames.shape[-2:]
+
+    if not bilinear:
+        rows_below, rows_above, row_weights = _sample_points(height, scale_y)
+        columns_below, columns_above, column_weights = _sample_points(width, scale_x)
+        rows = np.where(row_weights < 0.5, rows_below, rows_above)
+        columns = np.where(column_weights < 0.5, columns_below, columns_above)
+        return frames[..., rows[:, np.newaxis], columns]
+
+    vertical = _interpolation_matrix(height, scale_y)
+    horizontal = _interpolation_matrix(width, scale_x).T
+    blended = vertical @ frames.astype(np.float32) @ horizontal
+    return (blended + 0.5).astype(np.uint8)
@@ -2,15 +2,35 @@
 # pylint: disable=missing-module-docstring
 # pylint: disable=missing-class-docstring
 # pylint: disable=missing-function-docstring
+import importlib
 import sys
 from .exception import InterfaceException
 from .serial import SerialInterfaceException, SerialInterface
 
+_LAZY = {
+    "SimulatedInterface": (".simulated", "SimulatedInterface"),
+    "SimulatedInterfaceException": (".simulated", "SimulatedInterfaceException"),
+    "TCPInterface": (".tcp", "TCPInterface"),
+    "TCPInterfaceException": (".tcp", "TCPInterfaceException"),
+}
+
 if sys.platform == "linux":
-    from .scsi_linux import LinuxSCSIInterface as SCSIInterface
-    from .scsi_linux import LinuxSCSIInterfaceException as SCSIInterfaceException
+    _LAZY["SCSIInterface"] = (".scsi_linux", "LinuxSCSIInterface")
+    _LAZY["SCSIInterfaceException"] = (".scsi_linux", "LinuxSCSIInterfaceException")
 elif sys.platform == "win32":
-    from .scsi_windows import WindowsSCSIInterface as SCSIInterface
-    from .scsi_windows import WindowsSCSIInterfaceException as SCSIInterfaceException
+    _LAZY["SCSIInterface"] = (".scsi_windows", "WindowsSCSIInterface")
+    _LAZY["SCSIInterfaceException"] = (".scsi_windows", "WindowsSCSIInterfaceException")
 else:
     raise NotImplementedError("%s not supported by this library" % (sys.platform,))
+
+
+def __getattr__(name):
+    # Only the serial interface is imported eagerly, the others (sgio, ctypes
+    # bindings, sockets) are loaded on first use to keep startup fast
+    if name not in _LAZY:
+        raise AttributeError("module %r has no attribute %r" % (__name__, name))
+
+    module_name, attribute = _LAZY[name]
+    value = getattr(importlib.import_module(module_name, __name__), attribute)
+    globals()[name] = value
+    return value
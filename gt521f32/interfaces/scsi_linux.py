@@ -8,7 +8,6 @@ import sgio  # type: ignore
 
 from .exception import InterfaceException
 
-
 logger = logging.getLogger(__name__)  # pylint: disable=invalid-name
 
 
@@ -33,7 +32,8 @@ class LinuxSCSIInterface:
             logger.error("Could not open the SCSI device: %s", e)
             raise LinuxSCSIInterfaceException(e)
 
-    def read(self, size=1):
+    def read(self, size=1, timeout=None):  # pylint: disable=unused-argument
+        # SG_IO through sgio uses the kernel's default timeout
         assert size != 0
         # Allocate data
         cdb = bytearray(0x10)
@@ -58,5 +58,8 @@ class LinuxSCSIInterface:
 
         return data_out
 
+    def reset_input_buffer(self):
+        pass  # Every read is a complete SCSI transfer, nothing is buffered
+
     def close(self):
         self._file.close()
@@ -3,6 +3,7 @@
 # pylint: disable=missing-class-docstring
 # pylint: disable=missing-function-docstring
 import ctypes
+import math
 from ctypes.wintypes import UINT, ULONG, USHORT, DWORD, BOOL, HANDLE
 from ctypes.wintypes import LPCWSTR
 import serial.win32 as win32  # type: ignore
@@ -203,11 +204,17 @@ class WindowsSCSIInterface:
 
         return sptdwb.sptd.DataTransferLength
 
-    def read(self, size=1):
+    def read(self, size=1, timeout=None):
         assert size != 0
         # Allocate data
         buf = ctypes.create_string_buffer(size)
-        data_read = self._scsi_operation(ctypes.addressof(buf), size, True)
+        if timeout is None:
+            data_read = self._scsi_operation(ctypes.addressof(buf), size, True)
+        else:
+            # TimeOutValue is in whole seconds
+            data_read = self._scsi_operation(
+                ctypes.addressof(buf), size, True, max(1, math.ceil(timeout))
+            )
 
         assert data_read == size
         return buf.raw[:data_read]
@@ -219,5 +226,8 @@ class WindowsSCSIInterface:
 
         return self._scsi_operation(ctypes.addressof(buf), len(buf), False)
 
+    def reset_input_buffer(self):
+        pass  # Every read is a complete SCSI transfer, nothing is buffered
+
     def close(self):
         win32.CloseHandle(self._port_handle)
@@ -31,8 +31,9 @@ class SerialInterface:
     ):
         self._port = port
         try:
-            self._serial = serial.Serial(
-                port=self._port, baudrate=baudrate, bytesize=bytesize, timeout=timeout
+            # Handles local ports as well as rfc2217:// and socket:// urls
+            self._serial = serial.serial_for_url(
+                self._port, baudrate=baudrate, bytesize=bytesize, timeout=timeout
             )
         except serial.SerialException as e:  # pylint: disable=C0103
             logger.error("Could not open the serial device: %s", e)
@@ -49,17 +50,33 @@ class SerialInterface:
         while len(self._serial.read(self._serial.in_waiting)) > 0:
             self._delay(self._BUFFERED_DELAY)
 
-    def _buffered_read(self, count):
-        data = bytes()
-        fragment = self._serial.read(self._serial.in_waiting)
-        while len(data) < count:
+    def _buffered_readinto(self, buffer, timeout=None):
+        # Without a timeout, give up once the device stalls for the port timeout
+        stall_timeout = self._serial.timeout if timeout is None else timeout
+        deadline = time.monotonic() + stall_timeout
+        view = memoryview(buffer).cast("B")
+        count = len(view)
+        received = 0
+        while received < count:
+            wanted = min(self._serial.in_waiting, count - received)
+            size = self._serial.readinto(view[received : received + wanted])
+            if size:
+                logger.debug("Read fragment of %d size", size)
+                received += size
+                if timeout is None:
+                    deadline = time.monotonic() + stall_timeout
+                continue
+
+            if time.monotonic() >= deadline:
+                logger.error("Timed out after reading %d of %d bytes", received, count)
+                break
             self._delay(self._BUFFERED_DELAY)
-            logger.debug("Read fragment of %d size", len(fragment))
-            data += fragment
-            fragment = self._serial.read(self._serial.in_waiting)
 
-        assert len(data) == count
-        return data
+        return received
+
+    def _buffered_read(self, count, timeout=None):
+        data = bytearray(count)
+        return bytes(data[: self._buffered_readinto(data, timeout)])
 
     @staticmethod
     def _delay(seconds):
@@ -68,10 +85,31 @@ class SerialInterface:
     def write(self, data):
         return self._serial.write(data)
 
-    def read(self, to_read):
+    def read(self, to_read, timeout=None):
         if to_read > SerialInterface._FRAGMENT_SIZE:
-            return self._buffered_read(to_read)
-        return self._serial.read(to_read)
+            return self._buffered_read(to_read, timeout)
+        if timeout is None or timeout == self._serial.timeout:
+            return self._serial.read(to_read)
+
+        default_timeout = self._serial.timeout
+        self._serial.timeout = timeout
+        try:
+            return self._serial.read(to_read)
+        finally:
+            self._serial.timeout = default_timeout
+
+    def readinto(self, buffer, timeout=None):
+        # Fills a caller owned buffer, e.g. a frame ring slot, and returns the
+        # number of bytes read
+        view = memoryview(buffer).cast("B")
+        if len(view) > SerialInterface._FRAGMENT_SIZE:
+            return self._buffered_readinto(view, timeout)
+        data = self.read(len(view), timeout)
+        view[: len(data)] = data
+        return len(data)
+
+    def reset_input_buffer(self):
+        self._serial.reset_input_buffer()
 
     def close(self):
         return self._serial.close()
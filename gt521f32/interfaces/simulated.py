@@ -0,0 +1,612 @@
+# pylint: disable=bad-continuation # Black and pylint disagree on this
+# pylint: disable=missing-module-docstring
+# pylint: disable=missing-class-docstring
+# pylint: disable=missing-function-docstring
+import hashlib
+import logging
+import math
+import random
+import struct
+import threading
+import time
+from typing import Callable, ClassVar, Dict, Optional, Tuple
+from urllib.parse import urlparse, parse_qs
+
+from .. import packets
+from .exception import InterfaceException
+
+# An in-process model of a GT521F32, speaking the wire protocol, so the
+# library can be exercised without hardware. Ports look like
+# sim://<name>?users=<n>&finger=<finger id>&realtime=1. With
+# ids=<id>,<id>,... the port is a bus shared by one module per device id,
+# and only the addressed module answers. With noise=<p> a bit of each
+# response byte is flipped with chance p at 9600 baud, more at faster rates.
+
+logger = logging.getLogger(__name__)  # pylint: disable=invalid-name
+
+_COMMAND_SIZE = 12
+_DATA_OVERHEAD = 6  # start codes, device id and checksum
+_HEADER = struct.Struct("<BBH")
+_COMMAND = struct.Struct("<BBHLH")
+_CHECKSUM = struct.Struct("<H")
+_ADDRESS = struct.Struct("<H")
+
+_RAW_IMAGE_DIMENSIONS = (160, 120)
+_IMAGE_DIMENSIONS = (202, 258)
+_TEMPLATE_SIZE = 498
+_MAX_RECORD_COUNT = 200
+_ISO_AREA_MAX_SIZE = 0x4000
+_FIRMWARE_MAX_SIZE = 0x40000
+
+# Chance that a genuine match is rejected, per security level; stricter
+# levels trade convenience for fewer false accepts
+FALSE_REJECT_RATES = {1: 0.001, 2: 0.005, 3: 0.01, 4: 0.03, 5: 0.08}
+
+
+class SimulatedInterfaceException(InterfaceException):
+    pass
+
+
+def _checksum(data: bytes) -> int:
+    return sum(data) % 2 ** 16
+
+
+def finger_template(finger: int) -> bytes:
+    # A stable, finger-specific template
+    seed = struct.pack("<L", finger)
+    digest = b""
+    counter = 0
+    while len(digest) < _TEMPLATE_SIZE:
+        digest += hashlib.sha256(seed + struct.pack("<L", counter)).digest()
+        counter += 1
+    return digest[:_TEMPLATE_SIZE]
+
+
+def _render_frame(dimensions: Tuple[int, int], finger: Optional[int]) -> bytes:
+    width, height = dimensions
+    frame = bytearray(b"\xe0" * (width * height))
+    if finger is None:
+        return bytes(frame)
+
+    # An elliptic blob of ridges whose spacing depends on the finger
+    period = 4 + finger % 5
+    center_x, center_y = width // 2, height // 2
+    radius_x, radius_y = width * 3 // 8, height * 3 // 8
+    for y in range(height):
+        dy = (y - center_y) / radius_y
+        row = y * width
+        for x in range(width):
+            dx = (x - center_x) / radius_x
+            if dx * dx + dy * dy <= 1.0:
+                frame[row + x] = 0x30 if (x + y) % period < period // 2 else 0x90
+    return bytes(frame)
+
+
+class SimulatedDevice:
+    _registry: ClassVar[Dict[str, "SimulatedDevice"]] = {}
+    _registry_lock: ClassVar[threading.Lock] = threading.Lock()
+    _frames: ClassVar[Dict[Tuple[Tuple[int, int], Optional[int]], bytes]] = {}
+
+    name: str
+    device_id: int
+    firmware_version: int
+    serial_number: bytes
+    finger: Optional[int]
+    led: bool
+    database: Dict[int, bytes]
+    firmware_image: bytes
+    iso_area: bytes
+    security_level: int
+    fake_detector: bool
+    fake_finger: bool
+    false_reject_rates: Dict[int, float]
+
+    def __init__(self, name: str = "", device_id: int = 1):
+        self.name = name
+        self.device_id = device_id
+        self.firmware_version = 0x20120417
+        self.serial_number = hashlib.md5(name.encode("utf-8")).digest()
+        self.baudrate = 9600
+        self.finger = None
+        self.led = False
+        self.database = {}
+        self.firmware_image = b""
+        self.iso_area = b""
+        self.security_level = 3
+        self.fake_detector = False
+        self.fake_finger = False
+        self.false_reject_rates = dict(FALSE_REJECT_RATES)
+        self.line_noise = 0.0  # chance per byte at 9600 baud of a flipped bit
+        self._random = random.Random(name)  # Reproducible per device
+        self._captured: Optional[int] = None
+        self._enroll_slot: Optional[int] = None
+        self._lock = threading.Lock()
+        self._input = bytearray()
+        self._expected_data: Optional[
+            Tuple[int, Callable[[bytes], Tuple[bool, int, bytes]]]
+        ] = None
+        self._handlers: Dict[int, Callable[[int], Tuple[bool, int, bytes]]] = {
+            packets.command_codes[command]: handler
+            for command, handler in (
+                ("OPEN", self._open),
+                ("CLOSE", self._ack),
+                ("USB_INTERNAL_CHECK", self._ack),
+                ("CHANGE_BAUDRATE", self._change_baudrate),
+                ("MODULE_INFO", self._module_info),
+                ("CMOS_LED", self._cmos_led),
+                ("ENROLL_COUNT", self._enroll_count),
+                ("CHECK_ENROLLED", self._check_enrolled),
+                ("ENROLL_START", self._enroll_start),
+                ("ENROLL1", self._enroll_n),
+                ("ENROLL2", self._enroll_n),
+                ("ENROLL3", self._enroll_3),
+                ("IS_PRESS_FINGER", self._is_press_finger),
+                ("DELETE_ID", self._delete_id),
+                ("DELETE_ALL", self._delete_all),
+                ("VERIFY", self._verify),
+                ("IDENTIFY", self._identify),
+                ("CAPTURE", self._capture),
+                ("MAKE_TEMPLATE", self._make_template),
+                ("VERIFY_TEMPLATE", self._verify_template),
+                ("GET_TEMPLATE", self._get_template),
+                ("SET_TEMPLATE", self._set_template),
+                ("GET_IMAGE", self._get_image),
+                ("GET_RAWIMAGE", self._get_raw_image),
+                ("FW_UPDATE", self._firmware_update),
+                ("ISO_UPDATE", self._iso_update),
+                ("SET_SECURITY_LEVEL", self._set_security_level),
+                ("GET_SECURITY_LEVEL", self._get_security_level),
+                ("FAKE_DETECTOR", self._set_fake_detector),
+            )
+        }
+
+    @classmethod
+    def get(cls, name: str, device_id: int = 1) -> "SimulatedDevice":
+        # Devices outlive interfaces, so a reopened port sees the same state.
+        # Modules on a bus are told apart, and get their own serial numbers,
+        # by device id.
+        if device_id != 1:
+            name = "%s#%d" % (name, device_id)
+        with cls._registry_lock:
+            if name not in cls._registry:
+                cls._registry[name] = cls(name, device_id)
+            return cls._registry[name]
+
+    @classmethod
+    def remove(cls, name: str) -> None:
+        with cls._registry_lock:
+            cls._registry.pop(name, None)
+
+    def press_finger(self, finger: int, fake: bool = False) -> None:
+        self.finger = finger
+        self.fake_finger = fake
+
+    def lift_finger(self) -> None:
+        self.finger = None
+
+    def enroll(self, slot: int, finger: int) -> None:
+        self.database[slot] = finger_template(finger)
+
+    def handle(self, data: bytes) -> bytes:
+        # Consumes a stream of command packets, and of the data packets some
+        # commands expect from the host, and returns everything sent back
+        output = b""
+        with self._lock:
+            self._input += data
+            while True:
+                if self._expected_data is not None:
+                    size, handler = self._expected_data
+                    if len(self._input) < size + _DATA_OVERHEAD:
+                        break
+                    packet = bytes(self._input[: size + _DATA_OVERHEAD])
+                    del self._input[: size + _DATA_OVERHEAD]
+                    self._expected_data = None
+                    output += self._handle_data(packet, handler)
+                else:
+                    if len(self._input) < _COMMAND_SIZE:
+                        break
+                    packet = bytes(self._input[:_COMMAND_SIZE])
+                    del self._input[:_COMMAND_SIZE]
+                    output += self._handle_command(packet)
+        return output
+
+    def _handle_command(self, command_bytes: bytes) -> bytes:
+        code1, code2, device_id, parameter, command = _COMMAND.unpack(
+            command_bytes[:-2]
+        )
+        (checksum,) = _CHECKSUM.unpack(command_bytes[-2:])
+        if (code1, code2) != (0x55, 0xAA) or checksum != _checksum(command_bytes[:-2]):
+            return self._response(False, packets.response_error["NACK_COMM_ERR"])
+        if device_id != self.device_id:
+            return b""  # Not addressed to us
+
+        handler = self._handlers.get(command)
+        if handler is None:
+            return self._response(
+                False, packets.response_error["NACK_IS_NOT_SUPPORTED"]
+            )
+
+        ok, response_parameter, data = handler(parameter)
+        return self._response(ok, response_parameter) + data
+
+    def _handle_data(
+        self, packet: bytes, handler: Callable[[bytes], Tuple[bool, int, bytes]]
+    ) -> bytes:
+        code1, code2, device_id = _HEADER.unpack(packet[: _HEADER.size])
+        (checksum,) = _CHECKSUM.unpack(packet[-2:])
+        if device_id != self.device_id:
+            return b""
+        if (code1, code2) != (0x5A, 0xA5) or checksum != _checksum(packet[:-2]):
+            return self._response(False, packets.response_error["NACK_COMM_ERR"])
+
+        ok, response_parameter, data = handler(packet[_HEADER.size : -2])
+        return self._response(ok, response_parameter) + data
+
+    def _expect_data(
+        self, size: int, handler: Callable[[bytes], Tuple[bool, int, bytes]]
+    ) -> None:
+        self._expected_data = (size, handler)
+
+    def _response(self, ok: bool, parameter: int) -> bytes:
+        code = packets.command_codes["ACK_OK" if ok else "NACK_INFO"]
+        body = _COMMAND.pack(0x55, 0xAA, self.device_id, parameter, code)
+        return body + _CHECKSUM.pack(_checksum(body))
+
+    def _data(self, payload: bytes) -> bytes:
+        body = _HEADER.pack(0x5A, 0xA5, self.device_id) + payload
+        return body + _CHECKSUM.pack(_checksum(body))
+
+    @staticmethod
+    def _nack(error: str) -> Tuple[bool, int, bytes]:
+        return False, packets.response_error[error], b""
+
+    @staticmethod
+    def _ack(_parameter: int = 0) -> Tuple[bool, int, bytes]:
+        return True, 0, b""
+
+    def _frame(self, dimensions: Tuple[int, int]) -> bytes:
+        key = (
+            dimensions,
+            self._captured if dimensions == _IMAGE_DIMENSIONS else self.finger,
+        )
+        if key not in SimulatedDevice._frames:
+            SimulatedDevice._frames[key] = _render_frame(*key)
+        return SimulatedDevice._frames[key]
+
+    def _open(self, parameter: int) -> Tuple[bool, int, bytes]:
+        if not parameter:
+            return self._ack()
+        payload = struct.pack(
+            "<LL16s", self.firmware_version, _ISO_AREA_MAX_SIZE, self.serial_number
+        )
+        return True, 0, self._data(payload)
+
+    def _change_baudrate(self, parameter: int) -> Tuple[bool, int, bytes]:
+        if parameter not in (9600, 19200, 38400, 57600, 115200):
+            return self._nack("NACK_INVALID_BAUDRATE")
+        self.baudrate = parameter
+        return self._ack()
+
+    def _module_info(self, _parameter: int) -> Tuple[bool, int, bytes]:
+        payload = struct.pack(
+            "<12s12s7H",
+            b"GT-521F32",
+            b"SIMULATED",
+            *_RAW_IMAGE_DIMENSIONS,
+            *_IMAGE_DIMENSIONS,
+            _MAX_RECORD_COUNT,
+            len(self.database),
+            _TEMPLATE_SIZE,
+        )
+        return True, len(payload), self._data(payload)
+
+    def _cmos_led(self, parameter: int) -> Tuple[bool, int, bytes]:
+        self.led = bool(parameter)
+        return self._ack()
+
+    def _enroll_count(self, _parameter: int) -> Tuple[bool, int, bytes]:
+        return True, len(self.database), b""
+
+    def _check_enrolled(self, parameter: int) -> Tuple[bool, int, bytes]:
+        if not 0 <= parameter < _MAX_RECORD_COUNT:
+            return self._nack("NACK_INVALID_POS")
+        if parameter not in self.database:
+            return self._nack("NACK_IS_NOT_USED")
+        return self._ack()
+
+    def _enroll_start(self, parameter: int) -> Tuple[bool, int, bytes]:
+        if not 0 <= parameter < _MAX_RECORD_COUNT:
+            return self._nack("NACK_INVALID_POS")
+        if parameter in self.database:
+            return self._nack("NACK_IS_ALREADY_USED")
+        if len(self.database) >= _MAX_RECORD_COUNT:
+            return self._nack("NACK_DB_IS_FULL")
+        self._enroll_slot = parameter
+        return self._ack()
+
+    def _enroll_n(self, _parameter: int) -> Tuple[bool, int, bytes]:
+        if self._enroll_slot is None:
+            return self._nack("NACK_TURN_ERR")
+        if self._captured is None:
+            return self._nack("NACK_BAD_FINGER")
+        return self._ack()
+
+    def _enroll_3(self, parameter: int) -> Tuple[bool, int, bytes]:
+        ok, response_parameter, data = self._enroll_n(parameter)
+        if not ok:
+            return ok, response_parameter, data
+
+        template = finger_template(self._captured)
+        for slot, enrolled in self.database.items():
+            if enrolled == template:
+                self._enroll_slot = None
+                return False, slot, b""  # Duplicate finger
+
+        self.database[self._enroll_slot] = template
+        self._enroll_slot = None
+        return self._ack()
+
+    def _is_press_finger(self, _parameter: int) -> Tuple[bool, int, bytes]:
+        return True, 0 if self.finger is not None else 1, b""
+
+    def _delete_id(self, parameter: int) -> Tuple[bool, int, bytes]:
+        if not 0 <= parameter < _MAX_RECORD_COUNT:
+            return self._nack("NACK_INVALID_POS")
+        if self.database.pop(parameter, None) is None:
+            return self._nack("NACK_IS_NOT_USED")
+        return self._ack()
+
+    def _delete_all(self, _parameter: int) -> Tuple[bool, int, bytes]:
+        if not self.database:
+            return self._nack("NACK_DB_IS_EMPTY")
+        self.database.clear()
+        return self._ack()
+
+    def _match(self) -> Optional[int]:
+        if self._captured is None:
+            return None
+        template = finger_template(self._captured)
+        for slot, enrolled in self.database.items():
+            if enrolled == template:
+                return slot
+        return None
+
+    def _verify(self, parameter: int) -> Tuple[bool, int, bytes]:
+        if not 0 <= parameter < _MAX_RECORD_COUNT:
+            return self._nack("NACK_INVALID_POS")
+        if parameter not in self.database:
+            return self._nack("NACK_IS_NOT_USED")
+        if self._captured is None:
+            return self._nack("NACK_FINGER_IS_NOT_PRESSED")
+        if self.database[parameter] != finger_template(self._captured):
+            return self._nack("NACK_VERIFY_FAILED")
+        if self._false_reject():
+            return self._nack("NACK_VERIFY_FAILED")
+        return self._ack()
+
+    def _identify(self, _parameter: int) -> Tuple[bool, int, bytes]:
+        if not self.database:
+            return self._nack("NACK_DB_IS_EMPTY")
+        if self._captured is None:
+            return self._nack("NACK_FINGER_IS_NOT_PRESSED")
+        slot = self._match()
+        if slot is None or self._false_reject():
+            return self._nack("NACK_IDENTIFY_FAILED")
+        return True, slot, b""
+
+    def _capture(self, _parameter: int) -> Tuple[bool, int, bytes]:
+        if self.finger is None:
+            self._captured = None
+            return self._nack("NACK_FINGER_IS_NOT_PRESSED")
+        if self.fake_finger and self.fake_detector:
+            self._captured = None
+            return self._nack("NACK_BAD_FINGER")
+        self._captured = self.finger
+        return self._ack()
+
+    def _make_template(self, _parameter: int) -> Tuple[bool, int, bytes]:
+        if self._captured is None:
+            return self._nack("NACK_FINGER_IS_NOT_PRESSED")
+        return True, 0, self._data(finger_template(self._captured))
+
+    def _verify_template(self, parameter: int) -> Tuple[bool, int, bytes]:
+        if not 0 <= parameter < _MAX_RECORD_COUNT:
+            return self._nack("NACK_INVALID_POS")
+
+        def verify(template: bytes) -> Tuple[bool, int, bytes]:
+            if parameter not in self.database:
+                return self._nack("NACK_IS_NOT_USED")
+            if self.database[parameter] != template:
+                return self._nack("NACK_VERIFY_FAILED")
+            return self._ack()
+
+        self._expect_data(_TEMPLATE_SIZE, verify)
+        return self._ack()
+
+    def _get_template(self, parameter: int) -> Tuple[bool, int, bytes]:
+        if not 0 <= parameter < _MAX_RECORD_COUNT:
+            return self._nack("NACK_INVALID_POS")
+        if parameter not in self.database:
+            return self._nack("NACK_IS_NOT_USED")
+        return True, 0, self._data(self.database[parameter])
+
+    def _set_template(self, parameter: int) -> Tuple[bool, int, bytes]:
+        # Overwrites whatever the slot held
+        slot = parameter & 0xFFFF
+        if not 0 <= slot < _MAX_RECORD_COUNT:
+            return self._nack("NACK_INVALID_POS")
+
+        def store(template: bytes) -> Tuple[bool, int, bytes]:
+            self.database[slot] = template
+            return self._ack()
+
+        self._expect_data(_TEMPLATE_SIZE, store)
+        return self._ack()
+
+    def _get_image(self, _parameter: int) -> Tuple[bool, int, bytes]:
+        if self._captured is None:
+            return self._nack("NACK_FINGER_IS_NOT_PRESSED")
+        return True, 0, self._data(self._frame(_IMAGE_DIMENSIONS))
+
+    def _get_raw_image(self, _parameter: int) -> Tuple[bool, int, bytes]:
+        return True, 0, self._data(self._frame(_RAW_IMAGE_DIMENSIONS))
+
+    def _false_reject(self) -> bool:
+        return self._random.random() < self.false_reject_rates[self.security_level]
+
+    def _set_security_level(self, parameter: int) -> Tuple[bool, int, bytes]:
+        if parameter not in self.false_reject_rates:
+            return self._nack("NACK_INVALID_PARAM")
+        self.security_level = parameter
+        return self._ack()
+
+    def _get_security_level(self, _parameter: int) -> Tuple[bool, int, bytes]:
+        return True, self.security_level, b""
+
+    def _set_fake_detector(self, parameter: int) -> Tuple[bool, int, bytes]:
+        if parameter not in (0, 1):
+            return self._nack("NACK_INVALID_PARAM")
+        self.fake_detector = bool(parameter)
+        return self._ack()
+
+    def _firmware_update(self, parameter: int) -> Tuple[bool, int, bytes]:
+        return self._update(parameter, _FIRMWARE_MAX_SIZE, "firmware_image")
+
+    def _iso_update(self, parameter: int) -> Tuple[bool, int, bytes]:
+        return self._update(parameter, _ISO_AREA_MAX_SIZE, "iso_area")
+
+    def _update(
+        self, size: int, max_size: int, attribute: str
+    ) -> Tuple[bool, int, bytes]:
+        # The image follows in UPDATE_CHUNK_SIZE data packets. Each one is
+        # acknowledged with the byte count so far, the last one with the 32 bit
+        # sum of the image; the image is only kept once it is complete. This is
+        # update.py's unverified framing, not a model of the real firmware.
+        if not 0 < size <= max_size:
+            return self._nack("NACK_INVALID_PARAM")
+        image = bytearray()
+
+        def receive(chunk: bytes) -> Tuple[bool, int, bytes]:
+            image.extend(chunk)
+            if len(image) < size:
+                self._expect_data(
+                    min(packets.UPDATE_CHUNK_SIZE, size - len(image)), receive
+                )
+                return True, len(image), b""
+            setattr(self, attribute, bytes(image))
+            return True, sum(image) % 2 ** 32, b""
+
+        self._expect_data(min(packets.UPDATE_CHUNK_SIZE, size), receive)
+        return self._ack()
+
+
+class SimulatedInterface:
+    _DEFAULT_BAUD_RATE = 9600
+    _BITS_PER_BYTE = 10  # 8N1 framing
+
+    _port: str
+    _devices: Dict[int, SimulatedDevice]  # by device id
+    _output: bytearray
+
+    def __init__(
+        self, port: str, baudrate: int = _DEFAULT_BAUD_RATE, realtime: bool = False
+    ):
+        self._port = port
+        parsed = urlparse(port)
+        if parsed.scheme != "sim":
+            raise SimulatedInterfaceException("Not a simulated port: %s" % (port,))
+
+        options = {key: values[-1] for key, values in parse_qs(parsed.query).items()}
+        name = parsed.netloc + parsed.path
+        self._devices = {
+            device_id: SimulatedDevice.get(name, device_id)
+            for device_id in (
+                int(device_id) for device_id in options.get("ids", "1").split(",")
+            )
+        }
+        for device in self._devices.values():
+            for slot in range(int(options.get("users", 0))):
+                device.database.setdefault(slot, finger_template(slot))
+            if "finger" in options:
+                device.press_finger(int(options["finger"]))
+            if "noise" in options:
+                device.line_noise = float(options["noise"])
+
+        self._baudrate = baudrate
+        self._realtime = realtime or options.get("realtime") == "1"
+        self._output = bytearray()
+        self._closed = False
+        self._noise_random = random.Random(port)
+        self._until_noise: Optional[int] = None  # bytes before the next flip
+
+    @property
+    def device(self) -> SimulatedDevice:
+        # The first module on the port
+        return next(iter(self._devices.values()))
+
+    @property
+    def devices(self) -> Dict[int, SimulatedDevice]:
+        return dict(self._devices)
+
+    def _wire_delay(self, size: int) -> None:
+        if self._realtime:
+            time.sleep(size * self._BITS_PER_BYTE / self._baudrate)
+
+    def write(self, data):
+        if self._closed:
+            raise SimulatedInterfaceException("Port is closed.")
+        self._wire_delay(len(data))
+        # On a bus the host writes whole packets, all to one module, and every
+        # packet carries its address at the same offset. A lone module
+        # filters by address itself.
+        if len(self._devices) == 1:
+            device: Optional[SimulatedDevice] = self.device
+        elif len(data) >= _HEADER.size:
+            device = self._devices.get(_ADDRESS.unpack_from(data, 2)[0])
+        else:
+            device = None
+        if device is not None:
+            response = bytearray(device.handle(bytes(data)))
+            self._add_noise(response, device.line_noise)
+            self._output += response
+        return len(data)
+
+    def _add_noise(self, data: bytearray, line_noise: float) -> None:
+        # Faster rates leave less margin, so errors grow with the baud rate
+        chance = min(0.5, line_noise * self._baudrate / self._DEFAULT_BAUD_RATE)
+        if not chance:
+            return
+        # Skip ahead to the next damaged byte instead of drawing for each
+        gap = lambda: int(
+            math.log(1.0 - self._noise_random.random()) / math.log(1.0 - chance)
+        )
+        position = self._until_noise if self._until_noise is not None else gap()
+        while position < len(data):
+            data[position] ^= 1 << self._noise_random.randrange(8)
+            position += 1 + gap()
+        self._until_noise = position - len(data)
+
+    def read(self, to_read, timeout=None):  # pylint: disable=unused-argument
+        # Responses are produced synchronously, so there is nothing to wait for
+        if self._closed:
+            raise SimulatedInterfaceException("Port is closed.")
+        data = bytes(self._output[:to_read])
+        del self._output[:to_read]
+        self._wire_delay(len(data))
+        return data
+
+    def readinto(self, buffer, timeout=None):  # pylint: disable=unused-argument
+        if self._closed:
+            raise SimulatedInterfaceException("Port is closed.")
+        view = memoryview(buffer).cast("B")
+        size = min(len(view), len(self._output))
+        view[:size] = self._output[:size]
+        del self._output[:size]
+        self._wire_delay(size)
+        return size
+
+    def reset_input_buffer(self):
+        self._output.clear()
+
+    def close(self):
+        self._closed = True
@@ -0,0 +1,178 @@
+# pylint: disable=bad-continuation # Black and pylint disagree on this
+# pylint: disable=missing-module-docstring
+# pylint: disable=missing-class-docstring
+# pylint: disable=missing-function-docstring
+import logging
+import socket
+import struct
+from urllib.parse import urlparse
+
+from .exception import InterfaceException
+
+# Remotes the interface read/write calls of a reader exposed by
+# gt521f32.server. Every request is a (opcode, length) header. Writes carry
+# their payload and, like input resets, are not acknowledged. Reads carry a
+# timeout in milliseconds (0 for the remote default) and are answered with a
+# (status, length) header and the bytes the remote interface returned. A
+# write or reset that fails on the remote drops the connection instead, and
+# the client reconnects when it notices.
+
+logger = logging.getLogger(__name__)  # pylint: disable=invalid-name
+
+HEADER = struct.Struct("<BL")
+READ_TIMEOUT = struct.Struct("<L")
+
+OP_WRITE = ord("W")
+OP_READ = ord("R")
+OP_CLOSE = ord("C")
+OP_RESET_INPUT = ord("I")
+
+STATUS_OK = 0
+STATUS_ERROR = 1
+
+
+class TCPInterfaceException(InterfaceException):
+    pass
+
+
+def parse_address(port: str):
+    parsed = urlparse(port)
+    if parsed.scheme != "tcp" or not parsed.hostname or parsed.port is None:
+        raise TCPInterfaceException("Expected tcp://host:port, got %s" % (port,))
+    return parsed.hostname, parsed.port
+
+
+def recv_exactly_into(sock: socket.socket, view: memoryview) -> None:
+    received = 0
+    while received < len(view):
+        size = sock.recv_into(view[received:], len(view) - received)
+        if size == 0:
+            raise ConnectionError("Connection closed by peer.")
+        received += size
+
+
+def recv_exactly(sock: socket.socket, count: int) -> bytearray:
+    # Fill a single preallocated buffer instead of concatenating fragments
+    buf = bytearray(count)
+    recv_exactly_into(sock, memoryview(buf))
+    return buf
+
+
+class TCPInterface:
+    _DEFAULT_TIMEOUT = 10  # seconds, covers the remote read timeout too
+    _NETWORK_MARGIN = 1  # seconds on top of an explicit read timeout
+
+    _port: str
+    _socket: socket.socket
+
+    def __init__(self, port: str, timeout: float = _DEFAULT_TIMEOUT):
+        self._port = port
+        self._address = parse_address(port)
+        self._timeout = timeout
+        self._connect()
+
+    def _connect(self):
+        try:
+            self._socket = socket.create_connection(
+                self._address, timeout=self._timeout
+            )
+        except OSError as e:  # pylint: disable=invalid-name
+            logger.error("Could not connect to %s: %s", self._port, e)
+            raise TCPInterfaceException(e)
+
+        # Commands are tiny and latency bound
+        self._socket.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+        self._socket.setsockopt(socket.SOL_SOCKET, socket.SO_KEEPALIVE, 1)
+
+    def _dropped(self, e: OSError) -> TCPInterfaceException:
+        # The remote closes the connection after a write or reset failed
+        # there, so whatever was in flight is lost; start over and report it
+        logger.error("Lost the connection to %s: %s, reconnecting", self._port, e)
+        self._socket.close()
+        self._connect()
+        return TCPInterfaceException(e)
+
+    def write(self, data):
+        try:
+            self._socket.sendall(HEADER.pack(OP_WRITE, len(data)) + bytes(data))
+        except ConnectionError as e:  # pylint: disable=invalid-name
+            raise self._dropped(e)
+        except OSError as e:  # pylint: disable=invalid-name
+            raise TCPInterfaceException(e)
+        return len(data)
+
+    def _request_read(self, to_read, timeout):
+        # Returns the status and length of the response, its payload is left
+        # on the socket for the caller to receive
+        remote_timeout = 0 if timeout is None else max(1, int(timeout * 1000))
+        self._socket.sendall(
+            HEADER.pack(OP_READ, to_read) + READ_TIMEOUT.pack(remote_timeout)
+        )
+        return HEADER.unpack(recv_exactly(self._socket, HEADER.size))
+
+    def _timed_out(self):
+        # The response may still arrive, so the stream can no longer be
+        # trusted; start over on a fresh connection
+        logger.error("Timed out reading from %s, reconnecting", self._port)
+        self._socket.close()
+        self._connect()
+
+    def read(self, to_read, timeout=None):
+        if timeout is not None:
+            self._socket.settimeout(timeout + self._NETWORK_MARGIN)
+        try:
+            status, length = self._request_read(to_read, timeout)
+            payload = recv_exactly(self._socket, length)
+        except socket.timeout:
+            self._timed_out()
+            return b""
+        except ConnectionError as e:  # pylint: disable=invalid-name
+            raise self._dropped(e)
+        except OSError as e:  # pylint: disable=invalid-name
+            raise TCPInterfaceException(e)
+        finally:
+            if timeout is not None:
+                self._socket.settimeout(self._timeout)
+
+        if status != STATUS_OK:
+            raise TCPInterfaceException(payload.decode("utf-8", "replace"))
+        return bytes(payload)
+
+    def readinto(self, buffer, timeout=None):
+        # Receives the payload straight into a caller owned buffer, e.g. a
+        # frame ring slot, and returns the number of bytes read
+        view = memoryview(buffer).cast("B")
+        if timeout is not None:
+            self._socket.settimeout(timeout + self._NETWORK_MARGIN)
+        try:
+            status, length = self._request_read(len(view), timeout)
+            if status != STATUS_OK:
+                message = recv_exactly(self._socket, length)
+                raise TCPInterfaceException(message.decode("utf-8", "replace"))
+            recv_exactly_into(self._socket, view[:length])
+        except socket.timeout:
+            self._timed_out()
+            return 0
+        except ConnectionError as e:  # pylint: disable=invalid-name
+            raise self._dropped(e)
+        except OSError as e:  # pylint: disable=invalid-name
+            raise TCPInterfaceException(e)
+        finally:
+            if timeout is not None:
+                self._socket.settimeout(self._timeout)
+        return length
+
+    def reset_input_buffer(self):
+        try:
+            self._socket.sendall(HEADER.pack(OP_RESET_INPUT, 0))
+        except ConnectionError as e:  # pylint: disable=invalid-name
+            raise self._dropped(e)
+        except OSError as e:  # pylint: disable=invalid-name
+            raise TCPInterfaceException(e)
+
+    def close(self):
+        try:
+            self._socket.sendall(HEADER.pack(OP_CLOSE, 0))
+        except OSError:
+            pass
+        self._socket.close()
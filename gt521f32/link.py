@@ -0,0 +1,201 @@
+# pylint: disable=bad-continuation # Black and pylint disagree on this
+# pylint: disable=missing-module-docstring
+# pylint: disable=missing-class-docstring
+# pylint: disable=missing-function-docstring
+import collections
+import logging
+import threading
+import time
+from typing import Deque, Dict, NamedTuple, Optional, Sequence, Tuple
+
+# Health of the serial line under a session. Every exchange is recorded as
+# a success or as the kind of damage seen, over a sliding window. When too
+# many exchanges fail the reader steps down to the next slower baud rate;
+# once a rate has been clean for a while it probes the next faster one, up
+# to the rate the session started at. A probe that fails doubles the time
+# before the next one, so a marginal line does not flap.
+#
+#     monitor = reader.monitor_link()
+#     ...
+#     print(monitor.metrics())
+#
+# This module only keeps score and decides. The reader applies decisions
+# between commands, never in the middle of an exchange.
+
+logger = logging.getLogger(__name__)  # pylint: disable=invalid-name
+
+SHORT_READ = "short_read"  # fewer bytes than the packet needs before the timeout
+BAD_START = "bad_start"  # the bytes are not where a packet should start
+BAD_CHECKSUM = "bad_checksum"
+TIMEOUT = "timeout"  # the deadline expired while reading
+WRONG_DEVICE = "wrong_device"  # another module's packet, see bus.BusArbiter
+ERROR_KINDS = (SHORT_READ, BAD_START, BAD_CHECKSUM, TIMEOUT, WRONG_DEVICE)
+
+BAUD_RATES = (9600, 19200, 38400, 57600, 115200)  # what CHANGE_BAUDRATE takes
+
+STABLE = "stable"
+DEGRADED = "degraded"  # below the starting rate
+PROBING = "probing"  # trying a faster rate, not yet proven
+
+
+def classify(raw: bytes, size: int, start: Tuple[int, int]) -> str:
+    # What is wrong with a packet that failed to parse
+    if len(raw) < size:
+        return SHORT_READ
+    if (raw[0], raw[1]) != start:
+        return BAD_START
+    return BAD_CHECKSUM
+
+
+class LinkPolicy(NamedTuple):
+    window: float = 30.0  # seconds of history the rates are computed over
+    min_samples: int = 20  # exchanges in the window before acting on it
+    downgrade_above: float = 0.05  # error rate that steps the baud rate down
+    upgrade_below: float = 0.002  # error rate a rate must stay under
+    clean_period: float = 60.0  # seconds under upgrade_below before probing up
+    max_backoff: float = 3600.0  # longest wait between failed probes
+    max_baudrate: Optional[int] = None  # None for the rate the session started at
+
+
+class LinkMetrics(NamedTuple):
+    baudrate: int
+    state: str
+    samples: int  # exchanges in the window
+    error_rate: float
+    errors: Dict[str, int]  # in the window, by kind
+    downgrades: int
+    upgrades: int
+    failed_probes: int
+    failed_switches: int  # CHANGE_BAUDRATE attempts that did not go through
+
+
+class LinkMonitor:
+    _history: Deque[Tuple[float, Optional[str]]]  # (time, error kind or None)
+
+    def __init__(self, baudrate: int, policy: LinkPolicy = LinkPolicy()):
+        self.policy = policy
+        self._baudrate = baudrate
+        self._ceiling = policy.max_baudrate or baudrate
+        self._lock = threading.Lock()
+        self._history = collections.deque()
+        self._errors: Dict[str, int] = collections.Counter()
+        self._since = time.monotonic()  # when the current rate was taken
+        self._probe_from: Optional[int] = None  # the rate a probe started from
+        self._backoff = policy.clean_period
+        self._downgrades = 0
+        self._upgrades = 0
+        self._failed_probes = 0
+        self._failed_switches = 0
+
+    @property
+    def baudrate(self) -> int:
+        return self._baudrate
+
+    def _expire(self, now: float) -> None:
+        horizon = now - self.policy.window
+        while self._history and self._history[0][0] < horizon:
+            _, kind = self._history.popleft()
+            if kind is not None:
+                self._errors[kind] -= 1
+
+    def record_success(self) -> None:
+        with self._lock:
+            self._history.append((time.monotonic(), None))
+
+    def record_error(self, kind: str) -> None:
+        with self._lock:
+            self._history.append((time.monotonic(), kind))
+            self._errors[kind] += 1
+
+    def _error_rate(self) -> float:
+        samples = len(self._history)
+        return sum(self._errors.values()) / samples if samples else 0.0
+
+    @staticmethod
+    def _step(baudrate: int, rates: Sequence[int]) -> Optional[int]:
+        # The first of rates after baudrate, in the direction rates run
+        for rate in rates:
+            if (rates[0] < rates[-1] and rate > baudrate) or (
+                rates[0] > rates[-1] and rate < baudrate
+            ):
+                return rate
+        return None
+
+    def decide(self) -> Optional[int]:
+        # The baud rate to switch to now, if any
+        now = time.monotonic()
+        with self._lock:
+            self._expire(now)
+            error_rate = self._error_rate()
+            enough = len(self._history) >= self.policy.min_samples
+
+            if enough and error_rate > self.policy.downgrade_above:
+                return self._step(self._baudrate, BAUD_RATES[::-1])
+
+            if (
+                self._probe_from is not None
+                and now - self._since >= self.policy.clean_period
+            ):
+                logger.info("Link is clean at %d baud.", self._baudrate)
+                self._probe_from = None
+                self._backoff = self.policy.clean_period
+
+            if (
+                self._baudrate < self._ceiling
+                and self._probe_from is None
+                and now - self._since >= self._backoff
+                and error_rate < self.policy.upgrade_below
+            ):
+                upgrade = self._step(self._baudrate, BAUD_RATES)
+                if upgrade is not None and upgrade <= self._ceiling:
+                    return upgrade
+        return None
+
+    def switched(self, baudrate: int, ok: bool) -> None:
+        # Called by the reader after acting on decide(), with the rate the
+        # line ended up at
+        with self._lock:
+            if not ok:
+                self._failed_switches += 1
+            if baudrate == self._baudrate:
+                # Judge the rate afresh before trying again
+                self._history.clear()
+                self._errors.clear()
+                return
+
+            if baudrate > self._baudrate:
+                self._upgrades += 1
+                self._probe_from = self._baudrate
+            else:
+                self._downgrades += 1
+                if self._probe_from is not None and baudrate <= self._probe_from:
+                    # The faster rate did not hold, wait longer next time
+                    self._failed_probes += 1
+                    self._backoff = min(self._backoff * 2, self.policy.max_backoff)
+                self._probe_from = None
+            logger.warning("Link now at %d baud, was %d.", baudrate, self._baudrate)
+            self._baudrate = baudrate
+            self._since = time.monotonic()
+            self._history.clear()
+            self._errors.clear()
+
+    def metrics(self) -> LinkMetrics:
+        with self._lock:
+            self._expire(time.monotonic())
+            if self._probe_from is not None:
+                state = PROBING
+            elif self._baudrate < self._ceiling:
+                state = DEGRADED
+            else:
+                state = STABLE
+            return LinkMetrics(
+                self._baudrate,
+                state,
+                len(self._history),
+                self._error_rate(),
+                {kind: count for kind, count in self._errors.items() if count},
+                self._downgrades,
+                self._upgrades,
+                self._failed_probes,
+                self._failed_switches,
+            )
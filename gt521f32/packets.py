@@ -8,7 +8,7 @@ import io
 import logging
 import struct
 
-from typing import Optional
+from typing import Optional, Tuple
 from collections import OrderedDict
 
 logger = logging.getLogger(__name__)  # pylint: disable=invalid-name
@@ -21,7 +21,10 @@ CommandStartCode2 = ("B", (0xAA,))
 DataStartCode1 = ("B", (0x5A,))
 DataStartCode2 = ("B", (0xA5,))
 
-DeviceId = ("<H", (1,))
+# Modules answer only to their own address, so several can share a bus
+DEFAULT_DEVICE_ID = 1
+DeviceId = ("<H", (DEFAULT_DEVICE_ID,))
+Address = lambda x: ("<H", (x,))
 
 Parameter = lambda x: ("<L", (x,))
 Command = lambda x: ("<H", (x,))
@@ -92,13 +95,21 @@ response_error = {
     "NACK_FINGER_IS_NOT_PRESSED": 0x1012,
 }
 
+# Built once, for logging and decoding errors
+command_names = reverse(command_codes)
+response_error_names = reverse(response_error)
+
 
 class Packet:
-    def __init__(self):
+    def __init__(self, device_id=DEFAULT_DEVICE_ID):
         self._fields = OrderedDict()
         self._fields["CommandStartCode1"] = CommandStartCode1
         self._fields["CommandStartCode2"] = CommandStartCode2
-        self._fields["DeviceId"] = DeviceId
+        self._fields["DeviceId"] = Address(device_id)
+
+    @property
+    def device_id(self) -> int:
+        return self._fields["DeviceId"][1][0]
 
     def _checksum(self):
         return sum(self._field_bytes()) % 2 ** 16
@@ -131,7 +142,7 @@ class Packet:
         for key, (field, _) in instance._fields.items():
             field_size = struct.calcsize(field)
             field_content = byte_stream.read(field_size)
-            if len(field_content) == 0:
+            if len(field_content) < field_size:
                 logger.error("Could not parse %s", cls.__name__)
                 return None
 
@@ -141,7 +152,7 @@ class Packet:
         # verify checksum
         checksum_field, _ = Checksum(0)
         checksum_bytes = byte_stream.read(struct.calcsize(checksum_field))
-        if len(checksum_bytes) == 0:
+        if len(checksum_bytes) < struct.calcsize(checksum_field):
             logger.error("Checksum bytes are missing.")
             return None
 
@@ -157,8 +168,8 @@ class Packet:
 
 
 class CommandPacket(Packet):
-    def __init__(self, parameter=0, command=0):
-        super().__init__()
+    def __init__(self, parameter=0, command=0, device_id=DEFAULT_DEVICE_ID):
+        super().__init__(device_id)
         self._fields["Parameter"] = Parameter(parameter)
         self._fields["Command"] = Command(command)
 
@@ -170,10 +181,15 @@ class CommandPacket(Packet):
     def command(self) -> int:
         return self._fields["Command"][1][0]
 
+    @classmethod
+    def from_bytes(cls, input_bytes):
+        # Terrible hack for making lint happy
+        return Packet.from_bytes_static(cls, input_bytes)
+
 
 class ResponsePacket(Packet):
-    def __init__(self, parameter=0, response=0):
-        super().__init__()
+    def __init__(self, parameter=0, response=0, device_id=DEFAULT_DEVICE_ID):
+        super().__init__(device_id)
         self._fields["Parameter"] = Parameter(parameter)
         self._fields["Response"] = Response(response)
 
@@ -195,6 +211,36 @@ class ResponsePacket(Packet):
         return Packet.from_bytes_static(cls, input_bytes)
 
 
+# Command and response packets as plain structs, for streaming many commands
+# without building a packet object for each
+_COMMAND_FIELDS = struct.Struct("<BBHLH")
+_CHECKSUM = struct.Struct("<H")
+PACKET_SIZE = _COMMAND_FIELDS.size + _CHECKSUM.size
+
+
+def encode_command(
+    command: int, parameter: int, device_id: int = DEFAULT_DEVICE_ID
+) -> bytes:
+    fields = _COMMAND_FIELDS.pack(0x55, 0xAA, device_id, parameter, command)
+    return fields + _CHECKSUM.pack(sum(fields) % 2 ** 16)
+
+
+def decode_response(
+    raw: bytes, device_id: Optional[int] = None
+) -> Optional[Tuple[int, int]]:
+    # (response code, parameter), or None unless raw is a whole, valid packet
+    # (from device_id, when given)
+    if len(raw) != PACKET_SIZE or raw[0] != 0x55 or raw[1] != 0xAA:
+        return None
+    _, _, sender, parameter, response = _COMMAND_FIELDS.unpack_from(raw)
+    if device_id is not None and sender != device_id:
+        return None
+    (checksum,) = _CHECKSUM.unpack_from(raw, _COMMAND_FIELDS.size)
+    if checksum != sum(raw[: _COMMAND_FIELDS.size]) % 2 ** 16:
+        return None
+    return response, parameter
+
+
 class DataPacket(Packet):
     def __init__(self, data: Optional[bytes] = b""):
         super().__init__()
@@ -326,6 +372,7 @@ class OpenDataPacket(Packet):
         return Packet.from_bytes_static(cls, input_bytes)
 
 
+IMAGE_SIZE = 52116  # 202 x 258
 Bitmap = lambda x: ("52116B", x)
 
 
@@ -344,6 +391,7 @@ class GetImageDataPacket(Packet):
         return Packet.from_bytes_static(cls, input_bytes)
 
 
+RAW_IMAGE_SIZE = 19200  # 160 x 120
 RawBitmap = lambda x: ("19200B", x)
 
 
@@ -360,3 +408,51 @@ class GetRawImageDataPacket(Packet):
     def from_bytes(cls, input_bytes):
         # Terrible hack for making lint happy
         return Packet.from_bytes_static(cls, input_bytes)
+
+
+Template = lambda x: ("498B", x)
+
+
+class TemplateDataPacket(Packet):
+    # Sent in both directions, so it carries the proper data start codes
+    def __init__(
+        self,
+        template: Optional[bytes] = b"\x00" * 498,
+        device_id: int = DEFAULT_DEVICE_ID,
+    ):
+        super().__init__()
+        self._fields = OrderedDict()
+        self._fields["DataStartCode1"] = DataStartCode1
+        self._fields["DataStartCode2"] = DataStartCode2
+        self._fields["DeviceId"] = Address(device_id)
+        self._fields["Template"] = Template(template)
+
+    @property
+    def template(self) -> bytes:
+        return bytes(self._fields["Template"][1])
+
+    @classmethod
+    def from_bytes(cls, input_bytes):
+        # Terrible hack for making lint happy
+        return Packet.from_bytes_static(cls, input_bytes)
+
+
+# FW_UPDATE and ISO_UPDATE images follow their command in data packets of
+# this size, the last one holding the remainder
+UPDATE_CHUNK_SIZE = 512
+
+
+class ChunkDataPacket(Packet):
+    def __init__(
+        self, chunk: Optional[bytes] = b"", device_id: int = DEFAULT_DEVICE_ID
+    ):
+        super().__init__()
+        self._fields = OrderedDict()
+        self._fields["DataStartCode1"] = DataStartCode1
+        self._fields["DataStartCode2"] = DataStartCode2
+        self._fields["DeviceId"] = Address(device_id)
+        self._fields["Chunk"] = ("%dB" % (len(chunk),), tuple(chunk))
+
+    @property
+    def chunk(self) -> bytes:
+        return bytes(self._fields["Chunk"][1])
@@ -0,0 +1,121 @@
+# pylint: disable=bad-continuation # Black and pylint disagree on this
+# pylint: disable=missing-module-docstring
+# pylint: disable=missing-class-docstring
+# pylint: disable=missing-function-docstring
+import concurrent.futures
+import contextlib
+import logging
+import threading
+from typing import Callable, Dict, Iterable, Iterator, List, Optional, TypeVar, Union
+
+from .gt521f32 import GT521F32, GT521F32Exception
+from .interfaces import InterfaceException
+
+# A set of open readers, keyed by port, on which the same operation can be
+# run concurrently. Each reader is used by one operation at a time.
+
+logger = logging.getLogger(__name__)  # pylint: disable=invalid-name
+
+T = TypeVar("T")  # pylint: disable=invalid-name
+
+_DEVICE_ERRORS = (GT521F32Exception, InterfaceException)
+
+
+class DevicePool:
+    _DEFAULT_PARALLELISM = 4
+
+    _readers: Dict[str, GT521F32]
+    _locks: Dict[str, threading.Lock]
+
+    def __init__(
+        self,
+        ports: Iterable[str] = (),
+        parallelism: int = _DEFAULT_PARALLELISM,
+        baudrate: Optional[int] = None,
+    ):
+        assert parallelism > 0
+        self._parallelism = parallelism
+        self._baudrate = baudrate
+        self._readers = {}
+        self._locks = {}
+        try:
+            for port in ports:
+                self.add(port)
+        except _DEVICE_ERRORS:
+            self.close()
+            raise
+
+    def __enter__(self) -> "DevicePool":
+        return self
+
+    def __exit__(self, *exc_info) -> None:
+        self.close()
+
+    def __getitem__(self, port: str) -> GT521F32:
+        return self._readers[port]
+
+    def __len__(self) -> int:
+        return len(self._readers)
+
+    @property
+    def ports(self) -> List[str]:
+        return list(self._readers)
+
+    def add(self, port: str) -> GT521F32:
+        if port not in self._readers:
+            reader = GT521F32(port, baudrate=self._baudrate)
+            try:
+                reader.open()
+            except _DEVICE_ERRORS:
+                reader.close()
+                raise
+            self._readers[port] = reader
+            self._locks[port] = threading.Lock()
+        return self._readers[port]
+
+    def remove(self, port: str) -> None:
+        reader = self._readers.pop(port, None)
+        self._locks.pop(port, None)
+        if reader is not None:
+            reader.close()
+
+    def close(self) -> None:
+        for port in list(self._readers):
+            self.remove(port)
+
+    @contextlib.contextmanager
+    def using(self, port: str) -> Iterator[GT521F32]:
+        # The reader on port, held exclusively for the block
+        with self._locks[port]:
+            yield self._readers[port]
+
+    def _run_one(self, port: str, operation: Callable[[GT521F32], T]) -> T:
+        with self.using(port) as reader:
+            return operation(reader)
+
+    def run(
+        self,
+        operation: Callable[[GT521F32], T],
+        ports: Optional[Iterable[str]] = None,
+        parallelism: Optional[int] = None,
+    ) -> Dict[str, Union[T, Exception]]:
+        # Runs operation on each reader, at most `parallelism` at a time, and
+        # returns its result per port, or the device error it raised
+        ports = self.ports if ports is None else list(ports)
+        results: Dict[str, Union[T, Exception]] = {}
+        if not ports:
+            return results
+
+        workers = min(parallelism or self._parallelism, len(ports))
+        with concurrent.futures.ThreadPoolExecutor(max_workers=workers) as executor:
+            futures = {
+                executor.submit(self._run_one, port, operation): port for port in ports
+            }
+            for future in concurrent.futures.as_completed(futures):
+                port = futures[future]
+                try:
+                    results[port] = future.result()
+                except _DEVICE_ERRORS as e:  # pylint: disable=invalid-name
+                    logger.error("%s failed: %s", port, e)
+                    results[port] = e
+        return results
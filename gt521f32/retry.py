@@ -0,0 +1,158 @@
+# pylint: disable=bad-continuation # Black and pylint disagree on this
+# pylint: disable=missing-module-docstring
+# pylint: disable=missing-class-docstring
+# pylint: disable=missing-function-docstring
+import collections
+import random
+import threading
+from typing import Dict, FrozenSet, Iterable, Optional, Union
+
+from . import packets
+
+# Marks an attempt that got no (valid) response at all, as opposed to a NACK
+TIMEOUT = -1
+
+# Matches every documented NACK code, but not e.g. the duplicate id ENROLL3
+# reports in place of an error code
+ANY_ERROR = frozenset(packets.response_error.values())
+
+# Commands that can be safely sent again when their response was lost.
+# Commands answered with a data packet are left out, since a retry could take
+# what is left of the lost exchange's data packet for its own response; OPEN
+# is only sent again without its extra info.
+IDEMPOTENT_COMMANDS = frozenset(
+    {
+        "OPEN",
+        "USB_INTERNAL_CHECK",
+        "CMOS_LED",
+        "ENROLL_COUNT",
+        "CHECK_ENROLLED",
+        "IS_PRESS_FINGER",
+        "VERIFY",
+        "IDENTIFY",
+        "CAPTURE",
+        "GET_SECURITY_LEVEL",
+    }
+)
+
+
+class RetryPolicy:
+    max_attempts: int
+    backoff: float
+    multiplier: float
+    max_backoff: float
+    jitter: float
+    deadline: Optional[float]
+    retryable_errors: FrozenSet[int]
+
+    def __init__(  # pylint: disable=too-many-arguments
+        self,
+        max_attempts: int = 1,
+        backoff: float = 0.0,
+        multiplier: float = 2.0,
+        max_backoff: float = 1.0,
+        jitter: float = 0.0,
+        retryable_errors: Iterable[Union[str, int]] = (),
+        deadline: Optional[float] = None,
+        seed: Optional[int] = None,
+    ):
+        assert max_attempts >= 1
+        assert 0.0 <= jitter <= 1.0
+        self.max_attempts = max_attempts
+        self.backoff = backoff
+        self.multiplier = multiplier
+        self.max_backoff = max_backoff
+        self.jitter = jitter
+        self.deadline = deadline
+        # Errors may be given by name ("NACK_BAD_FINGER"), code or TIMEOUT
+        self.retryable_errors = frozenset(
+            packets.response_error[error] if isinstance(error, str) else error
+            for error in retryable_errors
+        )
+        self._random = random.Random(seed)
+
+    def is_retryable(self, error: int) -> bool:
+        return error in self.retryable_errors
+
+    def should_retry(self, attempt: int, error: int, elapsed: float) -> bool:
+        if attempt >= self.max_attempts or not self.is_retryable(error):
+            return False
+        if self.deadline is not None and elapsed + self.delay(attempt) > self.deadline:
+            return False
+        return True
+
+    def delay(self, attempt: int) -> float:
+        # Exponential backoff, attempt is 1-based; jitter spreads the delay
+        # uniformly over [delay * (1 - jitter), delay]
+        delay = min(self.max_backoff, self.backoff * self.multiplier ** (attempt - 1))
+        if self.jitter:
+            delay *= 1.0 - self.jitter * self._random.random()
+        return delay
+
+
+NO_RETRY = RetryPolicy()
+
+
+def default_policies() -> Dict[str, RetryPolicy]:
+    return {
+        # A finger that was lifted or smudged is usually fine a moment later
+        "CAPTURE": RetryPolicy(
+            max_attempts=3,
+            backoff=0.05,
+            retryable_errors=("NACK_FINGER_IS_NOT_PRESSED", "NACK_BAD_FINGER"),
+        ),
+        # Same as the former @retry decorator on enroll_n
+        "ENROLL": RetryPolicy(max_attempts=3, retryable_errors=ANY_ERROR),
+        "IDENTIFY": NO_RETRY,
+        "VERIFY": NO_RETRY,
+        # Only applied to IDEMPOTENT_COMMANDS
+        "TRANSPORT": RetryPolicy(
+            max_attempts=2, backoff=0.05, retryable_errors=(TIMEOUT,)
+        ),
+    }
+
+
+class RetryMetrics:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.attempts: Dict[str, int] = collections.Counter()
+        self.retries: Dict[str, int] = collections.Counter()
+        self.failures: Dict[str, int] = collections.Counter()
+        self.retried_errors: Dict[str, int] = collections.Counter()
+
+    def record_attempt(self, operation: str) -> None:
+        with self._lock:
+            self.attempts[operation] += 1
+
+    def record_retry(self, operation: str, error: int) -> None:
+        name = (
+            "TIMEOUT"
+            if error == TIMEOUT
+            else packets.response_error_names.get(error, hex(error))
+        )
+        with self._lock:
+            self.retries[operation] += 1
+            self.retried_errors[name] += 1
+
+    def record_failure(self, operation: str) -> None:
+        with self._lock:
+            self.failures[operation] += 1
+
+    def snapshot(self) -> Dict[str, Dict[str, int]]:
+        with self._lock:
+            return {
+                "attempts": dict(self.attempts),
+                "retries": dict(self.retries),
+                "failures": dict(self.failures),
+                "retried_errors": dict(self.retried_errors),
+            }
+
+    def reset(self) -> None:
+        with self._lock:
+            for counter in (
+                self.attempts,
+                self.retries,
+                self.failures,
+                self.retried_errors,
+            ):
+                counter.clear()
@@ -0,0 +1,354 @@
+# pylint: disable=bad-continuation # Black and pylint disagree on this
+# pylint: disable=missing-module-docstring
+# pylint: disable=missing-class-docstring
+# pylint: disable=missing-function-docstring
+import collections
+import concurrent.futures
+import inspect
+import itertools
+import logging
+import threading
+import time
+from typing import (
+    Any,
+    Callable,
+    ClassVar,
+    Deque,
+    Dict,
+    Iterator,
+    List,
+    Mapping,
+    NamedTuple,
+    Optional,
+)
+
+from .gt521f32 import GT521F32, GT521F32TimeoutException
+
+# Owns one reader and runs the work submitted to it by priority. A job is
+# a callable taking the reader; when it returns a generator, every step up
+# to a yield is one operation, and between steps the scheduler may run more
+# urgent work. Nothing preempts a step, so a background job should yield
+# after each command or transfer, e.g. between images while archiving or
+# between batches of a template sync (sync.sync_steps).
+#
+# Every class but INTERACTIVE may have a budget, the share of device time
+# it may use. Budgets apply even when the reader is idle, leaving headroom
+# for identification to start at once. Jobs that wait longer than the
+# aging interval move up a class per interval, so a steady stream of
+# interactive work cannot starve maintenance forever.
+
+logger = logging.getLogger(__name__)  # pylint: disable=invalid-name
+
+INTERACTIVE = 0  # identify, verify, anything a person is waiting for
+NORMAL = 1
+BACKGROUND = 2  # template sync, image archiving, health checks
+PRIORITIES = (INTERACTIVE, NORMAL, BACKGROUND)
+PRIORITY_NAMES = {
+    INTERACTIVE: "interactive",
+    NORMAL: "normal",
+    BACKGROUND: "background",
+}
+
+Job = Callable[[GT521F32], Any]
+
+
+class Budget(NamedTuple):
+    share: float  # device seconds per second, e.g. 0.25
+    burst: float = 1.0  # device seconds that may be used back to back
+
+
+class ClassStats(NamedTuple):
+    submitted: int
+    completed: int
+    failed: int
+    steps: int
+    device_time: float  # seconds spent running steps
+    max_wait: float  # longest a step waited to run, seconds
+    queued: int
+
+
+class _TokenBucket:
+    def __init__(self, budget: Budget):
+        self._budget = budget
+        self._tokens = budget.burst
+        self._updated = time.monotonic()
+
+    def _refill(self, now: float) -> None:
+        self._tokens = min(
+            self._budget.burst,
+            self._tokens + (now - self._updated) * self._budget.share,
+        )
+        self._updated = now
+
+    def available_in(self, now: float) -> float:
+        # Seconds until a step may run; steps are charged after they run, so
+        # any positive balance lets the next one start
+        self._refill(now)
+        if self._tokens > 0:
+            return 0.0
+        return (
+            -self._tokens / self._budget.share if self._budget.share else float("inf")
+        )
+
+    def charge(self, seconds: float) -> None:
+        self._tokens -= seconds
+
+
+class _Task:
+    __slots__ = ("job", "name", "priority", "future", "steps", "queued_at", "sequence")
+
+    def __init__(  # pylint: disable=too-many-arguments
+        self,
+        job: Job,
+        name: str,
+        priority: int,
+        future: "concurrent.futures.Future[Any]",
+        sequence: int,
+    ):
+        self.job = job
+        self.name = name
+        self.priority = priority
+        self.future = future
+        self.steps: Optional[Iterator[Any]] = None  # set once a generator started
+        self.queued_at = time.monotonic()
+        self.sequence = sequence
+
+
+class SchedulerClosed(RuntimeError):
+    pass
+
+
+class DeviceScheduler:
+    _IDLE_WAIT: ClassVar[float] = 1.0
+
+    _queues: Dict[int, Deque[_Task]]
+    _buckets: Dict[int, _TokenBucket]
+
+    def __init__(
+        self,
+        reader: GT521F32,
+        budgets: Optional[Mapping[int, Budget]] = None,
+        aging: Optional[float] = 5.0,
+        name: Optional[str] = None,
+    ):
+        # aging is in seconds, None to never promote waiting jobs
+        budgets = {BACKGROUND: Budget(0.5)} if budgets is None else budgets
+        assert INTERACTIVE not in budgets, "Interactive work is never throttled."
+        self._reader = reader
+        self._aging = aging
+        self._queues = {priority: collections.deque() for priority in PRIORITIES}
+        self._buckets = {
+            priority: _TokenBucket(budget) for priority, budget in budgets.items()
+        }
+        self._sequence = itertools.count()
+        self._condition = threading.Condition()
+        self._closed = False
+        self._cancelling = False
+
+        self._submitted = collections.Counter()  # type: collections.Counter
+        self._completed = collections.Counter()  # type: collections.Counter
+        self._failed = collections.Counter()  # type: collections.Counter
+        self._steps = collections.Counter()  # type: collections.Counter
+        self._device_time = collections.defaultdict(float)  # type: Dict[int, float]
+        self._max_wait = collections.defaultdict(float)  # type: Dict[int, float]
+
+        self._thread = threading.Thread(
+            target=self._run,
+            name="scheduler-%s" % (name,) if name else "scheduler",
+            daemon=True,
+        )
+        self._thread.start()
+
+    def __enter__(self) -> "DeviceScheduler":
+        return self
+
+    def __exit__(self, *exc_info) -> None:
+        self.close()
+
+    @property
+    def reader(self) -> GT521F32:
+        return self._reader
+
+    def submit(
+        self, job: Job, priority: int = NORMAL, name: Optional[str] = None
+    ) -> "concurrent.futures.Future[Any]":
+        assert priority in PRIORITIES
+        future: "concurrent.futures.Future[Any]" = concurrent.futures.Future()
+        with self._condition:
+            if self._closed:
+                raise SchedulerClosed("Scheduler is closed.")
+            task = _Task(
+                job,
+                name or getattr(job, "__name__", "job"),
+                priority,
+                future,
+                next(self._sequence),
+            )
+            self._queues[priority].append(task)
+            self._submitted[priority] += 1
+            self._condition.notify()
+        return future
+
+    def run(
+        self,
+        job: Job,
+        priority: int = INTERACTIVE,
+        timeout: Optional[float] = None,
+    ) -> Any:
+        # Submits and waits for the result, re-raising the job's exception
+        return self.submit(job, priority).result(timeout)
+
+    def identify(self, timeout: Optional[float] = None) -> Optional[int]:
+        # The timeout covers the wait for the device as well as the identify
+        # itself, which is bounded by it too so a finger that never comes does
+        # not hold the device; raises GT521F32TimeoutException
+        if timeout is None:
+            return self.run(lambda reader: reader.identify(), INTERACTIVE)
+        deadline = time.monotonic() + timeout
+
+        def job(reader: GT521F32) -> Optional[int]:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                raise GT521F32TimeoutException("Timed out waiting for the device.")
+            return reader.identify(timeout=remaining)
+
+        return self.run(job, INTERACTIVE)
+
+    def stats(self) -> Dict[str, ClassStats]:
+        with self._condition:
+            return {
+                PRIORITY_NAMES[priority]: ClassStats(
+                    self._submitted[priority],
+                    self._completed[priority],
+                    self._failed[priority],
+                    self._steps[priority],
+                    self._device_time[priority],
+                    self._max_wait[priority],
+                    len(self._queues[priority]),
+                )
+                for priority in PRIORITIES
+            }
+
+    def close(self, cancel: bool = True, timeout: Optional[float] = None) -> None:
+        # Lets the running step finish; queued jobs are cancelled, or run to
+        # completion first with cancel=False
+        with self._condition:
+            self._closed = True
+            self._cancelling = cancel
+            if cancel:
+                for queue in self._queues.values():
+                    while queue:
+                        self._abandon(queue.popleft())
+            self._condition.notify()
+        self._thread.join(timeout)
+
+    @staticmethod
+    def _abandon(task: _Task) -> None:
+        if task.steps is not None:
+            task.steps.close()  # type: ignore
+            task.future.set_exception(SchedulerClosed("Scheduler closed mid-job."))
+        else:
+            task.future.cancel()
+
+    def _effective_priority(self, task: _Task, now: float) -> int:
+        if not self._aging:
+            return task.priority
+        return max(
+            INTERACTIVE, task.priority - int((now - task.queued_at) / self._aging)
+        )
+
+    def _next_task(self) -> Optional[_Task]:
+        # Called with the condition held. Returns None after waiting for new
+        # work or for a budget to refill.
+        now = time.monotonic()
+        best, best_key, wait = None, None, self._IDLE_WAIT
+        for priority, queue in self._queues.items():
+            if not queue:
+                continue
+            bucket = self._buckets.get(priority)
+            delay = bucket.available_in(now) if bucket is not None else 0.0
+            if delay > 0:
+                wait = min(wait, delay)
+                continue
+            task = queue[0]
+            key = (self._effective_priority(task, now), task.sequence)
+            if best_key is None or key < best_key:
+                best, best_key = task, key
+
+        if best is not None:
+            self._queues[best.priority].popleft()
+            return best
+        if self._closed and not any(self._queues.values()):
+            raise SchedulerClosed()
+        self._condition.wait(wait)
+        return None
+
+    def _step(self, task: _Task) -> bool:
+        # Runs one operation of the task; True when it is done
+        try:
+            if task.steps is None:
+                if not task.future.set_running_or_notify_cancel():
+                    return True
+                result = task.job(self._reader)
+                if not inspect.isgenerator(result):
+                    task.future.set_result(result)
+                    return True
+                task.steps = result
+            next(task.steps)
+            return False
+        except StopIteration as e:  # pylint: disable=invalid-name
+            task.future.set_result(e.value)
+            return True
+        except Exception as e:  # pylint: disable=broad-except,invalid-name
+            logger.error("%s failed: %s", task.name, e)
+            task.future.set_exception(e)
+            with self._condition:
+                self._failed[task.priority] += 1
+            return True
+
+    def _run(self) -> None:
+        while True:
+            with self._condition:
+                try:
+                    task = self._next_task()
+                except SchedulerClosed:
+                    return
+                if task is None:
+                    continue
+                waited = time.monotonic() - task.queued_at
+                self._max_wait[task.priority] = max(
+                    self._max_wait[task.priority], waited
+                )
+
+            started = time.monotonic()
+            done = self._step(task)
+            elapsed = time.monotonic() - started
+
+            with self._condition:
+                self._steps[task.priority] += 1
+                self._device_time[task.priority] += elapsed
+                bucket = self._buckets.get(task.priority)
+                if bucket is not None:
+                    bucket.charge(elapsed)
+                if done:
+                    if not task.future.cancelled() and task.future.exception() is None:
+                        self._completed[task.priority] += 1
+                elif self._cancelling:
+                    self._abandon(task)
+                else:
+                    # Back of its class, so jobs of one class take turns
+                    task.queued_at = time.monotonic()
+                    self._queues[task.priority].append(task)
+
+
+def steps(operations: List[Job]) -> Job:
+    # Turns a list of single operations into one job that yields between
+    # them, returning their results
+    def job(reader: GT521F32) -> Iterator[Any]:
+        results = []
+        for operation in operations:
+            results.append(operation(reader))
+            yield
+        return results
+
+    return job
@@ -0,0 +1,25 @@
+# pylint: disable=bad-continuation # Black and pylint disagree on this
+# pylint: disable=missing-module-docstring
+# pylint: disable=missing-class-docstring
+# pylint: disable=missing-function-docstring
+from typing import Dict, NamedTuple, Optional
+
+# Security level runs from 1 (fewest false rejects) to 5 (fewest false
+# accepts). None in a profile leaves that setting as it is.
+
+MIN_SECURITY_LEVEL = 1
+MAX_SECURITY_LEVEL = 5
+DEFAULT_SECURITY_LEVEL = 3
+
+
+class SecurityProfile(NamedTuple):
+    security_level: Optional[int] = None
+    fake_detector: Optional[bool] = None
+
+
+PROFILES: Dict[str, SecurityProfile] = {
+    "convenience": SecurityProfile(1, False),
+    "balanced": SecurityProfile(DEFAULT_SECURITY_LEVEL, False),
+    "strict": SecurityProfile(4, True),
+    "maximum": SecurityProfile(MAX_SECURITY_LEVEL, True),
+}
@@ -0,0 +1,149 @@
+# pylint: disable=bad-continuation # Black and pylint disagree on this
+# pylint: disable=missing-module-docstring
+# pylint: disable=missing-class-docstring
+# pylint: disable=missing-function-docstring
+import argparse
+import ipaddress
+import logging
+import socket
+import socketserver
+import sys
+import threading
+from typing import Tuple
+
+from .gt521f32 import GT521F32, GT521F32Exception
+from .interfaces import InterfaceException
+from .interfaces.tcp import (
+    HEADER,
+    OP_CLOSE,
+    OP_READ,
+    OP_RESET_INPUT,
+    OP_WRITE,
+    READ_TIMEOUT,
+    STATUS_ERROR,
+    STATUS_OK,
+    recv_exactly,
+)
+
+logger = logging.getLogger(__name__)  # pylint: disable=invalid-name
+
+
+class _InterfaceRequestHandler(socketserver.BaseRequestHandler):
+    server: "InterfaceServer"
+
+    def setup(self):
+        self.request.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+        logger.info("Client %s connected.", self.client_address)
+
+    def handle(self):
+        interface = self.server.interface
+        while True:
+            try:
+                opcode, length = HEADER.unpack(recv_exactly(self.request, HEADER.size))
+            except (ConnectionError, OSError):
+                break
+
+            if opcode == OP_CLOSE:
+                break
+
+            try:
+                if opcode == OP_WRITE:
+                    interface.write(recv_exactly(self.request, length))
+                    continue
+                if opcode == OP_RESET_INPUT:
+                    interface.reset_input_buffer()
+                    continue
+                if opcode != OP_READ:
+                    raise InterfaceException("Unknown opcode %d" % (opcode,))
+                (timeout,) = READ_TIMEOUT.unpack(
+                    recv_exactly(self.request, READ_TIMEOUT.size)
+                )
+                if timeout:
+                    data = interface.read(length, timeout=timeout / 1000.0)
+                else:
+                    data = interface.read(length)
+                status, payload = STATUS_OK, bytes(data)
+            except InterfaceException as e:  # pylint: disable=invalid-name
+                logger.error("Interface operation failed: %s", e)
+                if opcode != OP_READ:
+                    # Only reads are answered, so drop the client rather than
+                    # let it take an error frame for the next read's reply
+                    break
+                status, payload = STATUS_ERROR, str(e).encode("utf-8")
+            except (ConnectionError, OSError):
+                break
+
+            try:
+                self.request.sendall(HEADER.pack(status, len(payload)) + payload)
+            except OSError:
+                break
+
+    def finish(self):
+        logger.info("Client %s disconnected.", self.client_address)
+
+
+class InterfaceServer(socketserver.TCPServer):
+    # One client owns the reader at a time; others wait in the listen backlog
+    allow_reuse_address = True
+
+    def __init__(self, interface, address: Tuple[str, int]):
+        self.interface = interface
+        super().__init__(address, _InterfaceRequestHandler)
+
+    def serve_in_background(self) -> threading.Thread:
+        thread = threading.Thread(target=self.serve_forever, daemon=True)
+        thread.start()
+        return thread
+
+
+def _is_loopback(host: str) -> bool:
+    if host == "localhost":
+        return True
+    try:
+        return ipaddress.ip_address(host).is_loopback
+    except ValueError:
+        return False  # a host name, which may resolve to anything
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Expose a local GT521F32 over TCP (connect with tcp://host:port)"
+    )
+    parser.add_argument("-d", "--device", required=True, help="Path to GT521F32 device")
+    parser.add_argument("-b", "--baudrate", type=int, default=None, help="Baud rate")
+    parser.add_argument("--host", default="127.0.0.1", help="Address to listen on")
+    parser.add_argument(
+        "-p", "--port", type=int, default=5521, help="Port to listen on"
+    )
+    parser.add_argument(
+        "--allow-remote",
+        action="store_true",
+        help="Allow a non-loopback --host; anyone who can connect gets the "
+        "unauthenticated command channel, DELETE_ALL and FW_UPDATE included",
+    )
+    args = parser.parse_args()
+    if not _is_loopback(args.host) and not args.allow_remote:
+        parser.error(
+            "--host %s is reachable from other machines and the server has no "
+            "authentication; add --allow-remote to do this anyway" % (args.host,)
+        )
+
+    logging.basicConfig(level=logging.INFO)
+    try:
+        interface = GT521F32.open_interface(args.device, args.baudrate)
+    except GT521F32Exception:
+        print("Could not open fingerprint device.")
+        return 1
+
+    with InterfaceServer(interface, (args.host, args.port)) as server:
+        try:
+            server.serve_forever()
+        except KeyboardInterrupt:
+            pass
+        finally:
+            interface.close()
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
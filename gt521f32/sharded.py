@@ -0,0 +1,199 @@
+# pylint: disable=bad-continuation # Black and pylint disagree on this
+# pylint: disable=missing-module-docstring
+# pylint: disable=missing-class-docstring
+# pylint: disable=missing-function-docstring
+import logging
+import multiprocessing
+import os
+import queue
+from typing import Dict, List, NamedTuple, Optional, Sequence, Tuple
+
+from .continuous import ContinuousIdentifier, IdentifyEvent
+from .framering import FrameRing
+from .gt521f32 import GT521F32, GT521F32Exception
+
+# Runs ContinuousIdentifier for many readers across worker processes, so
+# identification and the per-frame work around it are not bound to one core.
+# Workers send small result tuples through a queue; images are downloaded
+# into a shared memory FrameRing per device.
+
+logger = logging.getLogger(__name__)  # pylint: disable=invalid-name
+
+_NO_USER = -1
+
+
+class ShardedEvent(NamedTuple):
+    port: str
+    user_id: Optional[int]
+    timestamp: float
+    latency: float
+    frame_sequence: int  # in frame_ring(port), 0 when no frame was captured
+
+
+def balance(
+    ports: Sequence[str], workers: int, weights: Optional[Dict[str, float]] = None
+) -> List[List[str]]:
+    # Greedy longest-first assignment of devices to the least loaded worker
+    weights = weights or {}
+    shards: List[List[str]] = [[] for _ in range(min(workers, len(ports)))]
+    loads = [0.0] * len(shards)
+    for port in sorted(ports, key=lambda port: -weights.get(port, 1.0)):
+        index = loads.index(min(loads))
+        shards[index].append(port)
+        loads[index] += weights.get(port, 1.0)
+    return shards
+
+
+def _worker_main(
+    devices: Dict[str, Tuple[int, Optional[str]]],
+    results: "multiprocessing.Queue",
+    stop: "multiprocessing.synchronize.Event",
+    options: Dict,
+) -> None:
+    # devices maps each port to its index and the name of its frame ring
+    rings: List[FrameRing] = []
+
+    def publisher(index: int):
+        def publish(event: IdentifyEvent) -> None:
+            user_id = _NO_USER if event.user_id is None else event.user_id
+            try:
+                results.put_nowait(
+                    (
+                        index,
+                        user_id,
+                        event.timestamp,
+                        event.latency,
+                        event.frame_sequence,
+                    )
+                )
+            except queue.Full:
+                logger.warning("Coordinator is not keeping up, dropping event.")
+
+        return publish
+
+    readers, identifiers = [], []
+    try:
+        for port, (index, ring_name) in devices.items():
+            reader = None
+            try:
+                reader = GT521F32(port)
+                reader.open()
+            except GT521F32Exception as e:  # pylint: disable=invalid-name
+                logger.error("Worker %d could not open %s: %s", os.getpid(), port, e)
+                if reader is not None:
+                    reader.close()
+                continue
+            readers.append(reader)
+            ring = FrameRing.attach(ring_name) if ring_name else None
+            if ring is not None:
+                rings.append(ring)
+            identifiers.append(
+                ContinuousIdentifier(
+                    reader, callback=publisher(index), frame_ring=ring, **options
+                )
+            )
+
+        for identifier in identifiers:
+            identifier.start()
+        stop.wait()
+    finally:
+        for identifier in identifiers:
+            identifier.stop()
+        for reader in readers:
+            reader.close()
+        for ring in rings:
+            ring.close()
+
+
+class ShardedIdentifier:
+    _RESULT_QUEUE_SIZE = 1024
+
+    _ports: List[str]
+    _shards: List[List[str]]
+
+    def __init__(  # pylint: disable=too-many-arguments
+        self,
+        ports: Sequence[str],
+        workers: Optional[int] = None,
+        weights: Optional[Dict[str, float]] = None,
+        capture_frames: bool = False,
+        context: Optional[str] = None,
+        frame_slots: int = 4,
+        **options
+    ):
+        # options are passed on to each ContinuousIdentifier
+        self._ports = list(ports)
+        self._indices = {port: index for index, port in enumerate(self._ports)}
+        self._shards = balance(self._ports, workers or os.cpu_count() or 1, weights)
+        self._context = multiprocessing.get_context(context)
+        self._options = options
+
+        self._rings: Dict[str, FrameRing] = {}
+        if capture_frames:
+            self._rings = {port: FrameRing(frame_slots) for port in self._ports}
+
+        self._results = self._context.Queue(self._RESULT_QUEUE_SIZE)
+        self._stop = self._context.Event()
+        self._processes: List[multiprocessing.process.BaseProcess] = []
+
+    def __enter__(self) -> "ShardedIdentifier":
+        self.start()
+        return self
+
+    def __exit__(self, *exc_info) -> None:
+        self.stop()
+
+    @property
+    def shards(self) -> List[List[str]]:
+        return self._shards
+
+    def start(self) -> None:
+        self._stop.clear()
+        for shard in self._shards:
+            devices = {
+                port: (
+                    self._indices[port],
+                    self._rings[port].name if port in self._rings else None,
+                )
+                for port in shard
+            }
+            process = self._context.Process(
+                target=_worker_main,
+                args=(devices, self._results, self._stop, self._options),
+                daemon=True,
+            )
+            process.start()
+            self._processes.append(process)
+
+    def stop(self, timeout: float = 5.0) -> None:
+        self._stop.set()
+        for process in self._processes:
+            process.join(timeout)
+            if process.is_alive():
+                process.terminate()
+        self._processes = []
+        for ring in self._rings.values():
+            ring.close()
+        self._rings = {}
+
+    def get(self, timeout: Optional[float] = None) -> ShardedEvent:
+        # Raises queue.Empty on timeout
+        index, user_id, timestamp, latency, sequence = self._results.get(
+            timeout=timeout
+        )
+        return ShardedEvent(
+            self._ports[index],
+            None if user_id == _NO_USER else user_id,
+            timestamp,
+            latency,
+            sequence,
+        )
+
+    def frame_ring(self, port: str) -> Optional[FrameRing]:
+        # For zero-copy access, or to hand the ring name to other processes
+        return self._rings.get(port)
+
+    def frame(self, port: str, sequence: Optional[int] = None) -> Optional[bytes]:
+        # A copy of the given or latest image captured on this port
+        ring = self._rings.get(port)
+        return ring.read(sequence) if ring is not None else None
@@ -0,0 +1,279 @@
+# pylint: disable=bad-continuation # Black and pylint disagree on this
+# pylint: disable=missing-module-docstring
+# pylint: disable=missing-class-docstring
+# pylint: disable=missing-function-docstring
+import hashlib
+import logging
+import sqlite3
+import threading
+import time
+from typing import Dict, Generator, Iterable, List, Mapping, NamedTuple, Optional, Union
+
+from . import packets
+from .gt521f32 import GT521F32, GT521F32Exception
+from .pool import DevicePool
+
+# Brings the templates on readers in line with a source of truth, a slot to
+# template mapping. What each reader holds is remembered as a digest per
+# slot, keyed by the reader's serial number, so a sync only transfers the
+# slots whose digest differs and deletes the ones the source does not have.
+# The index is only trusted for readers it has seen; refresh() rebuilds it
+# from a reader, e.g. after enrolling on it directly.
+
+logger = logging.getLogger(__name__)  # pylint: disable=invalid-name
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS templates (
+    serial_number TEXT NOT NULL,
+    slot INTEGER NOT NULL,
+    digest TEXT NOT NULL,
+    PRIMARY KEY (serial_number, slot)
+);
+CREATE TABLE IF NOT EXISTS readers (
+    serial_number TEXT PRIMARY KEY,
+    synced_at REAL NOT NULL
+);
+"""
+
+DEFAULT_BATCH_SIZE = 16  # operations between index commits
+
+
+class SyncException(GT521F32Exception):
+    pass
+
+
+def template_digest(template: bytes) -> str:
+    return hashlib.blake2b(template, digest_size=16).hexdigest()
+
+
+class SyncPlan(NamedTuple):
+    serial_number: str
+    set: List[int]  # slots to write, missing or different on the reader
+    delete: List[int]  # slots the source does not have
+
+    def __len__(self) -> int:  # type: ignore
+        return len(self.set) + len(self.delete)
+
+
+class SyncResult(NamedTuple):
+    serial_number: str
+    set: List[int]
+    deleted: List[int]
+    failed: Dict[int, str]  # slot -> what went wrong
+    elapsed: float
+
+
+class TemplateIndex:
+    _digests: Dict[str, Dict[int, str]]  # serial number -> slot -> digest
+
+    def __init__(self, path: str = ":memory:"):
+        self._lock = threading.RLock()
+        self._connection = sqlite3.connect(path, check_same_thread=False)
+        if path != ":memory:":
+            self._connection.execute("PRAGMA journal_mode=WAL")
+            self._connection.execute("PRAGMA synchronous=NORMAL")
+        self._connection.executescript(_SCHEMA)
+
+        self._digests = {
+            serial_number: {}
+            for (serial_number,) in self._connection.execute(
+                "SELECT serial_number FROM readers"
+            )
+        }
+        for serial_number, slot, digest in self._connection.execute(
+            "SELECT serial_number, slot, digest FROM templates"
+        ):
+            self._digests.setdefault(serial_number, {})[slot] = digest
+
+    def __enter__(self) -> "TemplateIndex":
+        return self
+
+    def __exit__(self, *exc_info) -> None:
+        self.close()
+
+    def close(self) -> None:
+        with self._lock:
+            self._connection.close()
+
+    def __contains__(self, serial_number: str) -> bool:
+        return serial_number in self._digests
+
+    def digests(self, serial_number: str) -> Dict[int, str]:
+        return dict(self._digests.get(serial_number, {}))
+
+    def update(self, serial_number: str, digests: Mapping[int, Optional[str]]) -> None:
+        # None removes the slot
+        with self._lock, self._connection:
+            self._connection.execute(
+                "INSERT OR REPLACE INTO readers VALUES (?, ?)",
+                (serial_number, time.time()),
+            )
+            known = self._digests.setdefault(serial_number, {})
+            for slot, digest in digests.items():
+                if digest is None:
+                    self._connection.execute(
+                        "DELETE FROM templates WHERE serial_number = ? AND slot = ?",
+                        (serial_number, slot),
+                    )
+                    known.pop(slot, None)
+                else:
+                    self._connection.execute(
+                        "INSERT OR REPLACE INTO templates VALUES (?, ?, ?)",
+                        (serial_number, slot, digest),
+                    )
+                    known[slot] = digest
+
+    def replace(self, serial_number: str, digests: Mapping[int, str]) -> None:
+        with self._lock:
+            stale = {
+                slot: None
+                for slot in self._digests.get(serial_number, {})
+                if slot not in digests
+            }
+            self.update(serial_number, {**stale, **digests})
+
+    def forget(self, serial_number: str) -> None:
+        with self._lock, self._connection:
+            for table in ("templates", "readers"):
+                self._connection.execute(
+                    "DELETE FROM %s WHERE serial_number = ?" % (table,),
+                    (serial_number,),
+                )
+            self._digests.pop(serial_number, None)
+
+
+def _serial_number(reader: GT521F32) -> str:
+    # OPEN is what reports the serial number
+    if reader.device_serial_number is None:
+        reader.open()
+    return reader.device_serial_number
+
+
+def refresh(index: TemplateIndex, reader: GT521F32, full: bool = False) -> None:
+    # Rebuilds the reader's entry from what it holds. The digests of slots
+    # the index already knows are taken on trust unless full is set, so this
+    # costs one pipelined enrollment scan plus a GET_TEMPLATE per new slot.
+    # Slots the scan could not tell about keep their entries.
+    serial_number = _serial_number(reader)
+    known = {} if full else index.digests(serial_number)
+    digests = {}
+    scan = reader.check_enrolled_range()
+    free = set(scan.failed("NACK_IS_NOT_USED"))
+    for slot, error in zip(scan.ids, scan.errors):
+        if error and slot not in free:
+            logger.warning("%s: could not check slot %d.", serial_number, slot)
+            if slot in known:
+                digests[slot] = known[slot]
+    for slot in scan.succeeded:
+        if slot in known:
+            digests[slot] = known[slot]
+            continue
+        template = reader.get_template(slot)
+        if template is None:
+            raise SyncException("Could not read the template in slot %d." % (slot,))
+        digests[slot] = template_digest(template)
+    index.replace(serial_number, digests)
+
+
+def plan(
+    index: TemplateIndex, serial_number: str, source: Mapping[int, str]
+) -> SyncPlan:
+    # source maps slots to template digests
+    current = index.digests(serial_number)
+    return SyncPlan(
+        serial_number,
+        sorted(slot for slot, digest in source.items() if current.get(slot) != digest),
+        sorted(slot for slot in current if slot not in source),
+    )
+
+
+def sync_steps(  # pylint: disable=too-many-locals
+    index: TemplateIndex,
+    reader: GT521F32,
+    source: Mapping[int, bytes],
+    digests: Optional[Mapping[int, str]] = None,
+    batch_size: int = DEFAULT_BATCH_SIZE,
+) -> Generator[None, None, SyncResult]:
+    # Makes the reader hold exactly the templates in source, yielding after
+    # every batch. The index is committed at each yield, so an interrupted
+    # sync resumes where it stopped. Every sync starts with an enrollment
+    # scan, so slots enrolled or deleted behind the index's back are caught.
+    # Runs as a background job of a scheduler.DeviceScheduler as is.
+    started = time.monotonic()
+    serial_number = _serial_number(reader)
+    if digests is None:
+        digests = {slot: template_digest(template) for slot, template in source.items()}
+    refresh(index, reader)
+    yield
+    todo = plan(index, serial_number, digests)
+    logger.info(
+        "%s: %d to set, %d to delete", serial_number, len(todo.set), len(todo.delete)
+    )
+
+    deleted: List[int] = []
+    failed: Dict[int, str] = {}
+    not_used = packets.response_error["NACK_IS_NOT_USED"]
+    for start in range(0, len(todo.delete), batch_size):
+        result = reader.delete_ids(todo.delete[start : start + batch_size])
+        gone = {}
+        for slot, error in zip(result.ids, result.errors):
+            if error in (0, not_used):
+                gone[slot] = None
+                deleted.append(slot)
+            else:
+                failed[slot] = packets.response_error_names.get(error, hex(error))
+        index.update(serial_number, gone)
+        yield
+
+    written: List[int] = []
+    for start in range(0, len(todo.set), batch_size):
+        stored = {}
+        for slot in todo.set[start : start + batch_size]:
+            if reader.set_template(slot, source[slot]):
+                stored[slot] = digests[slot]
+                written.append(slot)
+            else:
+                failed[slot] = "SET_TEMPLATE failed"
+        index.update(serial_number, stored)
+        yield
+
+    return SyncResult(
+        serial_number, written, deleted, failed, time.monotonic() - started
+    )
+
+
+def sync_reader(  # pylint: disable=too-many-arguments
+    index: TemplateIndex,
+    reader: GT521F32,
+    source: Mapping[int, bytes],
+    digests: Optional[Mapping[int, str]] = None,
+    batch_size: int = DEFAULT_BATCH_SIZE,
+    timeout: Optional[float] = None,
+) -> SyncResult:
+    steps = sync_steps(index, reader, source, digests, batch_size)
+    with reader.deadline(timeout):
+        while True:
+            try:
+                next(steps)
+            except StopIteration as e:  # pylint: disable=invalid-name
+                return e.value
+
+
+def sync_pool(  # pylint: disable=too-many-arguments
+    index: TemplateIndex,
+    pool: DevicePool,
+    source: Mapping[int, bytes],
+    ports: Optional[Iterable[str]] = None,
+    parallelism: Optional[int] = None,
+    batch_size: int = DEFAULT_BATCH_SIZE,
+    timeout: Optional[float] = None,
+) -> Dict[str, Union[SyncResult, Exception]]:
+    # Source digests are computed once for every reader
+    digests = {slot: template_digest(template) for slot, template in source.items()}
+    return pool.run(
+        lambda reader: sync_reader(
+            index, reader, source, digests, batch_size=batch_size, timeout=timeout
+        ),
+        ports=ports,
+        parallelism=parallelism,
+    )
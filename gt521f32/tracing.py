@@ -0,0 +1,466 @@
+# pylint: disable=bad-continuation # Black and pylint disagree on this
+# pylint: disable=missing-module-docstring
+# pylint: disable=missing-class-docstring
+# pylint: disable=missing-function-docstring
+import argparse
+import collections
+import logging
+import os
+import struct
+import sys
+import threading
+import time
+from typing import Any, BinaryIO, Deque, Iterator, List, NamedTuple, Optional, Tuple
+
+from . import packets
+
+# Records what crosses the transport: every write, read and input reset with
+# its start time, duration and raw bytes. Bytes are copied into a ring
+# preallocated up front and nothing is formatted while tracing; the oldest
+# records are overwritten once the ring is full. Traces are dumped to a
+# compact binary file, which decode() turns back into packets offline:
+#
+#   python -m gt521f32.tracing gt521f32-0123ABCD-1700000000.trace
+
+logger = logging.getLogger(__name__)  # pylint: disable=invalid-name
+
+WRITE = ord("W")
+READ = ord("R")
+RESET = ord("I")  # reset_input_buffer
+ERROR = ord("E")  # marked by the reader, holds the reason
+
+DEFAULT_CAPACITY = 2 ** 20  # bytes, about twenty images
+DEFAULT_MAX_RECORDS = 2 ** 16
+DEFAULT_DUMP_INTERVAL = 10.0  # seconds between automatic dumps
+
+_MAGIC = b"GT5TRACE"
+_VERSION = 1
+_FILE_HEADER = struct.Struct("<8sHQLL")  # magic, version, epoch, records, dropped
+# start and duration in ns, op, requested size, transferred size, stored size
+_RECORD_HEADER = struct.Struct("<QQBLLL")
+
+
+class TraceRecord(NamedTuple):
+    start: int  # ns since the tracer started
+    duration: int  # ns
+    op: int
+    requested: int  # bytes asked for by a read
+    length: int  # bytes actually transferred
+    data: bytes  # only the head of transfers over an eighth of the ring
+
+    @property
+    def truncated(self) -> bool:
+        return len(self.data) < self.length
+
+
+class WireTracer:
+    # (start, duration, op, requested, length, position, stored)
+    _records: Deque[Tuple[int, int, int, int, int, int, int]]
+
+    def __init__(
+        self,
+        capacity: int = DEFAULT_CAPACITY,
+        max_records: int = DEFAULT_MAX_RECORDS,
+        dump_interval: float = DEFAULT_DUMP_INTERVAL,
+    ):
+        self._buffer = bytearray(capacity)
+        self._view = memoryview(self._buffer)
+        self._capacity = capacity
+        self._max_stored = max(1, capacity // 8)  # so a record never flushes the ring
+        self._written = 0  # bytes ever copied in, positions are offsets in it
+        self._records = collections.deque(maxlen=max_records)
+        self._dropped = 0
+        self._lock = threading.Lock()
+        self._epoch = time.time_ns()
+        self._origin = time.perf_counter_ns()
+        self._dump_interval = dump_interval
+        self._last_dump = float("-inf")
+
+    def now(self) -> int:
+        return time.perf_counter_ns() - self._origin
+
+    def record(self, op: int, start: int, data: Any = b"", requested: int = 0) -> None:
+        length = len(data)
+        stored = min(length, self._max_stored)
+        with self._lock:
+            duration = self.now() - start
+            position = self._written % self._capacity
+            first = min(stored, self._capacity - position)
+            source = memoryview(data)[:stored]
+            self._view[position : position + first] = source[:first]
+            self._view[: stored - first] = source[first:]
+            self._written += stored
+
+            records = self._records
+            if len(records) == records.maxlen:
+                self._dropped += 1
+            records.append(
+                (start, duration, op, requested, length, self._written - stored, stored)
+            )
+            oldest = self._written - self._capacity
+            while records[0][5] < oldest:
+                records.popleft()
+                self._dropped += 1
+
+    def mark(self, reason: str) -> None:
+        self.record(ERROR, self.now(), reason.encode("utf-8", "replace"))
+
+    def clear(self) -> None:
+        with self._lock:
+            self._records.clear()
+            self._dropped = 0
+
+    def __len__(self) -> int:
+        return len(self._records)
+
+    def _data(self, position: int, stored: int) -> bytes:
+        start = position % self._capacity
+        end = start + stored
+        if end <= self._capacity:
+            return bytes(self._view[start:end])
+        return bytes(self._view[start:]) + bytes(self._view[: end - self._capacity])
+
+    def records(self) -> List[TraceRecord]:
+        with self._lock:
+            return [
+                TraceRecord(
+                    start, duration, op, requested, length, self._data(position, stored)
+                )
+                for start, duration, op, requested, length, position, stored in (
+                    self._records
+                )
+            ]
+
+    def write_to(self, output: BinaryIO) -> None:
+        with self._lock:
+            snapshot = list(self._records)
+            output.write(
+                _FILE_HEADER.pack(
+                    _MAGIC, _VERSION, self._epoch, len(snapshot), self._dropped
+                )
+            )
+            for start, duration, op, requested, length, position, stored in snapshot:
+                output.write(
+                    _RECORD_HEADER.pack(start, duration, op, requested, length, stored)
+                )
+                output.write(self._data(position, stored))
+
+    def dump(self, path: str) -> str:
+        with open(path, "wb") as output:
+            self.write_to(output)
+        return path
+
+    def dump_on_error(self, directory: str, name: str, reason: str) -> Optional[str]:
+        # At most one dump per dump_interval, so a burst of errors leaves one
+        # trace holding all of them rather than a file each
+        self.mark(reason)
+        now = time.monotonic()
+        if now - self._last_dump < self._dump_interval:
+            return None
+        self._last_dump = now
+        path = os.path.join(
+            directory, "gt521f32-%s-%d.trace" % (name, time.time_ns() // 10 ** 6)
+        )
+        try:
+            self.dump(path)
+        except OSError as e:  # pylint: disable=invalid-name
+            logger.warning("Could not dump the wire trace to %s: %s", path, e)
+            return None
+        logger.warning("%s, wire trace dumped to %s", reason, path)
+        return path
+
+
+class TracingInterface:
+    # Wraps any interface, recording through a WireTracer. Anything else is
+    # passed through, e.g. the simulated interface's device
+    def __init__(self, inner: Any, tracer: WireTracer):
+        self.inner = inner
+        self.tracer = tracer
+
+    def __getattr__(self, name: str) -> Any:
+        return getattr(self.inner, name)
+
+    def write(self, data):
+        start = self.tracer.now()
+        result = self.inner.write(data)
+        self.tracer.record(WRITE, start, data)
+        return result
+
+    def read(self, to_read, timeout=None):
+        start = self.tracer.now()
+        data = self.inner.read(to_read, timeout=timeout)
+        self.tracer.record(READ, start, data, to_read)
+        return data
+
+    def readinto(self, buffer, timeout=None):
+        start = self.tracer.now()
+        view = memoryview(buffer).cast("B")
+        readinto = getattr(self.inner, "readinto", None)
+        if readinto is None:
+            data = self.inner.read(len(view), timeout=timeout)
+            view[: len(data)] = data
+            received = len(data)
+        else:
+            received = readinto(view, timeout=timeout)
+        self.tracer.record(READ, start, view[:received], len(view))
+        return received
+
+    def reset_input_buffer(self):
+        start = self.tracer.now()
+        self.inner.reset_input_buffer()
+        self.tracer.record(RESET, start)
+
+    def close(self):
+        self.inner.close()
+
+
+def unwrap(interface: Any) -> Any:
+    return interface.inner if isinstance(interface, TracingInterface) else interface
+
+
+class Trace(NamedTuple):
+    epoch: int  # wall clock ns when tracing started
+    dropped: int  # records overwritten before the dump
+    records: List[TraceRecord]
+
+
+def read_trace(source: BinaryIO) -> Trace:
+    header = source.read(_FILE_HEADER.size)
+    if len(header) < _FILE_HEADER.size:
+        raise ValueError("Not a wire trace")
+    magic, version, epoch, count, dropped = _FILE_HEADER.unpack(header)
+    if magic != _MAGIC or version != _VERSION:
+        raise ValueError("Not a version %d wire trace" % (_VERSION,))
+
+    records = []
+    for _ in range(count):
+        record_header = source.read(_RECORD_HEADER.size)
+        if len(record_header) < _RECORD_HEADER.size:
+            break  # the process died while dumping, keep what is there
+        start, duration, op, requested, length, stored = _RECORD_HEADER.unpack(
+            record_header
+        )
+        records.append(
+            TraceRecord(start, duration, op, requested, length, source.read(stored))
+        )
+    return Trace(epoch, dropped, records)
+
+
+def load(path: str) -> Trace:
+    with open(path, "rb") as source:
+        return read_trace(source)
+
+
+# Data packets answering these commands, parsed into their packet classes
+_DATA_PACKETS = {
+    packets.command_codes["OPEN"]: packets.OpenDataPacket,
+    packets.command_codes["MODULE_INFO"]: packets.ModuleInfoDataPacket,
+    packets.command_codes["GET_IMAGE"]: packets.GetImageDataPacket,
+    packets.command_codes["GET_RAWIMAGE"]: packets.GetRawImageDataPacket,
+    packets.command_codes["MAKE_TEMPLATE"]: packets.TemplateDataPacket,
+    packets.command_codes["GET_TEMPLATE"]: packets.TemplateDataPacket,
+}
+_PACKET_SIZE = packets.ResponsePacket().byte_size()
+_COMMAND_START = bytes((0x55, 0xAA))
+_DATA_START = bytes((0x5A, 0xA5))
+_DATA_OVERHEAD = 6  # start codes, device id and checksum
+_TEMPLATE_SIZE = packets.TemplateDataPacket().byte_size() - _DATA_OVERHEAD
+
+
+class Exchange(NamedTuple):
+    start: int  # ns since the tracer started, when the write began
+    latency: int  # ns from the write to the end of the response
+    duration: int  # ns from the write to the last record before the next one
+    sent: Optional[packets.Packet]  # CommandPacket or a data packet
+    response: Optional[packets.ResponsePacket]
+    data: Optional[Any]  # the data packet following the response, if any
+    errors: List[str]  # what did not decode, resets and marked errors
+    records: List[TraceRecord]
+
+
+def _checksum_ok(raw: bytes) -> bool:
+    (checksum,) = struct.unpack("<H", raw[-2:])
+    return checksum == sum(raw[:-2]) % 2 ** 16
+
+
+def _decode_sent(raw: bytes, errors: List[str]) -> Optional[packets.Packet]:
+    if raw[:2] == _COMMAND_START and len(raw) == _PACKET_SIZE:
+        if not _checksum_ok(raw):
+            errors.append("bad command checksum")
+            return None
+        return packets.CommandPacket.from_bytes(raw)
+    if raw[:2] == _DATA_START and len(raw) >= _DATA_OVERHEAD:
+        if not _checksum_ok(raw):
+            errors.append("bad data packet checksum")
+            return None
+        payload = raw[4:-2]
+        if len(payload) == _TEMPLATE_SIZE:
+            return packets.TemplateDataPacket(payload)
+        return packets.ChunkDataPacket(payload)
+    errors.append("unknown packet written: %s" % (raw[:16].hex(),))
+    return None
+
+
+def _decode_received(
+    raw: bytes, command: Optional[int], truncated: bool, errors: List[str]
+) -> Tuple[Optional[packets.ResponsePacket], Optional[Any]]:
+    response = None
+    if len(raw) < _PACKET_SIZE:
+        if command is not None:
+            errors.append("short response, %d of %d bytes" % (len(raw), _PACKET_SIZE))
+        return None, raw or None
+    head, rest = raw[:_PACKET_SIZE], raw[_PACKET_SIZE:]
+    if head[:2] != _COMMAND_START:
+        errors.append("bad response start code %s" % (head[:2].hex(),))
+    elif not _checksum_ok(head):
+        errors.append("bad response checksum")
+    else:
+        response = packets.ResponsePacket.from_bytes(head)
+
+    if not rest:
+        return response, None
+    if rest[:2] != _DATA_START or len(rest) < _DATA_OVERHEAD:
+        errors.append("bad data packet start code %s" % (rest[:2].hex(),))
+        return response, rest
+    if truncated:
+        return response, rest[4:]  # the checksum is not in what was kept
+    if not _checksum_ok(rest):
+        errors.append("bad data packet checksum")
+        return response, rest
+    packet_class = _DATA_PACKETS.get(command)  # type: ignore
+    if packet_class is not None and len(rest) == packet_class().byte_size():
+        return response, packet_class.from_bytes(rest)
+    return response, rest[4:-2]
+
+
+def exchanges(records: List[TraceRecord]) -> Iterator[Exchange]:
+    # Groups records into a write and everything read until the next write
+    def group() -> Iterator[List[TraceRecord]]:
+        current: List[TraceRecord] = []
+        for record in records:
+            if record.op == WRITE and current:
+                yield current
+                current = []
+            current.append(record)
+        if current:
+            yield current
+
+    for grouped in group():
+        errors: List[str] = []
+        sent, command = None, None
+        if grouped[0].op == WRITE:
+            sent = _decode_sent(grouped[0].data, errors)
+            if isinstance(sent, packets.CommandPacket):
+                command = sent.command
+        else:
+            errors.append("records before the first write")
+
+        received = bytearray()
+        response_end = None
+        for record in grouped:
+            if record.truncated:
+                errors.append("record truncated to %d bytes" % (len(record.data),))
+            if record.op == READ:
+                received += record.data
+                if response_end is None and len(received) >= _PACKET_SIZE:
+                    response_end = record.start + record.duration
+                if record.length < record.requested:
+                    errors.append(
+                        "short read, %d of %d bytes" % (record.length, record.requested)
+                    )
+            elif record.op == RESET:
+                errors.append("input reset")
+            elif record.op == ERROR:
+                errors.append(record.data.decode("utf-8", "replace"))
+
+        response, data = _decode_received(
+            bytes(received),
+            command,
+            any(record.truncated for record in grouped),
+            errors,
+        )
+        start = grouped[0].start
+        last = max(record.start + record.duration for record in grouped)
+        yield Exchange(
+            start,
+            (response_end if response_end is not None else last) - start,
+            last - start,
+            sent,
+            response,
+            data,
+            errors,
+            grouped,
+        )
+
+
+def decode(path: str) -> List[Exchange]:
+    return list(exchanges(load(path).records))
+
+
+def describe(exchange: Exchange) -> str:
+    sent = exchange.sent
+    if isinstance(sent, packets.CommandPacket):
+        request = "%s(%d)" % (
+            packets.command_names.get(sent.command, hex(sent.command)),
+            sent.parameter,
+        )
+    elif sent is not None:
+        request = "%s[%d]" % (type(sent).__name__, len(sent.to_bytes()))
+    else:
+        request = "?"
+
+    response = exchange.response
+    if response is None:
+        reply = "-"
+    elif response.ok:
+        reply = "ACK %d" % (response.parameter,)
+    else:
+        reply = "NACK %s" % (
+            packets.response_error_names.get(
+                response.parameter, hex(response.parameter)
+            ),
+        )
+    if exchange.data is not None:
+        size = (
+            len(exchange.data)
+            if isinstance(exchange.data, (bytes, bytearray))
+            else exchange.data.byte_size()
+        )
+        reply += " + %s[%d]" % (type(exchange.data).__name__, size)
+
+    line = "%12.3f ms %-28s -> %-40s %9.3f ms" % (
+        exchange.start / 10 ** 6,
+        request,
+        reply,
+        exchange.latency / 10 ** 6,
+    )
+    if exchange.errors:
+        line += "  ! " + "; ".join(exchange.errors)
+    return line
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description="Decode a GT521F32 wire trace")
+    parser.add_argument("trace")
+    parser.add_argument(
+        "--errors", action="store_true", help="Only show exchanges with errors"
+    )
+    args = parser.parse_args()
+
+    trace = load(args.trace)
+    print(
+        "Traced from %s, %d records, %d dropped"
+        % (
+            time.strftime("%Y-%m-%d %H:%M:%S", time.localtime(trace.epoch / 10 ** 9)),
+            len(trace.records),
+            trace.dropped,
+        )
+    )
+    for exchange in exchanges(trace.records):
+        if exchange.errors or not args.errors:
+            print(describe(exchange))
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,238 @@
+# pylint: disable=bad-continuation # Black and pylint disagree on this
+# pylint: disable=missing-module-docstring
+# pylint: disable=missing-class-docstring
+# pylint: disable=missing-function-docstring
+import argparse
+import functools
+import logging
+import os
+import sys
+import time
+from typing import BinaryIO, Callable, Dict, NamedTuple, Optional, Union
+
+from . import packets
+from .gt521f32 import GT521F32, GT521F32Exception
+from .pool import DevicePool
+
+# Streams firmware and ISO area images to readers. FW_UPDATE / ISO_UPDATE
+# carry the image size and are followed by UPDATE_CHUNK_SIZE data packets,
+# each acknowledged with the number of bytes received so far; the last one
+# is acknowledged with the 32 bit sum of the whole image instead.
+#
+# EXPERIMENTAL: the datasheet names the commands but not this framing, and
+# it has not been checked against the vendor's tool. The simulator models
+# the same framing, so it proves nothing about real modules, and a wrong
+# framing can leave a module unbootable. Every entry point refuses to run
+# unless asked with experimental=True (--experimental on the command line).
+
+logger = logging.getLogger(__name__)  # pylint: disable=invalid-name
+
+FIRMWARE = "FW_UPDATE"
+ISO_AREA = "ISO_UPDATE"
+
+
+class UpdateException(GT521F32Exception):
+    pass
+
+
+def _check_experimental(experimental: bool) -> None:
+    if not experimental:
+        raise UpdateException(
+            "The update protocol is unverified on real modules and can brick "
+            "them; pass experimental=True to use it anyway."
+        )
+
+
+class UpdateProgress(NamedTuple):
+    sent: int
+    total: int
+    elapsed: float
+
+
+class UpdateResult(NamedTuple):
+    size: int
+    chunks: int
+    elapsed: float
+
+    @property
+    def throughput(self) -> float:
+        # bytes per second
+        return self.size / self.elapsed if self.elapsed else 0.0
+
+
+def _image_size(image: BinaryIO) -> int:
+    position = image.tell()
+    size = image.seek(0, os.SEEK_END) - position
+    image.seek(position)
+    return size
+
+
+def _error_name(parameter: int) -> str:
+    return packets.response_error_names.get(parameter, hex(parameter))
+
+
+def stream_update(
+    reader: GT521F32,
+    image: BinaryIO,
+    kind: str = FIRMWARE,
+    progress: Optional[Callable[[UpdateProgress], None]] = None,
+    timeout: Optional[float] = None,
+    experimental: bool = False,
+) -> UpdateResult:
+    # image is a seekable binary file, read from its current position
+    _check_experimental(experimental)
+    assert kind in (FIRMWARE, ISO_AREA)
+    size = _image_size(image)
+    if size == 0:
+        raise UpdateException("Image is empty.")
+    if (
+        kind == ISO_AREA
+        and reader.iso_area_max_size
+        and size > reader.iso_area_max_size
+    ):
+        raise UpdateException(
+            "Image of %d bytes exceeds the ISO area of %d bytes."
+            % (size, reader.iso_area_max_size)
+        )
+
+    started = time.monotonic()
+    with reader.deadline(timeout):
+        response_code, parameter = reader.send_command(kind, size)
+        if response_code != packets.ACK_OK:
+            raise UpdateException("%s rejected: %s" % (kind, _error_name(parameter)))
+
+        sent, chunks, checksum = 0, 0, 0
+        for chunk in iter(
+            functools.partial(image.read, packets.UPDATE_CHUNK_SIZE), b""
+        ):
+            chunk = chunk[: size - sent]
+            response_code, parameter = reader.send_data(chunk)
+            if response_code != packets.ACK_OK:
+                raise UpdateException(
+                    "Chunk at offset %d rejected: %s" % (sent, _error_name(parameter))
+                )
+            sent += len(chunk)
+            chunks += 1
+            checksum = (checksum + sum(chunk)) % 2 ** 32
+            if sent < size and parameter != sent:
+                raise UpdateException(
+                    "Device received %d bytes, %d were sent." % (parameter, sent)
+                )
+            if progress is not None:
+                progress(UpdateProgress(sent, size, time.monotonic() - started))
+            if sent == size:
+                break
+
+    if sent < size:
+        raise UpdateException("Image shrank to %d of %d bytes." % (sent, size))
+    if parameter != checksum:
+        raise UpdateException(
+            "Checksum mismatch, device has %08x, image is %08x." % (parameter, checksum)
+        )
+
+    result = UpdateResult(size, chunks, time.monotonic() - started)
+    logger.info(
+        "%s of %d bytes done in %.1fs (%.0f B/s)",
+        kind,
+        size,
+        result.elapsed,
+        result.throughput,
+    )
+    return result
+
+
+def update_file(
+    reader: GT521F32,
+    path: str,
+    kind: str = FIRMWARE,
+    progress: Optional[Callable[[UpdateProgress], None]] = None,
+    timeout: Optional[float] = None,
+    experimental: bool = False,
+) -> UpdateResult:
+    _check_experimental(experimental)
+    try:
+        image = open(path, "rb")  # pylint: disable=consider-using-with
+    except OSError as e:  # pylint: disable=invalid-name
+        raise UpdateException("Cannot read image %s: %s" % (path, e))
+    with image:
+        return stream_update(reader, image, kind, progress, timeout, experimental)
+
+
+def update_pool(
+    pool: DevicePool,
+    path: str,
+    kind: str = FIRMWARE,
+    parallelism: Optional[int] = None,
+    timeout: Optional[float] = None,
+    experimental: bool = False,
+) -> Dict[str, Union[UpdateResult, Exception]]:
+    # The image is checked once, before any device is touched, so a bad path
+    # fails the call instead of every device in the pool. Each device then
+    # streams it from its own file object, never holding it in memory.
+    _check_experimental(experimental)
+    try:
+        with open(path, "rb") as image:
+            size = _image_size(image)
+    except OSError as e:  # pylint: disable=invalid-name
+        raise UpdateException("Cannot read image %s: %s" % (path, e))
+    if size == 0:
+        raise UpdateException("Image %s is empty." % (path,))
+    return pool.run(
+        lambda reader: update_file(
+            reader, path, kind, timeout=timeout, experimental=True
+        ),
+        parallelism=parallelism,
+    )
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Update GT521F32 readers.")
+    parser.add_argument(
+        "-d", "--device", action="append", required=True, help="Repeat for each reader"
+    )
+    parser.add_argument("-b", "--baudrate", type=int)
+    parser.add_argument("--iso", action="store_true", help="Update the ISO area")
+    parser.add_argument("-j", "--parallel", type=int, default=2)
+    parser.add_argument("--timeout", type=float)
+    parser.add_argument(
+        "--experimental",
+        action="store_true",
+        help="Required: the update protocol is unverified and can brick modules",
+    )
+    parser.add_argument("image")
+    args = parser.parse_args()
+    if not args.experimental:
+        parser.error(
+            "the update protocol is unverified on real modules and a wrong "
+            "framing can brick them; pass --experimental to proceed anyway"
+        )
+    logging.basicConfig(level=logging.INFO)
+
+    try:
+        with DevicePool(args.device, args.parallel, args.baudrate) as pool:
+            results = update_pool(
+                pool,
+                args.image,
+                ISO_AREA if args.iso else FIRMWARE,
+                timeout=args.timeout,
+                experimental=True,
+            )
+    except UpdateException as e:  # pylint: disable=invalid-name
+        print("Update failed: %s" % (e,))
+        return 1
+
+    failed = 0
+    for port, result in sorted(results.items()):
+        if isinstance(result, Exception):
+            failed += 1
+            print("%s: failed, %s" % (port, result))
+        else:
+            print(
+                "%s: %d bytes in %.1fs, %.0f B/s"
+                % (port, result.size, result.elapsed, result.throughput)
+            )
+    return 1 if failed else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,379 @@
+# pylint: disable=bad-continuation # Black and pylint disagree on this
+# pylint: disable=missing-class-docstring
+# pylint: disable=missing-function-docstring
+# pylint: disable=missing-module-docstring
+import argparse
+import contextlib
+import http.server
+import io
+import json
+import logging
+import socket
+import sys
+import threading
+import time
+from typing import TYPE_CHECKING, ClassVar, Iterator, Optional, Tuple, Union
+
+import PIL.Image  # type: ignore
+
+import gt521f32
+from gt521f32.interfaces import InterfaceException
+
+if TYPE_CHECKING:
+    # The daemon needs Unix sockets, so it is only imported for --daemon
+    from gt521f32.daemon import DaemonClient
+
+# The viewer for machines without a display: serves what the sensor sees as
+# an MJPEG stream that any browser plays, at http://<host>:<port>/. Each
+# frame is compressed once and the same JPEG goes to every client; a client
+# that cannot keep up is sent the newest frame when it is ready again and
+# misses the ones in between. The LED is only on while someone watches.
+#
+#   python -m gt521f32_viewer.preview -d /dev/ttyUSB0 --port 8521
+
+logger = logging.getLogger(__name__)  # pylint: disable=invalid-name
+
+_DEVICE_ERRORS = (gt521f32.GT521F32Exception, InterfaceException)
+
+_BOUNDARY = b"frame"
+_STREAM_SEND_BUFFER = 2 ** 15
+_STREAM_WRITE_TIMEOUT = 10.0  # seconds before a client that stopped reading is dropped
+_INDEX = b"""<!doctype html>
+<title>GT521F32</title>
+<body style="margin:0;background:#000">
+<img src="/stream.mjpg" style="display:block;margin:auto;height:100vh">
+"""
+
+Reader = Union[gt521f32.GT521F32, "DaemonClient"]
+
+
+class _LatestFrame:
+    # The newest JPEG, numbered, for any number of waiting clients
+    def __init__(self):
+        self._condition = threading.Condition()
+        self._jpeg: Optional[bytes] = None
+        self._sequence = 0
+
+    def publish(self, jpeg: bytes) -> None:
+        with self._condition:
+            self._jpeg = jpeg
+            self._sequence += 1
+            self._condition.notify_all()
+
+    def newer_than(
+        self, sequence: int, timeout: Optional[float] = None
+    ) -> Tuple[int, Optional[bytes]]:
+        with self._condition:
+            self._condition.wait_for(lambda: self._sequence > sequence, timeout)
+            return self._sequence, self._jpeg
+
+
+class _PreviewRequestHandler(http.server.BaseHTTPRequestHandler):
+    server: "_PreviewHTTPServer"
+
+    def log_message(self, format, *args):  # pylint: disable=redefined-builtin
+        logger.debug("%s %s", self.address_string(), format % args)
+
+    def _send(self, content_type: str, body: bytes) -> None:
+        self.send_response(200)
+        self.send_header("Content-Type", content_type)
+        self.send_header("Content-Length", str(len(body)))
+        self.send_header("Cache-Control", "no-cache")
+        self.end_headers()
+        self.wfile.write(body)
+
+    def do_GET(self):  # pylint: disable=invalid-name
+        preview = self.server.preview
+        path = self.path.split("?", 1)[0]
+        try:
+            if path == "/":
+                self._send("text/html", _INDEX)
+            elif path == "/stream.mjpg":
+                self._stream(preview)
+            elif path == "/snapshot.jpg":
+                jpeg = preview.snapshot()
+                if jpeg is None:
+                    self.send_error(503, "No frame from the sensor")
+                else:
+                    self._send("image/jpeg", jpeg)
+            elif path == "/stats":
+                self._send("application/json", json.dumps(preview.stats()).encode())
+            else:
+                self.send_error(404)
+        except (BrokenPipeError, ConnectionResetError):
+            logger.debug("%s went away.", self.address_string())
+        except socket.timeout:
+            # e.g. dropped by a NAT without a FIN; counts as gone so the LED
+            # can go off
+            logger.info("%s stopped reading, dropped.", self.address_string())
+            self.close_connection = True
+
+    def _stream(self, preview: "PreviewServer") -> None:
+        # A small send buffer makes writes to a slow client block after a
+        # frame or two, so it skips frames instead of falling behind
+        self.connection.setsockopt(
+            socket.SOL_SOCKET, socket.SO_SNDBUF, _STREAM_SEND_BUFFER
+        )
+        self.connection.settimeout(_STREAM_WRITE_TIMEOUT)
+        self.send_response(200)
+        self.send_header(
+            "Content-Type",
+            "multipart/x-mixed-replace; boundary=%s" % (_BOUNDARY.decode(),),
+        )
+        self.send_header("Cache-Control", "no-cache")
+        self.end_headers()
+        with preview.watching():
+            sequence = 0
+            while not preview.closed:
+                latest, jpeg = preview.frames.newer_than(sequence, timeout=1.0)
+                if latest == sequence or jpeg is None:
+                    continue
+                if sequence:
+                    preview.count_dropped(latest - sequence - 1)
+                sequence = latest
+                self.wfile.write(
+                    b"--%s\r\nContent-Type: image/jpeg\r\nContent-Length: %d\r\n\r\n"
+                    % (_BOUNDARY, len(jpeg))
+                    + jpeg
+                    + b"\r\n"
+                )
+
+
+class _PreviewHTTPServer(http.server.ThreadingHTTPServer):
+    daemon_threads = True
+    allow_reuse_address = True
+
+    def __init__(self, address: Tuple[str, int], preview: "PreviewServer"):
+        self.preview = preview
+        super().__init__(address, _PreviewRequestHandler)
+
+
+class PreviewServer:
+    _DIMENSIONS: ClassVar[Tuple[int, int]] = (160, 120)  # GET_RAWIMAGE
+    _LINGER: ClassVar[float] = 2.0  # seconds the LED stays on after the last client
+    _ERROR_BACKOFF: ClassVar[float] = 0.5
+
+    frames: _LatestFrame
+
+    def __init__(  # pylint: disable=too-many-arguments
+        self,
+        reader: Reader,
+        address: Tuple[str, int] = ("127.0.0.1", 8521),
+        frame_rate: float = 10.0,
+        quality: int = 75,
+        scale_factor: float = 1.0,
+    ):
+        # The reader is only used from the capture thread
+        self._reader = reader
+        self._interval = 1.0 / frame_rate
+        self._quality = quality
+        self._size = tuple(int(_ * scale_factor) for _ in self._DIMENSIONS)
+        self.frames = _LatestFrame()
+
+        self._condition = threading.Condition()
+        self._clients = 0
+        self._snapshots = 0
+        self._closed = False
+        self.encoded = 0
+        self.dropped = 0
+        self.errors = 0
+
+        self._http = _PreviewHTTPServer(address, self)
+        self._threads = [
+            threading.Thread(target=self._capture, daemon=True),
+            threading.Thread(target=self._http.serve_forever, daemon=True),
+        ]
+        for thread in self._threads:
+            thread.start()
+
+    def __enter__(self) -> "PreviewServer":
+        return self
+
+    def __exit__(self, *exc_info) -> None:
+        self.close()
+
+    @property
+    def address(self) -> Tuple[str, int]:
+        return self._http.server_address[:2]  # type: ignore
+
+    @property
+    def closed(self) -> bool:
+        return self._closed
+
+    @property
+    def clients(self) -> int:
+        return self._clients
+
+    @contextlib.contextmanager
+    def watching(self) -> Iterator[None]:
+        with self._condition:
+            self._clients += 1
+            self._condition.notify_all()
+        try:
+            yield
+        finally:
+            with self._condition:
+                self._clients -= 1
+                self._condition.notify_all()
+
+    def count_dropped(self, frames: int) -> None:
+        with self._condition:
+            self.dropped += frames
+
+    def snapshot(self, timeout: float = 2.0) -> Optional[bytes]:
+        # A frame taken after the request, waking the sensor if need be
+        sequence, _ = self.frames.newer_than(0, timeout=0)
+        with self._condition:
+            self._snapshots += 1
+            self._condition.notify_all()
+        try:
+            latest, jpeg = self.frames.newer_than(sequence, timeout)
+            return jpeg if latest > sequence else None
+        finally:
+            with self._condition:
+                self._snapshots -= 1
+
+    def stats(self):
+        with self._condition:
+            return {
+                "clients": self._clients,
+                "frames_encoded": self.encoded,
+                "frames_dropped": self.dropped,
+                "errors": self.errors,
+            }
+
+    def _grab(self) -> Optional[bytes]:
+        if isinstance(self._reader, gt521f32.GT521F32):
+            return self._reader._get_raw_image()  # pylint: disable=protected-access
+        return self._reader.get_raw_image()
+
+    def _encode(self, data: bytes) -> bytes:
+        image = PIL.Image.frombytes("L", self._DIMENSIONS, data, "raw")
+        if image.size != self._size:
+            image = image.resize(self._size)
+        output = io.BytesIO()
+        image.save(output, "JPEG", quality=self._quality)
+        return output.getvalue()
+
+    def _wanted(self) -> bool:
+        return bool(self._clients or self._snapshots)
+
+    def _set_led(self, on: bool) -> None:
+        try:
+            self._reader.set_led(on)
+        except _DEVICE_ERRORS as e:  # pylint: disable=invalid-name
+            logger.error("Could not switch the LED: %s", e)
+
+    def _capture(self) -> None:
+        led = False
+        while True:
+            with self._condition:
+                if not self._closed and not self._wanted():
+                    # Keep the LED on a little, e.g. across a page reload
+                    self._condition.wait_for(
+                        lambda: self._closed or self._wanted(),
+                        self._LINGER if led else None,
+                    )
+                if self._closed:
+                    break
+                wanted = self._wanted()
+            if not wanted:
+                self._set_led(False)
+                led = False
+                continue
+            if not led:
+                self._set_led(True)
+                led = True
+
+            started = time.monotonic()
+            try:
+                data = self._grab()
+            except _DEVICE_ERRORS as e:  # pylint: disable=invalid-name
+                self.errors += 1
+                logger.error("Could not get a frame: %s", e)
+                time.sleep(self._ERROR_BACKOFF)
+                continue
+            if data:
+                self.frames.publish(self._encode(data))
+                self.encoded += 1
+            time.sleep(max(0.0, self._interval - (time.monotonic() - started)))
+
+        if led:
+            self._set_led(False)
+
+    def serve_forever(self) -> None:
+        self._threads[0].join()
+
+    def close(self) -> None:
+        with self._condition:
+            self._closed = True
+            self._condition.notify_all()
+        self._http.shutdown()
+        self._http.server_close()
+        for thread in self._threads:
+            thread.join()
+
+
+def _daemon_client(path: str, device: str) -> "DaemonClient":
+    # pylint: disable=import-outside-toplevel
+    from gt521f32.daemon import DaemonClient, default_socket_path
+
+    return DaemonClient(path or default_socket_path(), device)
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Serve a live preview of the sensor as MJPEG over HTTP"
+    )
+    parser.add_argument(
+        "-d",
+        "--device",
+        help="Path to GT521F32 device, or the daemon's reader to view",
+    )
+    parser.add_argument(
+        "--daemon",
+        nargs="?",
+        const="",
+        metavar="SOCKET",
+        help="View through a running gt521f32.daemon (not on Windows)",
+    )
+    parser.add_argument("--host", default="127.0.0.1", help="Address to listen on")
+    parser.add_argument(
+        "-p", "--port", type=int, default=8521, help="Port to listen on"
+    )
+    parser.add_argument("-r", "--frame-rate", type=float, default=10.0)
+    parser.add_argument("-q", "--quality", type=int, default=75, help="JPEG quality")
+    parser.add_argument(
+        "-f", "--scale_factor", type=float, default=1.5, help="Image scaling factor."
+    )
+    args = parser.parse_args()
+    if args.daemon is None and args.device is None:
+        parser.error("-d/--device is required without --daemon")
+
+    logging.basicConfig(level=logging.INFO)
+    try:
+        with (
+            _daemon_client(args.daemon, args.device)
+            if args.daemon is not None
+            else gt521f32.GT521F32(args.device)
+        ) as reader:
+            with PreviewServer(
+                reader,
+                (args.host, args.port),
+                args.frame_rate,
+                args.quality,
+                args.scale_factor,
+            ) as preview:
+                logger.info("Preview at http://%s:%d/", *preview.address)
+                try:
+                    preview.serve_forever()
+                except KeyboardInterrupt:
+                    pass
+    except gt521f32.GT521F32Exception:
+        print("Could not open fingerprint device.")
+        return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -4,13 +4,17 @@
 # pylint: disable=missing-module-docstring
 import argparse
 import tkinter
-from typing import Tuple, ClassVar
+from typing import TYPE_CHECKING, Tuple, ClassVar, Union
 
 import PIL.ImageTk  # type: ignore
 import PIL.Image  # type: ignore
 
 import gt521f32
 
+if TYPE_CHECKING:
+    # The daemon needs Unix sockets, so it is only imported for --daemon
+    from gt521f32.daemon import DaemonClient
+
 
 class GT521F32Viewer:
     _FRAME_RATE: ClassVar[int] = 25
@@ -21,12 +25,14 @@ class GT521F32Viewer:
 
     _root: tkinter.Tk
     _image_panel: tkinter.Label
-    _reader: gt521f32.GT521F32
-    _scale_factor: int
+    _reader: Union[gt521f32.GT521F32, "DaemonClient"]
+    _scale_factor: float
     _stop: bool
     _image_tk: PIL.ImageTk.PhotoImage = None
 
-    def __init__(self, reader: gt521f32.GT521F32, scale_factor: int = 1):
+    def __init__(
+        self, reader: Union[gt521f32.GT521F32, "DaemonClient"], scale_factor: float = 1
+    ):
         self._reader = reader
         self._scale_factor = scale_factor
 
@@ -44,7 +50,10 @@ class GT521F32Viewer:
         self._root.wm_protocol("WM_DELETE_WINDOW", self.stop)
 
     def _video_loop(self):
-        data = self._reader._get_raw_image()  # pylint: disable=protected-access
+        if isinstance(self._reader, gt521f32.GT521F32):
+            data = self._reader._get_raw_image()  # pylint: disable=protected-access
+        else:
+            data = self._reader.get_raw_image()
         if data:
             image = PIL.Image.frombytes("L", self._DIMENSIONS, data, "raw")
             self._update(image)
@@ -75,18 +84,44 @@ class GT521F32Viewer:
         self._root.quit()
 
 
+def _daemon_client(path: str, device: str) -> "DaemonClient":
+    # pylint: disable=import-outside-toplevel
+    from gt521f32.daemon import DaemonClient, default_socket_path
+
+    return DaemonClient(path or default_socket_path(), device)
+
+
 def main():
     parser = argparse.ArgumentParser()
-    parser.add_argument("-d", "--device", required=True, help="Path to GT521F32 device")
     parser.add_argument(
-        "-f", "--scale_factor", type=int, default=1.5, help="Image scaling factor."
+        "-d",
+        "--device",
+        help="Path to GT521F32 device, or the daemon's reader to view",
+    )
+    parser.add_argument(
+        "--daemon",
+        nargs="?",
+        const="",
+        metavar="SOCKET",
+        help="View through a running gt521f32.daemon (not on Windows)",
+    )
+    parser.add_argument(
+        "-f", "--scale_factor", type=float, default=1.5, help="Image scaling factor."
     )
     args = parser.parse_args()
+    if args.daemon is None and args.device is None:
+        parser.error("-d/--device is required without --daemon")
 
     try:
-        viewer = GT521F32Viewer(gt521f32.GT521F32(args.device), args.scale_factor)
-        viewer.start()
+        with (
+            _daemon_client(args.daemon, args.device)
+            if args.daemon is not None
+            else gt521f32.GT521F32(args.device)
+        ) as reader:
+            viewer = GT521F32Viewer(reader, args.scale_factor)
+            try:
+                viewer.start()
+            except (KeyboardInterrupt, InterruptedError):
+                viewer.stop()
     except gt521f32.GT521F32Exception:
         print("Could not open fingerprint device.")
-    except (KeyboardInterrupt, InterruptedError):
-        viewer.stop()
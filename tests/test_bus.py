@@ -0,0 +1,105 @@
+# pylint: disable=missing-module-docstring
+# pylint: disable=missing-function-docstring
+# pylint: disable=redefined-outer-name
+import threading
+import time
+
+import pytest  # type: ignore
+
+from gt521f32 import packets
+from gt521f32.bus import BusArbiter, BusException
+from gt521f32.interfaces.simulated import SimulatedDevice, finger_template
+
+# Three simulated modules, at device ids 1, 2 and 7, on one virtual bus
+
+DEVICE_IDS = (1, 2, 7)
+
+
+@pytest.fixture
+def bus(request):
+    name = "bus-%s" % (request.node.name,)
+    for device_id, users in zip(DEVICE_IDS, (1, 2, 3)):
+        device = SimulatedDevice.get(name, device_id)
+        for slot in range(users):
+            device.database[slot] = finger_template(slot)
+    arbiter = BusArbiter("sim://%s?ids=1,2,7" % (name,))  # scans
+    yield arbiter
+    arbiter.close()
+    for device_id in DEVICE_IDS:
+        SimulatedDevice.remove(name if device_id == 1 else "%s#%d" % (name, device_id))
+
+
+def test_scan_finds_every_module(bus):
+    assert bus.device_ids == list(DEVICE_IDS)
+    assert bus.scan(range(1, 16)) == list(DEVICE_IDS)
+
+
+def test_commands_reach_the_addressed_module(bus):
+    counts = bus.run(lambda reader: reader.get_enrolled_count())
+    assert counts == {1: 1, 2: 2, 7: 3}
+    serials = {
+        device_id: bus.reader(device_id).device_serial_number
+        for device_id in DEVICE_IDS
+    }
+    assert len(set(serials.values())) == len(DEVICE_IDS)
+
+
+def test_writes_need_the_bus(bus):
+    reader = bus.reader(2)
+    with pytest.raises(BusException):
+        reader.get_enrolled_count()
+    with bus.using(2) as held:
+        assert held.get_enrolled_count() == 2
+
+
+def test_bus_is_granted_in_request_order(bus):
+    order = []
+
+    def worker(device_id):
+        with bus.using(device_id) as reader:
+            order.append(device_id)
+            reader.get_enrolled_count()
+
+    threads = []
+    with bus.held():
+        for device_id in (7, 1, 2, 7, 1):
+            thread = threading.Thread(target=worker, args=(device_id,))
+            thread.start()
+            threads.append(thread)
+            time.sleep(0.05)  # so each thread has asked before the next starts
+    for thread in threads:
+        thread.join(5)
+    assert order == [7, 1, 2, 7, 1]
+
+
+def test_no_module_starves_under_load(bus):
+    served = {device_id: 0 for device_id in DEVICE_IDS}
+    stop = threading.Event()
+
+    def worker(device_id):
+        while not stop.is_set():
+            with bus.using(device_id) as reader:
+                reader.get_enrolled_count()
+                served[device_id] += 1
+
+    threads = [
+        threading.Thread(target=worker, args=(device_id,)) for device_id in DEVICE_IDS
+    ]
+    for thread in threads:
+        thread.start()
+    time.sleep(0.5)
+    stop.set()
+    for thread in threads:
+        thread.join(5)
+    assert min(served.values()) * 2 >= max(served.values())
+
+
+def test_packet_from_another_module_is_not_taken_as_the_answer(bus, caplog):
+    with bus.using(2) as reader:
+        # A late answer from module 7 is waiting when module 2 is asked
+        with bus.held():
+            bus._interface.write(  # pylint: disable=protected-access
+                packets.encode_command(packets.command_codes["ENROLL_COUNT"], 0, 7)
+            )
+        assert reader.get_enrolled_count() == 2
+    assert "Packet from device 7, expected 2." in caplog.text
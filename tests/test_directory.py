@@ -0,0 +1,30 @@
+# pylint: disable=missing-module-docstring
+# pylint: disable=missing-function-docstring
+# pylint: disable=redefined-outer-name
+import logging
+
+import pytest  # type: ignore
+
+import gt521f32
+from gt521f32.directory import UserDirectory
+from gt521f32.interfaces.simulated import SimulatedDevice
+
+
+@pytest.fixture
+def reader(request):
+    # Slots 0 to 2 enrolled, and a new finger on the sensor
+    name = "directory-%s" % (request.node.name,)
+    with gt521f32.GT521F32("sim://%s?users=3&finger=9" % (name,)) as reader:
+        yield reader
+    SimulatedDevice.remove(name)
+
+
+def test_enroll_takes_the_first_free_slot(reader, caplog):
+    with UserDirectory() as directory:
+        serial_number = reader.device_serial_number
+        directory.assign(serial_number, 3, "mapped-but-free")
+        with caplog.at_level(logging.ERROR):
+            assert directory.enroll(reader, "alice") == 4
+        assert not caplog.records
+        assert directory.user_for(serial_number, 4) == "alice"
+        assert reader.is_id_enrolled(4)
@@ -0,0 +1,160 @@
+# pylint: disable=missing-module-docstring
+# pylint: disable=missing-function-docstring
+# pylint: disable=redefined-outer-name
+import os
+import threading
+
+import pytest  # type: ignore
+
+from gt521f32.discovery import SCSI, TTY, Discovery, HotplugMonitor
+
+# Discovery over a fake sysfs tree, laid out as the kernel does it: class
+# entries link to the device, which sits under its USB device
+
+
+class FakeSysfs:
+    def __init__(self, root):
+        self.root = str(root)
+        self._next_devnum = 2
+
+    def _write(self, path, **attributes):
+        os.makedirs(path, exist_ok=True)
+        for name, value in attributes.items():
+            with open(os.path.join(path, name), "w") as attribute:
+                attribute.write("%s\n" % (value,))
+
+    def usb_device(self, port, vendor, product):
+        # Plugging in gives the USB device the next free address
+        path = os.path.join(self.root, "devices", "pci0", "usb1", port)
+        self._write(
+            path,
+            idVendor=vendor,
+            idProduct=product,
+            busnum=1,
+            devnum=self._next_devnum,
+        )
+        self._next_devnum += 1
+        return path
+
+    def _link(self, device_class, name, device_path):
+        entry = os.path.join(self.root, "class", device_class, name)
+        os.makedirs(entry, exist_ok=True)
+        link = os.path.join(entry, "device")
+        if os.path.lexists(link):
+            os.remove(link)
+        os.symlink(device_path, link)
+
+    def tty(self, name, usb_path=None):
+        if usb_path is None:  # e.g. an on-board UART
+            parent = os.path.join(self.root, "devices", "platform", "serial8250")
+        else:
+            parent = os.path.join(usb_path, os.path.basename(usb_path) + ":1.0")
+        device = os.path.join(parent, name)
+        os.makedirs(device, exist_ok=True)
+        self._link("tty", name, device)
+
+    def sg(self, name, usb_path, vendor, model, scsi_type=5):
+        device = os.path.join(usb_path, "host0", "target0:0:0", "0:0:0:0")
+        self._write(device, type=scsi_type, vendor=vendor, model=model)
+        self._link("scsi_generic", name, device)
+
+    def unplug(self, device_class, name):
+        os.remove(os.path.join(self.root, "class", device_class, name, "device"))
+
+
+class FakeProbe:
+    def __init__(self, serial_numbers):
+        self.serial_numbers = dict(serial_numbers)  # by port
+        self.probed = []
+
+    def __call__(self, port):
+        self.probed.append(port)
+        return self.serial_numbers.get(port)
+
+
+@pytest.fixture
+def sysfs(tmp_path):
+    return FakeSysfs(tmp_path)
+
+
+def test_only_ports_behind_known_bridges_are_probed(sysfs):
+    sysfs.tty("ttyUSB0", sysfs.usb_device("1-1", "0403", "6001"))  # FTDI
+    sysfs.tty("ttyACM0", sysfs.usb_device("1-2", "1199", "9071"))  # a modem
+    sysfs.tty("ttyS0")
+    probe = FakeProbe({"/dev/ttyUSB0": "READER-A"})
+    discovery = Discovery(sysfs.root, probe=probe)
+
+    devices = discovery.scan()
+    assert probe.probed == ["/dev/ttyUSB0"]
+    assert devices["READER-A"].port == "/dev/ttyUSB0"
+    assert devices["READER-A"].kind == TTY
+
+
+def test_every_usb_port_is_probed_when_asked(sysfs):
+    sysfs.tty("ttyACM0", sysfs.usb_device("1-2", "1199", "9071"))
+    sysfs.tty("ttyS0")
+    probe = FakeProbe({})
+    Discovery(sysfs.root, probe=probe, usb_ids=None).scan()
+    assert probe.probed == ["/dev/ttyACM0"]
+
+
+def test_scsi_devices_need_a_model(sysfs):
+    usb_path = sysfs.usb_device("1-3", "abcd", "0001")
+    sysfs.sg("sg0", usb_path, "READER", "GT-521F32")
+    sysfs.sg("sg1", sysfs.usb_device("1-4", "0781", "5567"), "SanDisk", "Cruzer", 0)
+    probe = FakeProbe({"/dev/sg0": "READER-S"})
+
+    assert Discovery(sysfs.root, probe=probe).scan() == {}
+    assert probe.probed == []
+
+    devices = Discovery(sysfs.root, probe=probe, scsi_models=["READER GT"]).scan()
+    assert probe.probed == ["/dev/sg0"]
+    assert devices["READER-S"].kind == SCSI
+
+
+def test_known_ports_are_not_probed_again(sysfs):
+    sysfs.tty("ttyUSB0", sysfs.usb_device("1-1", "10c4", "ea60"))
+    probe = FakeProbe({"/dev/ttyUSB0": "READER-A"})
+    discovery = Discovery(sysfs.root, probe=probe)
+    discovery.scan()
+    discovery.scan()
+    assert probe.probed == ["/dev/ttyUSB0"]
+
+
+def test_replug_at_the_same_path_is_probed_again(sysfs):
+    sysfs.tty("ttyUSB0", sysfs.usb_device("1-1", "10c4", "ea60"))
+    probe = FakeProbe({"/dev/ttyUSB0": "READER-A"})
+    discovery = Discovery(sysfs.root, probe=probe)
+    assert list(discovery.scan()) == ["READER-A"]
+
+    # Another reader, on the same port of the same hub
+    before = discovery.fingerprint()
+    sysfs.usb_device("1-1", "10c4", "ea60")
+    probe.serial_numbers["/dev/ttyUSB0"] = "READER-B"
+    assert discovery.fingerprint() != before
+    assert list(discovery.scan()) == ["READER-B"]
+    assert probe.probed == ["/dev/ttyUSB0", "/dev/ttyUSB0"]
+
+
+def test_hotplug_monitor_reports_arrivals_and_removals(sysfs):
+    probe = FakeProbe({"/dev/ttyUSB0": "READER-A"})
+    events = []
+    changed = threading.Condition()
+
+    def callback(serial_number, device):
+        with changed:
+            events.append((serial_number, device is not None))
+            changed.notify_all()
+
+    monitor = HotplugMonitor(
+        Discovery(sysfs.root, probe=probe),
+        callback,
+        poll_interval=0.01,
+        use_uevents=False,
+    )
+    with monitor, changed:
+        sysfs.tty("ttyUSB0", sysfs.usb_device("1-1", "0403", "6015"))
+        assert changed.wait_for(lambda: len(events) == 1, 5)
+        sysfs.unplug("tty", "ttyUSB0")
+        assert changed.wait_for(lambda: len(events) == 2, 5)
+    assert events == [("READER-A", True), ("READER-A", False)]
@@ -0,0 +1,79 @@
+# pylint: disable=missing-module-docstring
+# pylint: disable=missing-function-docstring
+import io
+import random
+
+import pytest  # type: ignore
+
+from gt521f32 import framecodec, packets
+
+SHAPE = (12, 16)
+
+
+def _frames(count, size=SHAPE[0] * SHAPE[1]):
+    # A still scene with sensor noise, so deltas are small but not zero
+    rng = random.Random(count)
+    scene = bytes(rng.randrange(256) for _ in range(size))
+    return [
+        bytes((pixel + rng.randrange(-3, 4)) % 256 for pixel in scene)
+        for _ in range(count)
+    ]
+
+
+def _records(encoder, frames):
+    return [encoder.encode(frame) for frame in frames]
+
+
+def test_round_trip_with_key_and_delta_frames():
+    frames = _frames(10)
+    encoder = framecodec.FrameEncoder(SHAPE, keyframe_interval=4)
+    records = _records(encoder, frames)
+    key, delta = framecodec.KEY_FRAME, framecodec.DELTA_FRAME
+    expected = [key, delta, delta, delta, key, delta, delta, delta, key, delta]
+    assert [record[0] for record in records] == expected
+
+    decoder = framecodec.FrameDecoder()
+    assert decoder.feed(encoder.header() + b"".join(records)) == frames
+    assert decoder.shape == SHAPE
+
+
+def test_feed_in_small_chunks():
+    frames = _frames(5)
+    encoder = framecodec.FrameEncoder(SHAPE)
+    stream = encoder.header() + b"".join(_records(encoder, frames))
+    decoder = framecodec.FrameDecoder()
+    decoded = []
+    for start in range(0, len(stream), 7):
+        decoded += decoder.feed(stream[start : start + 7])
+    assert decoded == frames
+
+
+def test_files_take_the_shape_from_the_frames():
+    frames = [bytes(packets.RAW_IMAGE_SIZE), bytes(range(256)) * 75]
+    stream = io.BytesIO()
+    framecodec.write_frames(stream, frames)
+    stream.seek(0)
+    assert list(framecodec.read_frames(stream, chunk_size=100)) == frames
+
+
+def test_corrupt_record():
+    encoder = framecodec.FrameEncoder(SHAPE)
+    header = encoder.header()
+    record = bytearray(encoder.encode(_frames(1)[0]))
+    record[-1] ^= 0xFF  # the deflate stream's checksum
+    with pytest.raises(framecodec.FrameCodecException):
+        framecodec.FrameDecoder().feed(header + bytes(record))
+
+
+def test_delta_without_key_frame():
+    encoder = framecodec.FrameEncoder(SHAPE)
+    header = encoder.header()
+    _, second = _records(encoder, _frames(2))
+    assert second[0] == framecodec.DELTA_FRAME
+    with pytest.raises(framecodec.FrameCodecException):
+        framecodec.FrameDecoder().feed(header + second)
+
+
+def test_not_a_frame_stream():
+    with pytest.raises(framecodec.FrameCodecException):
+        framecodec.FrameDecoder().feed(b"JFIF" + bytes(16))
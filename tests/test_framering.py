@@ -0,0 +1,39 @@
+# pylint: disable=missing-module-docstring
+# pylint: disable=missing-function-docstring
+# pylint: disable=redefined-outer-name
+import pytest  # type: ignore
+
+import gt521f32
+from gt521f32 import packets
+from gt521f32.framering import FrameRing
+from gt521f32.interfaces.simulated import SimulatedDevice
+
+
+@pytest.fixture
+def reader(request):
+    name = "framering-%s" % (request.node.name,)
+    with gt521f32.GT521F32("sim://%s?finger=1" % (name,)) as reader:
+        yield reader
+    SimulatedDevice.remove(name)
+
+
+def test_frames_keep_their_length():
+    with FrameRing(2, 16) as ring:
+        first = ring.write(b"abc")
+        assert ring.read(first) == b"abc"
+        second = ring.write_from(lambda view: view.nbytes)
+        assert len(ring.read(second)) == 16
+
+
+def test_failed_fill_drops_the_frame():
+    with FrameRing(2, 16) as ring:
+        assert ring.write_from(lambda view: None) is None
+        assert ring.latest_sequence == 0
+
+
+def test_raw_image_in_an_image_sized_ring(reader):
+    with FrameRing(2) as ring:
+        assert ring.frame_size == packets.IMAGE_SIZE
+        sequence = ring.write_from(reader.get_raw_image_into)
+        assert sequence is not None
+        assert ring.read(sequence) == reader.get_raw_image_safe()
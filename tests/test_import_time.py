@@ -0,0 +1,54 @@
+# pylint: disable=missing-module-docstring
+# pylint: disable=missing-function-docstring
+import json
+import os
+import re
+import statistics
+import subprocess
+import sys
+
+# `import gt521f32` has to stay cheap: PIL, numpy and the SCSI backends are
+# only imported once something uses them. The budget is generous so a slow
+# CI machine does not fail it, and can be set with GT521F32_IMPORT_BUDGET_MS;
+# benchmarks/import_time.py reports the actual numbers.
+
+DEFERRED_MODULES = ("PIL", "numpy", "sgio", "gt521f32.interfaces.scsi_windows")
+BUDGET_MS = float(os.environ.get("GT521F32_IMPORT_BUDGET_MS", "150"))
+REPEAT = 5
+
+_IMPORTTIME_LINE = re.compile(r"import time:\s+\d+\s+\|\s+(\d+)\s+\|\s*(\S+)")
+_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def _python(*args: str) -> subprocess.CompletedProcess:
+    # A fresh interpreter, importing this checkout
+    return subprocess.run(
+        [sys.executable, *args],
+        stdout=subprocess.PIPE,
+        stderr=subprocess.PIPE,
+        check=True,
+        cwd=_ROOT,
+        universal_newlines=True,
+    )
+
+
+def _import_ms() -> float:
+    stderr = _python("-X", "importtime", "-c", "import gt521f32").stderr
+    for line in stderr.splitlines():
+        match = _IMPORTTIME_LINE.match(line)
+        if match and match.group(2) == "gt521f32":
+            return int(match.group(1)) / 1000.0
+    raise AssertionError("gt521f32 missing from the import time report")
+
+
+def test_heavy_modules_are_deferred():
+    probe = (
+        "import sys, json, gt521f32; "
+        "print(json.dumps([m for m in %r if m in sys.modules]))" % (DEFERRED_MODULES,)
+    )
+    assert json.loads(_python("-c", probe).stdout) == []
+
+
+def test_import_time_within_budget():
+    median = statistics.median(_import_ms() for _ in range(REPEAT))
+    assert median <= BUDGET_MS, "import gt521f32 took %.1f ms" % (median,)
@@ -0,0 +1,50 @@
+# pylint: disable=missing-module-docstring
+# pylint: disable=missing-function-docstring
+# pylint: disable=redefined-outer-name
+import pytest  # type: ignore
+
+import gt521f32
+from gt521f32 import link
+from gt521f32.interfaces.simulated import SimulatedDevice
+
+# A link monitor on one simulated module, whose line noise is set per test
+
+
+@pytest.fixture
+def reader(request):
+    name = "link-%s" % (request.node.name,)
+    reader = gt521f32.GT521F32("sim://%s?users=5" % (name,), baudrate=9600)
+    reader.open()
+    yield reader
+    reader.close()
+    SimulatedDevice.remove(name)
+
+
+def test_garbled_address_is_a_bad_packet(reader, request):
+    monitor = reader.monitor_link(link.LinkPolicy(min_samples=10 ** 6))
+    SimulatedDevice.get("link-%s" % (request.node.name,)).line_noise = 0.01
+    for slot in range(2000):
+        try:
+            reader.is_id_enrolled(slot % 200)
+        except gt521f32.GT521F32Exception:
+            pass
+    errors = monitor.metrics().errors
+    assert errors.get(link.BAD_CHECKSUM)
+    assert not errors.get(link.WRONG_DEVICE)
+
+
+def test_lost_link_leaves_the_rate_alone(reader, request, monkeypatch):
+    monitor = reader.monitor_link()
+    monkeypatch.setattr(monitor, "decide", lambda: 19200)
+    device = SimulatedDevice.get("link-%s" % (request.node.name,))
+    device.line_noise = 1.0  # nothing gets through at either rate
+    with pytest.raises(gt521f32.GT521F32Exception):
+        reader.get_enrolled_count()
+
+    metrics = monitor.metrics()
+    assert metrics.baudrate == 9600
+    assert (metrics.downgrades, metrics.upgrades, metrics.failed_switches) == (0, 0, 0)
+
+    monkeypatch.setattr(monitor, "decide", lambda: None)
+    device.line_noise = 0.0
+    assert reader.get_enrolled_count() == 5
@@ -0,0 +1,100 @@
+# pylint: disable=missing-module-docstring
+# pylint: disable=missing-function-docstring
+# pylint: disable=redefined-outer-name
+import http.client
+import json
+import socket
+import time
+
+import pytest  # type: ignore
+
+import gt521f32
+from gt521f32.interfaces.simulated import SimulatedDevice
+from gt521f32_viewer import preview
+
+# The MJPEG preview server, serving a simulated reader on a free port
+
+
+def _until(condition, timeout=5.0):
+    deadline = time.monotonic() + timeout
+    while not condition():
+        if time.monotonic() > deadline:
+            return False
+        time.sleep(0.02)
+    return True
+
+
+@pytest.fixture
+def device(request):
+    name = "preview-%s" % (request.node.name,)
+    yield SimulatedDevice.get(name)
+    SimulatedDevice.remove(name)
+
+
+@pytest.fixture
+def server(device, monkeypatch):
+    monkeypatch.setattr(preview.PreviewServer, "_LINGER", 0.1)
+    with gt521f32.GT521F32("sim://%s" % (device.name,)) as reader:
+        with preview.PreviewServer(reader, ("127.0.0.1", 0), frame_rate=50) as server:
+            yield server
+
+
+def _get(server, path):
+    connection = http.client.HTTPConnection(*server.address, timeout=5)
+    connection.request("GET", path)
+    response = connection.getresponse()
+    return response.status, response.getheader("Content-Type"), response.read()
+
+
+def test_led_is_off_without_clients(server, device):
+    time.sleep(0.3)
+    assert server.clients == 0
+    assert not device.led
+    assert server.stats()["frames_encoded"] == 0
+
+
+def test_snapshot_is_a_jpeg(server, device):
+    status, content_type, body = _get(server, "/snapshot.jpg")
+    assert (status, content_type) == (200, "image/jpeg")
+    assert body.startswith(b"\xff\xd8")
+    assert _until(lambda: not device.led)
+
+
+def test_index_and_stats(server):
+    status, content_type, body = _get(server, "/")
+    assert (status, content_type) == (200, "text/html")
+    assert b"/stream.mjpg" in body
+    status, _, body = _get(server, "/stats")
+    assert status == 200
+    assert json.loads(body)["clients"] == 0
+    assert _get(server, "/missing")[0] == 404
+
+
+def test_stream_turns_the_led_on_while_watched(server, device):
+    connection = http.client.HTTPConnection(*server.address, timeout=5)
+    connection.request("GET", "/stream.mjpg")
+    response = connection.getresponse()
+    assert response.getheader("Content-Type").startswith("multipart/x-mixed-replace")
+    assert response.fp.readline() == b"--frame\r\n"
+    assert server.clients == 1
+    assert device.led
+
+    response.close()
+    connection.close()
+    assert _until(lambda: server.clients == 0)
+    assert _until(lambda: not device.led)
+
+
+def test_client_that_stops_reading_is_dropped(server, device, monkeypatch):
+    monkeypatch.setattr(preview, "_STREAM_WRITE_TIMEOUT", 0.5)
+    client = socket.socket()
+    client.setsockopt(socket.SOL_SOCKET, socket.SO_RCVBUF, 4096)
+    client.connect(server.address)
+    client.sendall(b"GET /stream.mjpg HTTP/1.1\r\nHost: preview\r\n\r\n")
+    try:
+        assert _until(lambda: server.clients == 1)
+        # Never reads, never closes
+        assert _until(lambda: server.clients == 0, timeout=20)
+        assert _until(lambda: not device.led)
+    finally:
+        client.close()
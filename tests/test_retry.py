@@ -0,0 +1,60 @@
+# pylint: disable=missing-module-docstring
+# pylint: disable=missing-function-docstring
+# pylint: disable=protected-access
+# pylint: disable=redefined-outer-name
+import re
+
+import pytest  # type: ignore
+
+import gt521f32
+from gt521f32 import packets
+from gt521f32.interfaces.simulated import SimulatedDevice, SimulatedInterface
+
+# Transport retries on a simulated module whose next response is garbled.
+# Input resets are ignored, as for a data packet still on the wire when the
+# host gives up on its response.
+
+
+@pytest.fixture
+def line(monkeypatch):
+    commands, garble = [], []
+    write = SimulatedInterface.write
+
+    def garbling_write(self, data):
+        start = len(self._output)
+        written = write(self, data)
+        commands.append(packets.CommandPacket.from_bytes(bytes(data)).command)
+        if garble and len(self._output) > start:
+            garble.pop()
+            self._output[start + 4] ^= 0xFF  # The parameter, so the checksum fails
+        return written
+
+    monkeypatch.setattr(SimulatedInterface, "write", garbling_write)
+    monkeypatch.setattr(SimulatedInterface, "reset_input_buffer", lambda self: None)
+    return commands, garble
+
+
+@pytest.fixture
+def reader(request):
+    name = "retry-%s" % (re.sub(r"\W", "-", request.node.name),)
+    reader = gt521f32.GT521F32("sim://%s" % (name,))
+    yield reader
+    SimulatedDevice.remove(name)
+
+
+@pytest.mark.parametrize(
+    "command, method", [("OPEN", "open"), ("MODULE_INFO", "module_info")]
+)
+def test_commands_with_data_are_not_resent(reader, line, command, method):
+    commands, garble = line
+    garble.append(True)
+    with pytest.raises(gt521f32.GT521F32Exception):
+        getattr(reader, method)()
+    assert commands.count(packets.command_codes[command]) == 1
+
+
+def test_open_without_data_is_resent(reader, line):
+    commands, garble = line
+    garble.append(True)
+    assert reader.send_command("OPEN", 0)[0] == packets.ACK_OK
+    assert commands.count(packets.command_codes["OPEN"]) == 2
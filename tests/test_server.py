@@ -0,0 +1,66 @@
+# pylint: disable=missing-module-docstring
+# pylint: disable=missing-function-docstring
+# pylint: disable=missing-class-docstring
+# pylint: disable=redefined-outer-name
+import pytest  # type: ignore
+
+from gt521f32.interfaces import InterfaceException
+from gt521f32.interfaces.tcp import TCPInterface, TCPInterfaceException
+from gt521f32.server import InterfaceServer
+
+# A TCPInterface talking to an InterfaceServer in front of an echo interface
+# that can be told to fail its next write
+
+
+class EchoInterface:
+    def __init__(self):
+        self.buffer = bytearray()
+        self.fail_next_write = False
+
+    def write(self, data):
+        if self.fail_next_write:
+            self.fail_next_write = False
+            raise InterfaceException("Write failed.")
+        self.buffer += data
+        return len(data)
+
+    def read(self, to_read, timeout=None):  # pylint: disable=unused-argument
+        data = bytes(self.buffer[:to_read])
+        del self.buffer[:to_read]
+        return data
+
+    def reset_input_buffer(self):
+        self.buffer.clear()
+
+
+@pytest.fixture
+def remote():
+    interface = EchoInterface()
+    server = InterfaceServer(interface, ("127.0.0.1", 0))
+    server.serve_in_background()
+    client = TCPInterface("tcp://127.0.0.1:%d" % (server.server_address[1],))
+    yield interface, client
+    client.close()
+    server.shutdown()
+    server.server_close()
+
+
+def test_reads_get_their_own_data(remote):
+    _, client = remote
+    client.write(b"first")
+    client.write(b"second")
+    assert client.read(5) == b"first"
+    assert client.read(6) == b"second"
+
+
+def test_failed_write_does_not_shift_replies(remote):
+    interface, client = remote
+    interface.fail_next_write = True
+    client.write(b"lost")
+    with pytest.raises(TCPInterfaceException):
+        client.read(4)
+
+    client.write(b"kept")
+    assert client.read(4) == b"kept"
+    client.write(b"next")
+    assert client.read(4) == b"next"
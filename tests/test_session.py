@@ -0,0 +1,66 @@
+# pylint: disable=missing-module-docstring
+# pylint: disable=missing-function-docstring
+# pylint: disable=protected-access
+# pylint: disable=redefined-outer-name
+import pytest  # type: ignore
+
+import gt521f32
+from gt521f32 import tracing
+from gt521f32.interfaces.simulated import (
+    SimulatedDevice,
+    SimulatedInterface,
+    SimulatedInterfaceException,
+)
+
+# Session lifecycle on a simulated module. The simulator answers at any baud
+# rate, so a module that does not understand a mismatched rate is patched in.
+
+
+@pytest.fixture
+def name(request):
+    name = "session-%s" % (request.node.name,)
+    SimulatedDevice.get(name)
+    yield name
+    SimulatedDevice.remove(name)
+
+
+@pytest.fixture
+def strict_baud_rate(monkeypatch):
+    write = SimulatedInterface.write
+
+    def strict_write(self, data):
+        if self._baudrate != self.device.baudrate:
+            return len(data)  # Noise to the module, no answer
+        return write(self, data)
+
+    monkeypatch.setattr(SimulatedInterface, "write", strict_write)
+
+
+def test_failed_open_closes_the_port(name):
+    SimulatedDevice.get(name).line_noise = 1.0
+    reader = gt521f32.GT521F32("sim://%s" % (name,))
+    with pytest.raises(gt521f32.GT521F32Exception):
+        with reader:
+            pass
+    assert reader.closed
+    with pytest.raises(SimulatedInterfaceException):
+        tracing.unwrap(reader._interface).write(b"\x00")
+
+
+def test_reconnect_keeps_the_baud_rate(name, strict_baud_rate):
+    # pylint: disable=unused-argument
+    with gt521f32.GT521F32("sim://%s" % (name,), baudrate=9600) as reader:
+        reader.change_baud_rate_and_reopen(57600)
+        reader.reconnect()
+        assert SimulatedDevice.get(name).baudrate == 57600
+        assert reader.get_enrolled_count() == 0
+
+
+def test_reconnect_after_a_power_cycle(name, strict_baud_rate):
+    # pylint: disable=unused-argument
+    with gt521f32.GT521F32("sim://%s" % (name,), baudrate=9600) as reader:
+        reader.change_baud_rate_and_reopen(57600)
+        SimulatedDevice.get(name).baudrate = 9600  # back to the default
+        reader.reconnect()
+        assert SimulatedDevice.get(name).baudrate == 57600
+        assert reader.get_enrolled_count() == 0
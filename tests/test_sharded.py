@@ -0,0 +1,52 @@
+# pylint: disable=missing-module-docstring
+# pylint: disable=missing-function-docstring
+import queue
+import threading
+
+from gt521f32 import packets, sharded
+from gt521f32.interfaces.simulated import SimulatedDevice
+
+
+def test_identifies_across_workers(request):
+    # Each worker builds its simulated readers from the port options
+    ports = [
+        "sim://sharded-%s-%d?users=3&finger=%d" % (request.node.name, index, index)
+        for index in range(3)
+    ]
+    with sharded.ShardedIdentifier(ports, workers=2, capture_frames=True) as pool:
+        assert sorted(len(shard) for shard in pool.shards) == [1, 2]
+        events = {}
+        while len(events) < len(ports):
+            event = pool.get(timeout=10)
+            events.setdefault(event.port, event)
+        for index, port in enumerate(ports):
+            assert events[port].user_id == index
+            frame = pool.frame(port, events[port].frame_sequence)
+            assert frame is not None and len(frame) == packets.IMAGE_SIZE
+
+
+def test_worker_closes_readers_that_fail_to_open(request, monkeypatch):
+    readers = []
+
+    class RecordingGT521F32(sharded.GT521F32):
+        def __init__(self, *args, **kwargs):
+            super().__init__(*args, **kwargs)
+            readers.append(self)
+
+    monkeypatch.setattr(sharded, "GT521F32", RecordingGT521F32)
+    good = "sharded-%s-good" % (request.node.name,)
+    bad = "sharded-%s-bad" % (request.node.name,)
+    stop = threading.Event()
+    stop.set()
+    try:
+        sharded._worker_main(  # pylint: disable=protected-access
+            {"sim://%s" % (good,): (0, None), "sim://%s?noise=1" % (bad,): (1, None)},
+            queue.Queue(),
+            stop,
+            {},
+        )
+    finally:
+        SimulatedDevice.remove(good)
+        SimulatedDevice.remove(bad)
+    assert len(readers) == 2
+    assert all(reader.closed for reader in readers)
@@ -0,0 +1,99 @@
+# pylint: disable=missing-module-docstring
+# pylint: disable=missing-function-docstring
+# pylint: disable=redefined-outer-name
+import io
+
+import pytest  # type: ignore
+
+import gt521f32
+from gt521f32 import packets, update
+from gt521f32.interfaces.simulated import SimulatedDevice
+from gt521f32.pool import DevicePool
+
+# Firmware updates against the simulator, which models update.py's framing
+
+IMAGE = bytes(range(256)) * 5  # two and a half chunks
+
+
+@pytest.fixture
+def name(request):
+    name = "update-%s" % (request.node.name,)
+    SimulatedDevice.get(name)
+    yield name
+    SimulatedDevice.remove(name)
+
+
+@pytest.fixture
+def reader(name):
+    with gt521f32.GT521F32("sim://%s" % (name,)) as reader:
+        yield reader
+
+
+def test_refused_unless_experimental(reader, name, tmp_path):
+    path = tmp_path / "firmware.bin"
+    path.write_bytes(IMAGE)
+    with pytest.raises(update.UpdateException):
+        update.stream_update(reader, io.BytesIO(IMAGE))
+    with pytest.raises(update.UpdateException):
+        update.update_file(reader, str(path))
+    with DevicePool() as pool:
+        with pytest.raises(update.UpdateException):
+            update.update_pool(pool, str(path))
+    assert SimulatedDevice.get(name).firmware_image == b""
+
+
+def test_chunks_are_acknowledged(reader, name):
+    progress = []
+    result = update.stream_update(
+        reader, io.BytesIO(IMAGE), progress=progress.append, experimental=True
+    )
+    assert result.size == len(IMAGE)
+    assert result.chunks == 3
+    assert [step.sent for step in progress] == [
+        packets.UPDATE_CHUNK_SIZE,
+        2 * packets.UPDATE_CHUNK_SIZE,
+        len(IMAGE),
+    ]
+    assert SimulatedDevice.get(name).firmware_image == IMAGE
+
+
+def test_iso_area(reader, name):
+    update.stream_update(reader, io.BytesIO(IMAGE), update.ISO_AREA, experimental=True)
+    assert SimulatedDevice.get(name).iso_area == IMAGE
+
+
+def test_checksum_mismatch(reader, monkeypatch):
+    send_data = reader.send_data
+
+    def corrupting_send_data(chunk):
+        # A flipped bit the data packet's own checksum did not catch
+        return send_data(bytes([chunk[0] ^ 1]) + chunk[1:])
+
+    monkeypatch.setattr(reader, "send_data", corrupting_send_data)
+    with pytest.raises(update.UpdateException, match="Checksum mismatch"):
+        update.stream_update(reader, io.BytesIO(IMAGE), experimental=True)
+
+
+def test_pool_streams_the_file_to_every_reader(tmp_path, request):
+    names = ["update-%s-%d" % (request.node.name, index) for index in range(2)]
+    path = tmp_path / "firmware.bin"
+    path.write_bytes(IMAGE)
+    try:
+        with DevicePool(["sim://%s" % (name,) for name in names]) as pool:
+            results = update.update_pool(pool, str(path), experimental=True)
+        assert all(result.size == len(IMAGE) for result in results.values())
+        for name in names:
+            assert SimulatedDevice.get(name).firmware_image == IMAGE
+    finally:
+        for name in names:
+            SimulatedDevice.remove(name)
+
+
+@pytest.mark.parametrize("image", [None, b""])
+def test_pool_checks_the_image_first(tmp_path, image):
+    path = tmp_path / "firmware.bin"
+    if image is not None:
+        path.write_bytes(image)
+    with DevicePool() as pool:
+        with pytest.raises(update.UpdateException):
+            update.update_pool(pool, str(path), experimental=True)